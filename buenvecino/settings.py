@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -39,8 +42,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'taller.middleware.MetricsMiddleware',
+    'taller.middleware.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'taller.middleware.ReplicaMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -71,12 +77,69 @@ WSGI_APPLICATION = 'buenvecino.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# The profile is chosen with BUENVECINO_DATABASE: 'sqlite' (default) or 'postgresql'. PostgreSQL reads the
+# connection from BUENVECINO_DB_NAME, _USER, _PASSWORD, _HOST and _PORT and keeps connections open for
+# BUENVECINO_DB_CONN_MAX_AGE seconds; they are checked before each request (TALLER_DB_HEALTH_CHECKS).
+
+DATABASE_PROFILE = os.environ.get('BUENVECINO_DATABASE', 'sqlite')
+
+if DATABASE_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('BUENVECINO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+elif DATABASE_PROFILE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('BUENVECINO_DB_NAME', 'buenvecino'),
+            'USER': os.environ.get('BUENVECINO_DB_USER', 'buenvecino'),
+            'PASSWORD': os.environ.get('BUENVECINO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('BUENVECINO_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('BUENVECINO_DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('BUENVECINO_DB_CONN_MAX_AGE', '60')),
+        }
+    }
+else:
+    raise ImproperlyConfigured('BUENVECINO_DATABASE must be sqlite or postgresql, not {!r}'.format(DATABASE_PROFILE))
+
+# Read replica for PDF exports, extracts and reports, enabled with BUENVECINO_DB_REPLICA: with SQLite, the path
+# of a read-only snapshot refreshed by `manage.py refresh_replica`; with PostgreSQL, the host of a streaming
+# replica. Reads fall back to the primary when the replica lags more than TALLER_REPLICA_MAX_LAG_SECONDS or
+# hasn't caught up with the last write made from the same browser.
+DATABASE_REPLICA = os.environ.get('BUENVECINO_DB_REPLICA')
+
+if DATABASE_REPLICA and DATABASE_PROFILE == 'sqlite':
+    TALLER_REPLICA_SNAPSHOT = Path(DATABASE_REPLICA)
+    DATABASES['replica'] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': 'file:{}?mode=ro'.format(TALLER_REPLICA_SNAPSHOT),
+        'TEST': {'MIRROR': 'default'},
     }
+elif DATABASE_REPLICA:
+    DATABASES['replica'] = {**DATABASES['default'], 'HOST': DATABASE_REPLICA, 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['taller.routers.ReplicaRouter']
+TALLER_REPLICA_DATABASE = 'replica'
+TALLER_REPLICA_MAX_LAG_SECONDS = 300
+TALLER_REPLICA_CHECK_SECONDS = 5.0
+
+# Applied to every new SQLite connection; they only last as long as the connection. busy_timeout makes
+# writers wait for the lock instead of failing with "database is locked".
+TALLER_SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
 }
+# Journal mode, stored in the database file itself. WAL lets readers work while a writer commits; set
+# BUENVECINO_SQLITE_JOURNAL_MODE=WAL in production. Unset, connections leave the file as it is.
+TALLER_SQLITE_JOURNAL_MODE = os.environ.get('BUENVECINO_SQLITE_JOURNAL_MODE')
+# SQLite transactions take the write lock when they begin (BEGIN IMMEDIATE), so they queue behind busy_timeout
+TALLER_SQLITE_IMMEDIATE_TRANSACTIONS = True
+TALLER_DB_HEALTH_CHECKS = True
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -113,3 +176,62 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.1/howto/static-files/
 
 STATIC_URL = '/static/'
+
+# PDF exports
+
+# Load the report fonts and stylesheets when the worker starts instead of on the first download
+TALLER_PDF_WARMUP = True
+
+# Invoices with more activities than this are rendered with the splittable large-document layout
+TALLER_PDF_LARGE_INVOICE_ROWS = 200
+
+# Rendered PDFs are kept on disk and evicted least recently used first; None disables the cache
+TALLER_PDF_CACHE_DIR = BASE_DIR / 'cache' / 'pdf'
+TALLER_PDF_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# PDFs larger than this are spooled to a temporary file while they are rendered and sent
+TALLER_PDF_SPOOL_MAX_SIZE = 5 * 1024 * 1024
+
+# Processes used to render batch exports with `manage.py export_pdfs`; None uses one per CPU
+TALLER_BATCH_EXPORT_WORKERS = None
+# Threads used by the admin's batch export actions, which run inside the request
+TALLER_BATCH_EXPORT_THREADS = 4
+
+# Background export queue: opt in per request with ?async=1, or for every export with TALLER_PDF_ASYNC_EXPORTS.
+# Jobs are processed by `manage.py run_export_worker`.
+TALLER_PDF_ASYNC_EXPORTS = False
+TALLER_EXPORT_JOBS_DIR = BASE_DIR / 'cache' / 'jobs'
+TALLER_EXPORT_JOB_WORKERS = 2
+TALLER_EXPORT_JOB_TIMEOUT = 600
+
+# Serve the export URLs with the async views (for ASGI deployments). Rendering runs in a pool of
+# TALLER_ASYNC_EXPORT_THREADS threads; beyond TALLER_ASYNC_EXPORT_MAX_PENDING exports in flight the
+# views answer 503.
+TALLER_ASYNC_EXPORTS = False
+TALLER_ASYNC_EXPORT_THREADS = 4
+TALLER_ASYNC_EXPORT_MAX_PENDING = 64
+
+# Rows fetched per database round trip by the CSV/JSONL extracts
+TALLER_EXTRACT_CHUNK_ROWS = 2000
+
+# Rows inserted per transaction by `manage.py import_data`
+TALLER_IMPORT_BATCH_SIZE = 1000
+
+# Request, database and PDF metrics served at /metrics in the Prometheus text format. Each process
+# keeps its own counters. They may be read by admin staff, with an "Authorization: Bearer <token>"
+# header matching TALLER_METRICS_TOKEN, or from the listed addresses when the request carries no
+# X-Forwarded-For/Forwarded header (behind a local reverse proxy every request looks local).
+TALLER_METRICS = True
+TALLER_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+TALLER_METRICS_TOKEN = os.environ.get('BUENVECINO_METRICS_TOKEN')
+
+# Reference tables (types, units, payment methods, guarantees, provenances, pieces) are kept in memory by each
+# process. Edits made by other processes are picked up when their versions are re-read, at most this often.
+TALLER_REFERENCE_CACHE_CHECK_SECONDS = 1.0
+
+# Queries slower than this are written with their query plan, view and caller to a rotating JSON lines
+# log; summarise it with `manage.py slow_queries`. None disables the log.
+TALLER_SLOW_QUERY_SECONDS = 0.2
+TALLER_SLOW_QUERY_LOG = BASE_DIR / 'logs' / 'slow_queries.jsonl'
+TALLER_SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+TALLER_SLOW_QUERY_LOG_BACKUPS = 5
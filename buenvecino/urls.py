@@ -16,7 +16,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 
+from taller import views
+
 urlpatterns = [
+    path('metrics', views.metrics_view, name='metrics'),
     path('', admin.site.urls),
 ]
 
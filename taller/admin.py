@@ -1,10 +1,109 @@
+import tempfile
+
+from django.conf import settings
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.db.models import Q
+from django.template.response import TemplateResponse
+from django.utils import timezone
 from django.urls import path
 
-from . import views
+from . import batch, extracts, reference, replica, reports, search, views
+from .pagination import LargeTablePaginator
 from .models import *
 
 
+class BatchExportMixin:
+    batch_kind = None
+    actions = ['export_pdf_zip', 'export_pdf_merged']
+
+    def batch_export(self, request, queryset, output_format):
+        object_ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+        spool = tempfile.SpooledTemporaryFile(max_size=getattr(settings, 'TALLER_PDF_SPOOL_MAX_SIZE', 5 * 1024 * 1024))
+        with replica.reading(since=replica.last_write(request)):
+            # Sin procesos: la petición no debe bifurcar el servidor ni cerrar conexiones ajenas
+            count, seconds = batch.export(self.batch_kind, object_ids, spool, output_format, processes=False)
+        spool.seek(0)
+
+        filename = '{}.{}'.format(batch.BATCHES[self.batch_kind][3], 'zip' if output_format == batch.ZIP else 'pdf')
+        response = views.PDFResponse(spool, as_attachment=True, filename=filename)
+        response['X-Documents-Per-Second'] = '{:.1f}'.format(count / seconds if seconds else 0)
+        return response
+
+    def export_pdf_zip(self, request, queryset):
+        return self.batch_export(request, queryset, batch.ZIP)
+
+    export_pdf_zip.short_description = 'Exportar %(verbose_name_plural)s seleccionadas a PDF (ZIP)'
+
+    def export_pdf_merged(self, request, queryset):
+        return self.batch_export(request, queryset, batch.MERGED)
+
+    export_pdf_merged.short_description = 'Exportar %(verbose_name_plural)s seleccionadas a un único PDF'
+
+
+class ExtractExportMixin:
+    extract_kind = None
+    actions = ['export_csv', 'export_jsonl']
+
+    def export_csv(self, request, queryset):
+        return views.extract_response(self.extract_kind, extracts.CSV, queryset,
+                                      since=replica.last_write(request))
+
+    export_csv.short_description = 'Exportar %(verbose_name_plural)s seleccionadas a CSV'
+
+    def export_jsonl(self, request, queryset):
+        return views.extract_response(self.extract_kind, extracts.JSONL, queryset,
+                                      since=replica.last_write(request))
+
+    export_jsonl.short_description = 'Exportar %(verbose_name_plural)s seleccionadas a JSONL'
+
+
+class LargeTableMixin:
+    """Listado sin el conteo total de la tabla y con páginas armadas por id; ver ``LargeTablePaginator``."""
+    ordering = ['-pk']
+    show_full_result_count = False
+    paginator = LargeTablePaginator
+
+
+class CachedChoicesMixin:
+    """Opciones de las claves foráneas de ``cached_choice_fields`` tomadas de ``taller.reference``.
+
+    Cada fila de un formulario en línea copia su campo y volvería a consultar las opciones; con la
+    lista ya armada todas las filas, y el formulario principal, comparten la misma. Solo admite
+    claves foráneas a las tablas de referencia.
+    """
+    cached_choice_fields = ()
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name in self.cached_choice_fields and formfield is not None:
+            iterator = formfield.iterator(formfield)
+            choices = [('', formfield.empty_label)] if formfield.empty_label is not None else []
+            formfield.choices = choices + [iterator.choice(obj) for obj in reference.rows(db_field.related_model)]
+        return formfield
+
+
+class TotalRangeFilter(admin.SimpleListFilter):
+    title = 'total'
+    parameter_name = 'total_range'
+    ranges = (
+        ('0-1000', 'Hasta $ 1,000', 0, 1000),
+        ('1000-5000', 'De $ 1,000 a $ 5,000', 1000, 5000),
+        ('5000-20000', 'De $ 5,000 a $ 20,000', 5000, 20000),
+        ('20000-', 'Más de $ 20,000', 20000, None),
+    )
+
+    def lookups(self, request, model_admin):
+        return [(value, label) for value, label, _, _ in self.ranges]
+
+    def queryset(self, request, queryset):
+        for value, _, lower, upper in self.ranges:
+            if self.value() == value:
+                queryset = queryset.filter(total__gte=lower)
+                return queryset if upper is None else queryset.filter(total__lt=upper)
+        return queryset
+
+
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
     list_display = ('name', 'email', 'phone')
@@ -51,59 +150,150 @@ class ServiceGuaranteeAdmin(admin.ModelAdmin):
 
 
 @admin.register(Vehicle)
-class VehicleAdmin(admin.ModelAdmin):
+class VehicleAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = ('tag', 'model', 'mark', 'enterprise')
+    list_select_related = ['enterprise']
     search_fields = ['tag', 'model', 'mark', 'enterprise__name']
 
 
 @admin.register(PhysicalState)
-class PhysicalStateAdmin(admin.ModelAdmin):
+class PhysicalStateAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = ('piece', 'description')
+    list_select_related = ['piece']
+    autocomplete_fields = ['workshop_order']
     search_fields = ['description', 'workshop_order__entry_date']
 
+    def get_search_results(self, request, queryset, search_term):
+        result, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        # Las palabras también se buscan en el índice de texto, sin acentos y por prefijo
+        states = search.matching_physical_states(search_term) if search.supported() else None
+        if states is not None:
+            result |= queryset.filter(pk__in=states)
+        if search_term.strip().isdigit():
+            result |= queryset.filter(workshop_order=int(search_term))
+        return result, may_have_duplicates
+
 
-class PhysicalStateTabularInline(admin.TabularInline):
+class PhysicalStateTabularInline(CachedChoicesMixin, admin.TabularInline):
     model = PhysicalState
     extra = 0
+    cached_choice_fields = ['piece']
 
 
 @admin.register(WorkshopOrder)
-class WorkshopOrderAdmin(admin.ModelAdmin):
-    list_display = ('entry_date', 'enterprise', 'vehicle', 'mechanical')
+class WorkshopOrderAdmin(LargeTableMixin, CachedChoicesMixin, BatchExportMixin, ExtractExportMixin,
+                         admin.ModelAdmin):
+    list_display = ('entry_date', 'enterprise', 'vehicle', 'mechanical', 'total')
+    list_select_related = ['enterprise', 'vehicle', 'mechanical']
+    list_filter = ['entry_date', TotalRangeFilter]
+    search_fields = ['vehicle__tag', 'enterprise__name']
+    autocomplete_fields = ['vehicle', 'enterprise', 'mechanical', 'assistant']
+    cached_choice_fields = ['method_payment', 'service_guarantee']
     inlines = [PhysicalStateTabularInline]
     change_form_template = "admin/show_order_workshop.html"
+    batch_kind = batch.WORKSHOP_ORDER
+    extract_kind = extracts.WORKSHOP_ORDER
+    actions = BatchExportMixin.actions + ExtractExportMixin.actions
 
     def get_urls(self):
         urls = [
-            path('<path:object_id>/export_pdf', views.export_workshop_order_pdf,
+            path('<path:object_id>/export_pdf',
+                 views.export_workshop_order_pdf_async if getattr(settings, 'TALLER_ASYNC_EXPORTS', False)
+                 else self.admin_site.admin_view(views.export_workshop_order_pdf),
                  name='taller_order_workshop_export_pdf'),
+            path('<path:object_id>/export_pdf_async', views.export_workshop_order_pdf_async,
+                 name='taller_order_workshop_export_pdf_async'),
+        ]
+        # Antes que las del admin, cuyo '<path:object_id>/' también coincide con 'search/'
+        search_urls = [
+            path('search/', self.admin_site.admin_view(self.repair_search_view), name='taller_workshoporder_search'),
         ]
 
-        return super().get_urls() + urls
+        return search_urls + super().get_urls() + urls
+
+    def get_search_results(self, request, queryset, search_term):
+        result, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        # El texto de la reparación se busca en el índice de texto
+        orders = search.matching_orders(search_term) if search.supported() else None
+        if orders is not None:
+            result |= queryset.filter(pk__in=orders)
+        # Las órdenes se muestran por su número, así que también se buscan por él
+        if search_term.strip().isdigit():
+            result |= queryset.filter(pk=int(search_term))
+        return result, may_have_duplicates
+
+    def repair_search_view(self, request):
+        """Historial de reparaciones: las órdenes que contienen el texto buscado, de la más a la menos relevante."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        query = request.GET.get('q', '').strip()
+        results = list()
+        if query:
+            with replica.reading(since=replica.last_write(request)) as database:
+                found = search.search_orders(query, using=database)
+                orders = (WorkshopOrder.objects
+                          .select_related('enterprise', 'vehicle')
+                          .only('entry_date', 'enterprise__name', 'vehicle__tag')
+                          .in_bulk([order_id for order_id, _ in found]))
+            results = [(orders[order_id], fragment) for order_id, fragment in found if order_id in orders]
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Historial de reparaciones',
+            'opts': self.model._meta,
+            'query': query,
+            'results': results,
+        }
+        return TemplateResponse(request, 'admin/taller/repair_search.html', context)
 
 
 @admin.register(Activity)
-class ActivityAdmin(admin.ModelAdmin):
+class ActivityAdmin(LargeTableMixin, ExtractExportMixin, admin.ModelAdmin):
     list_display = ('invoice', 'code', 'provenance')
-    search_fields = ['invoice__pk', 'code', 'provenance__provenance']
+    list_select_related = ['invoice', 'provenance']
+    autocomplete_fields = ['invoice']
+    list_filter = ['invoice__date']
+    search_fields = ['provenance__provenance']
+    extract_kind = extracts.ACTIVITY
+
+    def get_search_results(self, request, queryset, search_term):
+        # Los números son facturas o códigos, que se buscan exactos en sus índices
+        if search_term.strip().isdigit():
+            number = int(search_term)
+            return queryset.filter(Q(invoice=number) | Q(code=number)), False
+        return super().get_search_results(request, queryset, search_term)
 
 
-class ActivityTabularInline(admin.TabularInline):
+class ActivityTabularInline(CachedChoicesMixin, admin.TabularInline):
     model = Activity
     extra = 0
+    ordering = ['code']
+    cached_choice_fields = ['unit_measurement', 'provenance']
 
 
 @admin.register(Invoice)
-class InvoiceAdmin(admin.ModelAdmin):
-    list_display = ('type', 'date', 'contact', 'workshop_order')
-    list_filter = ['date']
+class InvoiceAdmin(LargeTableMixin, CachedChoicesMixin, BatchExportMixin, ExtractExportMixin, admin.ModelAdmin):
+    list_display = ('type', 'date', 'contact', 'workshop_order', 'line_count', 'total')
+    list_select_related = ['type', 'contact', 'workshop_order']
+    list_filter = ['date', TotalRangeFilter]
     search_fields = ['type__title', 'date', 'contact__name', 'workshop_order__pk']
+    autocomplete_fields = ['contact', 'workshop_order']
+    cached_choice_fields = ['type']
     inlines = [ActivityTabularInline]
     change_form_template = "admin/show_invoice.html"
+    batch_kind = batch.INVOICE
+    extract_kind = extracts.INVOICE
+    actions = BatchExportMixin.actions + ExtractExportMixin.actions
 
     def get_urls(self):
         urls = [
-            path('<path:object_id>/export_pdf', views.export_invoice_pdf, name='taller_invoice_export_pdf'),
+            path('<path:object_id>/export_pdf',
+                 views.export_invoice_pdf_async if getattr(settings, 'TALLER_ASYNC_EXPORTS', False)
+                 else self.admin_site.admin_view(views.export_invoice_pdf),
+                 name='taller_invoice_export_pdf'),
+            path('<path:object_id>/export_pdf_async', views.export_invoice_pdf_async,
+                 name='taller_invoice_export_pdf_async'),
         ]
 
         return super().get_urls() + urls
@@ -112,3 +302,63 @@ class InvoiceAdmin(admin.ModelAdmin):
 @admin.register(Provenance)
 class Provenance(admin.ModelAdmin):
     search_fields = ['provenance']
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'status', 'created', 'finished')
+    list_filter = ['status', 'kind']
+    readonly_fields = ('kind', 'object_id', 'status', 'error', 'created', 'started', 'finished')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path('<int:job_id>/status', self.admin_site.admin_view(views.export_job_status),
+                 name='taller_exportjob_status'),
+            path('<int:job_id>/download', self.admin_site.admin_view(views.export_job_download),
+                 name='taller_exportjob_download'),
+        ]
+
+        return super().get_urls() + urls
+
+
+@admin.register(ReportSummary)
+class ReportSummaryAdmin(admin.ModelAdmin):
+    """Panel de reportes; lee solo las tablas de resumen, que se actualizan con cada factura."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        with replica.reading(since=replica.last_write(request)):
+            years = reports.years()
+            try:
+                year = int(request.GET.get('year', ''))
+            except ValueError:
+                year = years[0] if years else timezone.localdate().year
+            dashboard = reports.dashboard(year)
+
+        context = {
+            **self.admin_site.each_context(request),
+            **dashboard,
+            'title': 'Reportes de {}'.format(year),
+            'opts': self.model._meta,
+            'year': year,
+            'years': years,
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/reports.html', context)
@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class TallerConfig(AppConfig):
     name = 'taller'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+
+        if getattr(settings, 'TALLER_PDF_WARMUP', False):
+            from . import pdf_registry
+            pdf_registry.warm_up()
@@ -0,0 +1,161 @@
+import logging
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import connections
+from reportlab.platypus import PageBreak, SimpleDocTemplate
+
+from . import replica
+from .documents import WORKSHOP_ORDER, INVOICE, DOCUMENTS, new_document, open_pdf, workshop_order_story, \
+    invoice_story
+from .extracts import date_filters
+from .models import WorkshopOrder, Invoice
+from .pdf_pages import PageDecoratedCanvas, decorate_page
+
+logger = logging.getLogger(__name__)
+
+BATCHES = {
+    WORKSHOP_ORDER: (WorkshopOrder, 'entry_date', workshop_order_story, 'Ordenes de trabajo', 'Orden de trabajo {}.pdf'),
+    INVOICE: (Invoice, 'date', invoice_story, 'Facturas', 'Factura {}.pdf'),
+}
+
+ZIP = 'zip'
+MERGED = 'pdf'
+
+
+def select_ids(kind, date_from=None, date_to=None):
+    """Ids de los documentos cuya fecha está en el rango, ambos extremos incluidos."""
+    model, date_field, _, _, _ = BATCHES[kind]
+
+    queryset = model.objects.filter(**date_filters(date_field, date_from, date_to)).order_by(date_field, 'pk')
+    return list(queryset.values_list('pk', flat=True))
+
+
+def _init_worker(database=None):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'buenvecino.settings')
+    django.setup()
+    # Los procesos no heredan el contexto: leen de la misma base que eligió el proceso que exporta
+    replica.use(database)
+
+
+def _render(kind, object_id):
+    pdf = open_pdf(kind, object_id)
+    if pdf is None:
+        return object_id, None
+    with pdf:
+        return object_id, pdf.read()
+
+
+def _render_in_thread(kind, object_id, database=None):
+    try:
+        # Los hilos no heredan el contexto: leen de la misma base que eligió el hilo que exporta
+        with replica.using(database):
+            return _render(kind, object_id)
+    finally:
+        # Cada hilo tiene sus propias conexiones y el grupo se descarta al terminar la exportación
+        connections.close_all()
+
+
+def export_zip(kind, object_ids, stream, workers=None, processes=True):
+    """Escribe en ``stream`` un ZIP con un PDF por documento, generados en paralelo.
+
+    ``export_pdfs`` usa procesos, uno por CPU si no se indica otra cosa. Dentro de una petición no
+    se crean procesos: se usa un grupo de ``TALLER_BATCH_EXPORT_THREADS`` hilos. Con un solo
+    trabajador los PDF se generan en el hilo actual. Devuelve la cantidad de documentos exportados.
+    """
+    if processes:
+        workers = workers or getattr(settings, 'TALLER_BATCH_EXPORT_WORKERS', None) or os.cpu_count()
+    else:
+        workers = workers or getattr(settings, 'TALLER_BATCH_EXPORT_THREADS', 4)
+    filename = BATCHES[kind][4]
+
+    if workers > 1 and processes:
+        # Los procesos hijos no deben heredar conexiones abiertas a la base de datos
+        connections.close_all()
+
+    count = 0
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as archive:
+        if workers > 1 and processes:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                           initargs=(replica.current(),))
+            results = executor.map(_render, [kind] * len(object_ids), object_ids, chunksize=4)
+        elif workers > 1:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-export')
+            results = executor.map(_render_in_thread, [kind] * len(object_ids), object_ids,
+                                   [replica.current()] * len(object_ids))
+        else:
+            executor = None
+            results = map(_render, [kind] * len(object_ids), object_ids)
+        try:
+            for object_id, pdf in results:
+                if pdf is not None:
+                    archive.writestr(filename.format(object_id), pdf)
+                    count += 1
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    return count
+
+
+class _Pending:
+    """Lugar de un documento en la exportación combinada, que se carga cuando la composición llega a él."""
+
+    def __init__(self, object_id):
+        self.object_id = object_id
+
+
+class _MergedDocTemplate(SimpleDocTemplate):
+    load = None
+    story_of = None
+    count = 0
+
+    def filterFlowables(self, flowables):
+        while flowables and isinstance(flowables[0], _Pending):
+            document = self.load(flowables.pop(0).object_id)
+            if document is None:
+                continue
+            story = self.story_of(document, self.width)
+            if self.count:
+                story.insert(0, PageBreak())
+            flowables[0:0] = story
+            self.count += 1
+        if not flowables:
+            # handle_flowable descarta un None
+            flowables.append(None)
+
+
+def export_merged(kind, object_ids, stream):
+    """Escribe en ``stream`` un único PDF con todos los documentos, uno a continuación del otro.
+
+    ReportLab no puede concatenar PDF ya generados, así que el documento se compone en una sola
+    pasada y en un solo hilo. Cada documento se carga cuando la composición llega a él, por lo que
+    en memoria solo está la historia del documento en curso; las páginas ya compuestas sí se
+    conservan hasta escribir el PDF. Devuelve la cantidad de documentos exportados.
+    """
+    _, _, story_of, title, _ = BATCHES[kind]
+
+    doc = new_document(stream, title, template=_MergedDocTemplate)
+    doc.load = DOCUMENTS[kind][1]
+    doc.story_of = story_of
+    if object_ids:
+        doc.build([_Pending(object_id) for object_id in object_ids], onFirstPage=decorate_page,
+                  onLaterPages=decorate_page, canvasmaker=PageDecoratedCanvas)
+    return doc.count
+
+
+def export(kind, object_ids, stream, output_format=ZIP, workers=None, processes=True):
+    """Exporta los documentos en el formato pedido y devuelve ``(cantidad, segundos)``."""
+    start = time.perf_counter()
+    if output_format == MERGED:
+        count = export_merged(kind, object_ids, stream)
+    else:
+        count = export_zip(kind, object_ids, stream, workers, processes)
+    seconds = time.perf_counter() - start
+
+    logger.info('%d documentos exportados en %.2f s (%.1f documentos/s)', count, seconds,
+                count / seconds if seconds else 0)
+    return count, seconds
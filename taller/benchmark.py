@@ -0,0 +1,207 @@
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection, transaction
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import WorkshopOrder, Invoice, Activity
+
+EXPORTS = {
+    'workshop_order': (WorkshopOrder, 'admin:taller_order_workshop_export_pdf'),
+    'invoice': (Invoice, 'admin:taller_invoice_export_pdf'),
+}
+
+
+def targets(samples=5, random_seed=0):
+    """``(nombre, urls)`` de cada exportación a PDF y de cada listado registrado en el admin."""
+    rand = random.Random(random_seed)
+    result = list()
+    for kind, (model, url_name) in EXPORTS.items():
+        object_ids = list(model.objects.values_list('pk', flat=True).order_by('pk'))
+        if object_ids:
+            result.append(('pdf:{}'.format(kind), [reverse(url_name, args=[object_id]) for object_id in
+                                                   rand.sample(object_ids, min(samples, len(object_ids)))]))
+    for model in sorted(admin.site._registry, key=lambda model: model._meta.label):
+        opts = model._meta
+        result.append(('changelist:{}'.format(opts.label_lower),
+                       [reverse('admin:{}_{}_changelist'.format(opts.app_label, opts.model_name))]))
+    return result
+
+
+def _get(client, url):
+    """``(estado, bytes, error)`` de la petición; el error es None si la respuesta es 2xx."""
+    try:
+        response = client.get(url)
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        response.close()
+    except Exception as e:
+        return None, 0, '{}: {}'.format(type(e).__name__, e)
+    if 200 <= response.status_code < 300:
+        return response.status_code, size, None
+    exc_info = getattr(response, 'exc_info', None)
+    if exc_info:
+        return response.status_code, size, '{}: {}'.format(exc_info[0].__name__, exc_info[1])
+    return response.status_code, size, response.reason_phrase
+
+
+def _percentile(latencies, percent):
+    if len(latencies) < 2:
+        return latencies[0]
+    return statistics.quantiles(latencies, n=100, method='inclusive')[percent - 1]
+
+
+def measure(client, name, urls, requests):
+    """Latencias, consultas y memoria máxima de ``requests`` peticiones repartidas entre ``urls``.
+
+    Las respuestas con error se cuentan en ``failed`` y se describen, una por URL, en ``failures``.
+    """
+    latencies, queries, sizes, statuses = list(), list(), list(), set()
+    failed, failures = 0, dict()
+    _get(client, urls[0])
+    for pos in range(requests):
+        url = urls[pos % len(urls)]
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            status, size, error = _get(client, url)
+            latencies.append(time.perf_counter() - start)
+        queries.append(len(captured))
+        sizes.append(size)
+        statuses.add(status)
+        if error is not None:
+            failed += 1
+            failures.setdefault(url, {'url': url, 'status': status, 'error': error})
+
+    # La memoria se mide aparte porque tracemalloc hace más lentas las peticiones
+    tracemalloc.start()
+    try:
+        _get(client, urls[0])
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'name': name,
+        'requests': requests,
+        'status': sorted(statuses, key=lambda status: -1 if status is None else status),
+        'failed': failed,
+        'failures': list(failures.values()),
+        'mean': statistics.mean(latencies),
+        'p50': _percentile(latencies, 50),
+        'p90': _percentile(latencies, 90),
+        'p95': _percentile(latencies, 95),
+        'p99': _percentile(latencies, 99),
+        'max': max(latencies),
+        'queries': max(queries),
+        'bytes': max(sizes),
+        'peak_memory': peak_memory,
+    }
+
+
+def run(requests=20, samples=5, only=None):
+    """Ejecuta las mediciones con un superusuario temporal, que se elimina al terminar."""
+    result = {
+        'started': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'rows': {model._meta.label_lower: model.objects.count() for model in admin.site._registry},
+        'results': list(),
+    }
+    user = User.objects.create_superuser('benchmark-{}'.format(time.time_ns()), '', None)
+    try:
+        # Los errores de una página se anotan en su resultado sin detener las demás mediciones
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        for name, urls in targets(samples):
+            if only and not any(pattern in name for pattern in only):
+                continue
+            result['results'].append(measure(client, name, urls, requests))
+        client.logout()
+    finally:
+        user.delete()
+    return result
+
+
+def compare(current, previous):
+    """Variación de p50 respecto de una ejecución anterior, por nombre; positiva si es más lenta."""
+    before = {entry['name']: entry for entry in previous['results']}
+    return {entry['name']: entry['p50'] / before[entry['name']]['p50'] - 1
+            for entry in current['results'] if entry['name'] in before and before[entry['name']]['p50']}
+
+
+def write_orders(writers=4, transactions=20, activities=5):
+    """Guarda órdenes con su factura y sus actividades desde ``writers`` hilos a la vez.
+
+    Cada transacción crea una orden, su factura y ``activities`` actividades, como al cargarlas en el
+    admin. Usa como modelo la primera orden con factura y borra lo creado al terminar.
+    """
+    template = Invoice.objects.select_related('workshop_order').order_by('pk').first()
+    line = Activity.objects.order_by('pk').first()
+    if template is None or line is None:
+        raise ValueError('No hay facturas con actividades para usar como modelo')
+    order_fields = {field.attname: getattr(template.workshop_order, field.attname)
+                    for field in WorkshopOrder._meta.concrete_fields if not field.primary_key}
+    first_code = (Activity.objects.aggregate(last=Max('code'))['last'] or 0) + 1
+
+    latencies, created, errors = list(), list(), list()
+    lock = threading.Lock()
+
+    def writer(number):
+        code = first_code + number * transactions * activities
+        try:
+            for _ in range(transactions):
+                start = time.perf_counter()
+                try:
+                    with transaction.atomic():
+                        order = WorkshopOrder.objects.create(**order_fields)
+                        invoice = Invoice.objects.create(
+                            workshop_order=order, type_id=template.type_id, contact_id=template.contact_id,
+                            services_provided=template.services_provided, workforce=template.workforce,
+                            expendable_material=template.expendable_material)
+                        for _ in range(activities):
+                            Activity.objects.create(
+                                invoice=invoice, code=code, description=line.description, price=line.price,
+                                unit_measurement_id=line.unit_measurement_id, provenance_id=line.provenance_id,
+                                hours_worked=line.hours_worked, amount=line.amount)
+                            code += 1
+                except OperationalError as e:
+                    with lock:
+                        errors.append(str(e))
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+                    created.append(order.pk)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=writer, args=(number,)) for number in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    WorkshopOrder.objects.filter(pk__in=created).delete()
+    return {
+        'database': connection.vendor,
+        'writers': writers,
+        'transactions': len(created),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'seconds': seconds,
+        'per_second': len(created) / seconds if seconds else 0.0,
+        'p50': _percentile(latencies, 50) if latencies else None,
+        'p95': _percentile(latencies, 95) if latencies else None,
+        'max': max(latencies) if latencies else None,
+    }
@@ -0,0 +1,20 @@
+from django.core.checks import Tags, Warning, register
+from django.db import connections
+
+from . import search
+
+
+@register(Tags.database)
+def check_search_triggers(app_configs=None, databases=None, **kwargs):
+    """Avisa si faltan los disparadores que mantienen al día el índice de búsqueda de reparaciones."""
+    warnings = []
+    for alias in databases or []:
+        missing = search.missing_triggers(connections[alias])
+        if missing:
+            warnings.append(Warning(
+                'Faltan disparadores del índice de búsqueda en la base de datos "{}": {}.'.format(
+                    alias, ', '.join(missing)),
+                hint='Ejecute manage.py rebuild_search_index.',
+                id='taller.W001',
+            ))
+    return warnings
@@ -0,0 +1,466 @@
+import tempfile
+import time
+
+from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Flowable, FrameBreak, LongTable, Table, TableStyle, Paragraph, \
+    Spacer
+
+from . import metrics, pdf_cache, pdf_registry
+from .loaders import load_workshop_order, load_invoice, workshop_order_version, invoice_version
+from .pdf_pages import PageDecoratedCanvas, decorate_page, decorate_numbered_page
+
+LARGE_INVOICE_CHUNK_ROWS = 500
+
+WORKSHOP_ORDER = 'workshop_order'
+INVOICE = 'invoice'
+
+
+def new_document(stream, title, template=SimpleDocTemplate):
+    return template(stream,
+                    pagesize=letter,
+                    topMargin=3.55 * cm,
+                    bottomMargin=3.18 * cm,
+                    leftMargin=1.27 * cm,
+                    rightMargin=1.27 * cm,
+                    title=title,
+                    author='Taller Buen Vecino')
+
+
+def build_document(kind, doc, story, on_page):
+    """Compone y escribe el PDF, y registra por separado el tiempo de composición y el de escritura."""
+    start = time.perf_counter()
+    doc.build(story, onFirstPage=on_page, onLaterPages=on_page, canvasmaker=PageDecoratedCanvas)
+    seconds = time.perf_counter() - start
+    if metrics.enabled():
+        write_seconds = doc.canv.save_seconds
+        metrics.observe('taller_pdf_phase_duration_seconds', seconds - write_seconds,
+                        (('kind', kind), ('phase', 'layout')))
+        metrics.observe('taller_pdf_phase_duration_seconds', write_seconds, (('kind', kind), ('phase', 'write')))
+
+
+def render_workshop_order(workshop_order, stream):
+    doc = new_document(stream, 'Orden de taller')
+    with metrics.pdf_phase(WORKSHOP_ORDER, 'build'):
+        story = workshop_order_story(workshop_order, doc.width)
+    build_document(WORKSHOP_ORDER, doc, story, decorate_page)
+
+
+def render_invoice(invoice, stream):
+    doc = new_document(stream, 'Factura')
+    with metrics.pdf_phase(INVOICE, 'build'):
+        story = invoice_story(invoice, doc.width)
+    build_document(INVOICE, doc, story, decorate_numbered_page)
+
+
+def workshop_order_story(workshop_order, width):
+    physicals_state = workshop_order.physicalstate_set.all()
+
+    styles = pdf_registry.get_order_styles()
+
+    body = list()
+
+    rows = list()
+    rows.append([Paragraph('ORDEN DE TRABAJO', styles['Workshop_Order_Title'])])
+    rows.append([Paragraph('No. Orden:', styles['Workshop_Order_Normal_Bold_14_Right']),
+                 Paragraph(str(workshop_order), styles['Workshop_Order_Normal_14']),
+                 Paragraph('Nombre Cliente o Empresa:', styles['Workshop_Order_Normal_Bold_14_Right']),
+                 Paragraph(workshop_order.enterprise.name, styles['Workshop_Order_Normal_14'])])
+    rows.append([Paragraph('Fecha de entrada:', styles['Workshop_Order_Normal_Bold_14_Right']),
+                 Paragraph(workshop_order.entry_date.strftime('%d/%m/%Y'), styles['Workshop_Order_Normal_14']),
+                 Paragraph('Presupuesto:', styles['Workshop_Order_Normal_Bold_14_Right']),
+                 Paragraph('$ {:,.2f}'.format(workshop_order.estimation), styles['Workshop_Order_Normal_14_Right'])])
+    rows.append([Paragraph('Marca y Modelo:', styles['Workshop_Order_Normal_Bold_14_Right']),
+                 Paragraph('{} / {}'.format(workshop_order.vehicle.mark, workshop_order.vehicle.model),
+                           styles['Workshop_Order_Normal_14']),
+                 Paragraph('Tiempo estimado:', styles['Workshop_Order_Normal_Bold_14_Right']),
+                 Paragraph('{:.2f} hs'.format(workshop_order.estimated_time),
+                           styles['Workshop_Order_Normal_14_Right'])])
+    rows.append([Paragraph('Chapa:', styles['Workshop_Order_Normal_Bold_14_Right']),
+                 Paragraph(workshop_order.vehicle.tag, styles['Workshop_Order_Normal_14']),
+                 Paragraph('Kilometraje:', styles['Workshop_Order_Normal_Bold_14_Right']),
+                 Paragraph('{} km'.format(workshop_order.mileage), styles['Workshop_Order_Normal_14_Right'])])
+    rows.append([Paragraph('Mecánico Responsable:', styles['Workshop_Order_Normal_Bold_14_Right']),
+                 Paragraph('{} {}'.format(workshop_order.mechanical.name, workshop_order.mechanical.last_name),
+                           styles['Workshop_Order_Normal_14']),
+                 Paragraph('Ayudante:', styles['Workshop_Order_Normal_Bold_14_Right']),
+                 Paragraph('{} {}'.format(workshop_order.assistant.name, workshop_order.assistant.last_name),
+                           styles['Workshop_Order_Normal_14'])])
+    rows.append([[Paragraph('Defectación:', styles['Workshop_Order_Normal_Bold_14']),
+                  Paragraph(workshop_order.defection, styles['Workshop_Order_Normal_14_Justify'])]])
+    rows.append([[Paragraph('Trabajo realizado:', styles['Workshop_Order_Normal_Bold_14']),
+                  Paragraph(workshop_order.work_done, styles['Workshop_Order_Normal_14_Justify'])]])
+    rows.append(
+        [Paragraph('Estado físico del vehículo al entrar al taller', styles['Workshop_Order_Normal_14_Center'])])
+    for physical_state in physicals_state:
+        rows.append([Paragraph(physical_state.piece.name, styles['Workshop_Order_Normal_14_Justify']),
+                     Paragraph(physical_state.description, styles['Workshop_Order_Normal_14_Justify'])])
+    rows.append([Paragraph('Fecha de entrega al cliente:', styles['Workshop_Order_Normal_Bold_12_Right']),
+                 Paragraph(workshop_order.delivery_date.strftime('%d/%m/%Y'), styles['Workshop_Order_Normal_12']),
+                 Paragraph('Forma de pago:', styles['Workshop_Order_Normal_Bold_12_Right']),
+                 Paragraph(workshop_order.method_payment.type, styles['Workshop_Order_Normal_12'])])
+    rows.append([Paragraph('Nombre del cliente:', styles['Workshop_Order_Normal_Bold_12_Right']),
+                 Paragraph(workshop_order.enterprise.name, styles['Workshop_Order_Normal_12']),
+                 Paragraph('Costo mano de obra:', styles['Workshop_Order_Normal_Bold_12_Right']),
+                 Paragraph('$ {:,.2f}'.format(workshop_order.workforce_cost),
+                           styles['Workshop_Order_Normal_12_Right'])])
+    rows.append(
+        [[Paragraph('Quejas o sugerencias:', styles['Workshop_Order_Normal_Bold_12']),
+          Paragraph(workshop_order.complaints_suggestions, styles['Workshop_Order_Normal_12_Justify'])], '',
+         [Paragraph('Descripción Materias primas y piezas:', styles['Workshop_Order_Normal_Bold_12']),
+          Paragraph(workshop_order.description_raw_materials_parts, styles['Workshop_Order_Normal_12_Justify'])]])
+    rows.append([Paragraph('Firma Cliente:', styles['Workshop_Order_Normal_Bold_12_Center']), '',
+                 Paragraph('Importe en Piezas y Materias primas:', styles['Workshop_Order_Normal_Bold_12_Right']),
+                 Paragraph('$ {:,.2f}'.format(workshop_order.amount), styles['Workshop_Order_Normal_12_Right'])])
+    rows.append(['', '', Paragraph('Total a pagar:', styles['Workshop_Order_Normal_Bold_12_Right']),
+                 Paragraph('$ {:,.2f}'.format(workshop_order.total),
+                           styles['Workshop_Order_Normal_12_Right'])])
+    rows.append([Paragraph('Garantia del Servicio:', styles['Workshop_Order_Normal_16']),
+                 Paragraph(workshop_order.service_guarantee.description, styles['Workshop_Order_Normal_16_Justify'])])
+
+    col_widths = [
+        width * 0.28,
+        width * 0.25,
+        width * 0.22,
+        width * 0.25
+    ]
+
+    style = TableStyle([
+        ('BOX', (0, 0), (-1, -1), 0.5, colors.black),
+        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('SPAN', (0, 0), (-1, 0)),
+        ('SPAN', (0, 6), (-1, 6)),
+        ('SPAN', (0, 7), (-1, 7)),
+        ('SPAN', (0, 8), (-1, 8)),
+        ('SPAN', (1, 9), (-1, -7)),
+        ('SPAN', (0, -4), (1, -4)),
+        ('SPAN', (2, -4), (3, -4)),
+        ('SPAN', (0, -3), (0, -2)),
+        ('VALIGN', (0, -3), (0, -2), 'MIDDLE'),
+        ('SPAN', (1, -3), (1, -2)),
+        ('SPAN', (1, -1), (-1, -1))
+    ])
+
+    table = Table(rows, colWidths=col_widths, style=style)
+    body.append(table)
+
+    return body
+
+
+def invoice_story(invoice, width):
+    activities = invoice.activity_set.all()
+
+    styles = pdf_registry.get_invoice_styles()
+
+    body = list()
+
+    rows = list()
+    rows.append([Paragraph(invoice.type.title, styles['Invoice_Normal_Bold_Center'])])
+    rows.append([Paragraph('Nombre:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph(invoice.contact.name, styles['Invoice_Normal']),
+                 Paragraph('TCP:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph(invoice.contact.tcp, styles['Invoice_Normal'])])
+    rows.append([Paragraph('Dirección:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph(invoice.contact.address, styles['Invoice_Normal']),
+                 Paragraph('Nit:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph(str(invoice.contact.nit), styles['Invoice_Normal'])])
+    rows.append([Paragraph('Email:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph(invoice.contact.email, styles['Invoice_Normal']),
+                 Paragraph('No.cuenta CUP:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph(str(invoice.contact.no_check_cup), styles['Invoice_Normal'])])
+    rows.append([Paragraph('Teléfono:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph(str(invoice.contact.phone), styles['Invoice_Normal'])])
+
+    col_widths = [
+        width * 0.11,
+        width * 0.39,
+        width * 0.16,
+        width * 0.34
+    ]
+
+    style = TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('SPAN', (0, 0), (-1, 0))
+    ])
+
+    table = Table(rows, colWidths=col_widths, style=style)
+    body.append(table)
+    body.append(Spacer(1, 11))
+
+    rows = list()
+    rows.append([Paragraph('Datos del Cliente', styles['Invoice_Normal_Bold_Center']), '',
+                 Paragraph('Del Servicio', styles['Invoice_Normal_Bold_Center']), ''])
+    rows.append([Paragraph('Nombre:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph(invoice.workshop_order.enterprise.name, styles['Invoice_Normal']),
+                 Paragraph('No. Factura:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph(str(invoice.pk), styles['Invoice_Normal_Center'])])
+    rows.append([Paragraph('Domicilio:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph(invoice.workshop_order.enterprise.address, styles['Invoice_Normal']),
+                 Paragraph('Referencia OT No:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph(str(invoice.workshop_order.pk), styles['Invoice_Normal_Center'])])
+    rows.append([Paragraph('Teléfono:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph(str(invoice.workshop_order.enterprise.phone), styles['Invoice_Normal']),
+                 Paragraph('No. Factura OT No:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph('{} - {}'.format(invoice, invoice.workshop_order), styles['Invoice_Normal_Center'])])
+    rows.append([Paragraph('Vehículo', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph('{} / {}'.format(invoice.workshop_order.vehicle.mark, invoice.workshop_order.vehicle.model),
+                           styles['Invoice_Normal']), Paragraph('Fecha:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph(invoice.date.strftime('%d/%m/%Y'), styles['Invoice_Normal_Center'])])
+    rows.append([Paragraph('Chapa:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph(invoice.workshop_order.vehicle.tag, styles['Invoice_Normal']),
+                 Paragraph('Moneda:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph('CUP', styles['Invoice_Normal_Center'])])
+
+    col_widths = [
+        width * 0.11,
+        width * 0.39,
+        width * 0.19,
+        width * 0.31
+    ]
+
+    style = TableStyle([
+        ('BOX', (0, 0), (-1, -1), 0.5, colors.black),
+        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('SPAN', (0, 0), (1, 0)),
+        ('SPAN', (2, 0), (3, 0))
+    ])
+
+    table = Table(rows, colWidths=col_widths, style=style)
+    body.append(table)
+    body.append(Spacer(1, 11))
+    body.append(Spacer(1, 11))
+
+    if len(activities) > getattr(settings, 'TALLER_PDF_LARGE_INVOICE_ROWS', 200):
+        body += large_invoice_activities(invoice, activities, styles, width)
+    else:
+        body += invoice_activities(invoice, activities, styles, width)
+    body.append(Spacer(1, 11))
+    body.append(Spacer(1, 11))
+    body.append(Spacer(1, 11))
+    body.append(Spacer(1, 11))
+
+    rows = list()
+    rows.append([Paragraph('Facturado por:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph('Evelio Mojena Álvarez', styles['Invoice_Normal']),
+                 Paragraph('Recibido por:', styles['Invoice_Normal_Bold_Right']), ''])
+    rows.append([Paragraph('Cargo:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph('Jefe de Taller', styles['Invoice_Normal']), '', ''])
+    rows.append([Paragraph('Fecha:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph('____/ ____/ 2021', styles['Invoice_Normal']),
+                 Paragraph('Fecha:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph('____/ ____/ 2021', styles['Invoice_Normal'])])
+    rows.append([Paragraph('Firma:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph('_____________________', styles['Invoice_Normal']),
+                 Paragraph('Firma:', styles['Invoice_Normal_Bold_Right']),
+                 Paragraph('_____________________', styles['Invoice_Normal'])])
+
+    col_widths = [
+        width * 0.15,
+        width * 0.35,
+        width * 0.15,
+        width * 0.35
+    ]
+
+    table = Table(rows, colWidths=col_widths)
+    body.append(table)
+
+    return body
+
+
+INVOICE_ACTIVITIES_COLUMNS = (0.06, 0.13, 0.26, 0.06, 0.09, 0.08, 0.12, 0.07, 0.13)
+
+
+def invoice_activities_header(styles):
+    return [Paragraph('No.', styles['Invoice_Normal_Bold']), Paragraph('Código', styles['Invoice_Normal_Bold']),
+            Paragraph('Descripción', styles['Invoice_Normal_Bold']),
+            Paragraph('u/m', styles['Invoice_Normal_Bold']),
+            Paragraph('Horas Trabajo', styles['Invoice_Normal_Bold']),
+            Paragraph('Proc.', styles['Invoice_Normal_Bold']), Paragraph('Precio', styles['Invoice_Normal_Bold']),
+            Paragraph('Cant.', styles['Invoice_Normal_Bold']),
+            Paragraph('Importe', styles['Invoice_Normal_Bold'])]
+
+
+def invoice_activities(invoice, activities, styles, width):
+    rows = list()
+    rows.append(invoice_activities_header(styles))
+    pos = 1
+    for activity in activities:
+        rows.append(
+            [Paragraph(str(pos), styles['Invoice_Normal_Right']),
+             Paragraph(str(activity.code), styles['Invoice_Normal']),
+             Paragraph(activity.description, styles['Invoice_Normal']),
+             Paragraph(activity.unit_measurement.name, styles['Invoice_Normal']),
+             Paragraph(str(activity.hours_worked), styles['Invoice_Normal_Right']),
+             Paragraph(activity.provenance.provenance, styles['Invoice_Normal']),
+             Paragraph('$ {:,.2f}'.format(activity.price), styles['Invoice_Normal_Right']),
+             Paragraph(str(activity.amount), styles['Invoice_Normal_Right']),
+             Paragraph('$ {:,.2f}'.format(activity.price * activity.amount), styles['Invoice_Normal_Right'])])
+        pos += 1
+
+    col_widths = [width * fraction for fraction in INVOICE_ACTIVITIES_COLUMNS]
+
+    style = TableStyle([
+        ('BOX', (0, 0), (-1, -1), 0.5, colors.black),
+        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP')
+    ])
+
+    return [Table(rows, colWidths=col_widths, style=style, repeatRows=1)] + invoice_totals(invoice, styles, width)
+
+
+def invoice_totals(invoice, styles, width):
+    """Totales de la factura, en una tabla aparte de las actividades cuyo estilo no depende de su cantidad."""
+    rows = list()
+    rows.append(['', Paragraph('Servicios Prestados en el Taller', styles['Invoice_Normal']), '', '', '', '', '', '',
+                 Paragraph('$ {:,.2f}'.format(invoice.services_provided), styles['Invoice_Normal_Right'])])
+    rows.append(['', Paragraph('Material Gastable', styles['Invoice_Normal']), '', '', '', '', '', '',
+                 Paragraph('$ {:,.2f}'.format(invoice.expendable_material), styles['Invoice_Normal_Right'])])
+    rows.append(['', Paragraph('Mano de Obra', styles['Invoice_Normal']), '', '', '', '', '', '',
+                 Paragraph('$ {:,.2f}'.format(invoice.workforce), styles['Invoice_Normal_Right'])])
+    rows.append(['', Paragraph('Total', styles['Invoice_Normal']), '', '', '', '', '', '',
+                 Paragraph('$ {:,.2f}'.format(invoice.total), styles['Invoice_Normal_Right'])])
+
+    col_widths = [width * fraction for fraction in INVOICE_ACTIVITIES_COLUMNS]
+
+    style = TableStyle([
+        ('BOX', (0, 0), (-1, -1), 0.5, colors.black),
+        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('SPAN', (1, 0), (-2, 0)),
+        ('SPAN', (1, 1), (-2, 1)),
+        ('SPAN', (1, 2), (-2, 2)),
+        ('SPAN', (1, 3), (-2, 3))
+    ])
+
+    return [Spacer(1, 11), Table(rows, colWidths=col_widths, style=style)]
+
+
+class ChunkedTable(Flowable):
+    """Tabla repartida en varias LongTable sin encabezado, con una tabla de encabezado al principio de cada página.
+
+    Al dividirse, lo que cabe se devuelve como tablas sueltas y el resto como otra ChunkedTable, que
+    empieza en la página siguiente y por lo tanto con el encabezado.
+    """
+
+    def __init__(self, header, tables):
+        super().__init__()
+        self.header = header
+        self.tables = tables
+        self._heights = list()
+
+    def wrap(self, availWidth, availHeight):
+        # Solo se mide hasta pasarse del espacio disponible: en ese caso hay que dividirla de todas formas
+        self.width, self.height = 0, 0
+        self._heights = list()
+        for table in [self.header] + self.tables:
+            width, height = table.wrap(availWidth, availHeight - self.height)
+            self.width = max(self.width, width)
+            self.height += height
+            self._heights.append(height)
+            if self.height > availHeight:
+                break
+        return self.width, self.height
+
+    def draw(self):
+        y = self.height
+        for table, height in zip([self.header] + self.tables, self._heights):
+            y -= height
+            table.drawOn(self.canv, 0, y)
+
+    def split(self, availWidth, availHeight):
+        remaining = availHeight - self.header.wrap(availWidth, availHeight)[1]
+        parts = list()
+        rest = list()
+        for pos, table in enumerate(self.tables):
+            height = table.wrap(availWidth, remaining)[1]
+            if height <= remaining:
+                parts.append(table)
+                remaining -= height
+                continue
+            pieces = table.split(availWidth, remaining)
+            parts += pieces[:1]
+            rest = pieces[1:] + self.tables[pos + 1:] if pieces else self.tables[pos:]
+            break
+
+        if not parts:
+            # No cabe ninguna fila debajo del encabezado: la tabla entera pasa al marco siguiente
+            return [FrameBreak(), ChunkedTable(self.header, rest)]
+        return [self.header] + parts + ([ChunkedTable(self.header, rest)] if rest else [])
+
+
+def large_invoice_activities(invoice, activities, styles, width):
+    """Variante de invoice_activities para facturas con muchas actividades.
+
+    Las actividades se reparten en tablas divisibles de tamaño fijo, con el encabezado al principio de
+    cada página. Solo la descripción usa Paragraph; el resto de las celdas son texto plano.
+    """
+    col_widths = [width * fraction for fraction in INVOICE_ACTIVITIES_COLUMNS]
+    font_name = pdf_registry.get_font('Calibri')
+
+    style = TableStyle([
+        ('BOX', (0, 0), (-1, -1), 0.5, colors.black),
+        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('FONT', (0, 0), (-1, -1), font_name, 11, 13.2),
+        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+        ('ALIGN', (4, 0), (4, -1), 'RIGHT'),
+        ('ALIGN', (6, 0), (-1, -1), 'RIGHT')
+    ])
+
+    tables = list()
+    rows = list()
+    for pos, activity in enumerate(activities, start=1):
+        rows.append([str(pos), str(activity.code), Paragraph(activity.description, styles['Invoice_Normal']),
+                     activity.unit_measurement.name, str(activity.hours_worked), activity.provenance.provenance,
+                     '$ {:,.2f}'.format(activity.price), str(activity.amount),
+                     '$ {:,.2f}'.format(activity.price * activity.amount)])
+        if len(rows) >= LARGE_INVOICE_CHUNK_ROWS:
+            tables.append(LongTable(rows, colWidths=col_widths, style=style))
+            rows = list()
+    if rows:
+        tables.append(LongTable(rows, colWidths=col_widths, style=style))
+
+    header = LongTable([invoice_activities_header(styles)], colWidths=col_widths, style=style)
+    return [ChunkedTable(header, tables)] + invoice_totals(invoice, styles, width)
+
+
+DOCUMENTS = {
+    WORKSHOP_ORDER: (workshop_order_version, load_workshop_order, render_workshop_order, 'Orden de trabajo.pdf'),
+    INVOICE: (invoice_version, load_invoice, render_invoice, 'Orden de trabajo.pdf'),
+}
+
+
+def open_pdf(kind, object_id):
+    """Devuelve el PDF del documento como archivo abierto, o None si el documento no existe.
+
+    Se sirve desde la caché de PDF cuando la versión del documento no ha cambiado.
+    """
+    version_of, load, render, _ = DOCUMENTS[kind]
+
+    version = version_of(object_id)
+    if version is None:
+        return None
+
+    pdf = pdf_cache.get(kind, object_id, version)
+    if pdf is not None:
+        return pdf
+
+    with metrics.pdf_phase(kind, 'load'):
+        document = load(object_id)
+    if document is None:
+        return None
+
+    # Los PDF grandes pasan a disco en lugar de quedarse completos en memoria mientras se envían
+    spool = tempfile.SpooledTemporaryFile(max_size=getattr(settings, 'TALLER_PDF_SPOOL_MAX_SIZE', 5 * 1024 * 1024))
+    render(document, spool)
+    spool.seek(0)
+
+    pdf = pdf_cache.put(kind, object_id, version, spool)
+    if pdf is None:
+        return spool
+    spool.close()
+    return pdf
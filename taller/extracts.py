@@ -0,0 +1,150 @@
+import csv
+import datetime
+
+import pytz
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .documents import WORKSHOP_ORDER, INVOICE
+from .models import WorkshopOrder, Invoice, Activity
+
+ACTIVITY = 'activity'
+
+CSV = 'csv'
+JSONL = 'jsonl'
+CONTENT_TYPES = {
+    CSV: 'text/csv; charset=utf-8',
+    JSONL: 'application/x-ndjson; charset=utf-8',
+}
+
+# (modelo, campo de fecha, [(columna, campo)])
+EXTRACTS = {
+    WORKSHOP_ORDER: (WorkshopOrder, 'entry_date', [
+        ('id', 'pk'),
+        ('entry_date', 'entry_date'),
+        ('enterprise', 'enterprise__name'),
+        ('vehicle_tag', 'vehicle__tag'),
+        ('vehicle_mark', 'vehicle__mark'),
+        ('vehicle_model', 'vehicle__model'),
+        ('mechanical', 'mechanical__name'),
+        ('mechanical_last_name', 'mechanical__last_name'),
+        ('assistant', 'assistant__name'),
+        ('assistant_last_name', 'assistant__last_name'),
+        ('method_payment', 'method_payment__type'),
+        ('service_guarantee', 'service_guarantee__description'),
+        ('estimation', 'estimation'),
+        ('estimated_time', 'estimated_time'),
+        ('mileage', 'mileage'),
+        ('defection', 'defection'),
+        ('work_done', 'work_done'),
+        ('delivery_date', 'delivery_date'),
+        ('complaints_suggestions', 'complaints_suggestions'),
+        ('description_raw_materials_parts', 'description_raw_materials_parts'),
+        ('workforce_cost', 'workforce_cost'),
+        ('amount', 'amount'),
+        ('total', 'total'),
+    ]),
+    INVOICE: (Invoice, 'date', [
+        ('id', 'pk'),
+        ('date', 'date'),
+        ('type', 'type__title'),
+        ('contact', 'contact__name'),
+        ('contact_nit', 'contact__nit'),
+        ('workshop_order', 'workshop_order'),
+        ('enterprise', 'workshop_order__enterprise__name'),
+        ('vehicle_tag', 'workshop_order__vehicle__tag'),
+        ('services_provided', 'services_provided'),
+        ('expendable_material', 'expendable_material'),
+        ('workforce', 'workforce'),
+        ('activities_total', 'activities_total'),
+        ('line_count', 'line_count'),
+        ('total', 'total'),
+    ]),
+    ACTIVITY: (Activity, 'invoice__date', [
+        ('id', 'pk'),
+        ('invoice', 'invoice'),
+        ('invoice_date', 'invoice__date'),
+        ('code', 'code'),
+        ('description', 'description'),
+        ('unit_measurement', 'unit_measurement__name'),
+        ('hours_worked', 'hours_worked'),
+        ('provenance', 'provenance__provenance'),
+        ('price', 'price'),
+        ('amount', 'amount'),
+    ]),
+}
+
+
+def _chunk_size():
+    return getattr(settings, 'TALLER_EXTRACT_CHUNK_ROWS', 2000)
+
+
+def date_filters(date_field, date_from=None, date_to=None):
+    """Filtros de un rango de días, ambos incluidos, sobre un campo de fecha y hora.
+
+    Se comparan las fechas y horas de inicio de cada día en la zona horaria actual, como ``__date``, pero
+    sin aplicar una función a la columna, de modo que se puede usar su índice.
+    """
+    def start_of(day):
+        midnight = datetime.datetime.combine(day, datetime.time.min)
+        try:
+            return timezone.make_aware(midnight)
+        except pytz.AmbiguousTimeError:
+            # Al atrasar la hora a medianoche el día empieza con la primera de las dos
+            return timezone.make_aware(midnight, is_dst=True)
+        except pytz.NonExistentTimeError:
+            # Al adelantarla (como en La Habana) el día empieza en el instante del cambio
+            return timezone.make_aware(midnight, is_dst=False)
+
+    filters = dict()
+    if date_from is not None:
+        filters['{}__gte'.format(date_field)] = start_of(date_from)
+    if date_to is not None:
+        filters['{}__lt'.format(date_field)] = start_of(date_to + datetime.timedelta(days=1))
+    return filters
+
+
+def rows(kind, queryset=None, date_from=None, date_to=None, using=None):
+    """Filas del extracto como tuplas, leídas en bloques de la base ``using`` o de la que elija el router."""
+    model, date_field, columns = EXTRACTS[kind]
+    if queryset is None:
+        queryset = model.objects.all()
+    if using is not None:
+        queryset = queryset.using(using)
+    return (queryset
+            .filter(**date_filters(date_field, date_from, date_to))
+            .order_by('pk')
+            .values_list(*[field for _, field in columns])
+            .iterator(chunk_size=_chunk_size()))
+
+
+def _value(value):
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).isoformat()
+    return value
+
+
+class Echo:
+    """Buffer que devuelve lo que se escribe en él, para generar el CSV línea a línea."""
+
+    def write(self, value):
+        return value
+
+
+def lines(kind, output_format, queryset=None, date_from=None, date_to=None, using=None):
+    """Genera el extracto línea a línea en CSV o JSONL."""
+    headers = [column for column, _ in EXTRACTS[kind][2]]
+    if output_format == CSV:
+        writer = csv.writer(Echo())
+        yield writer.writerow(headers)
+        for row in rows(kind, queryset, date_from, date_to, using):
+            yield writer.writerow([_value(value) for value in row])
+    else:
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        for row in rows(kind, queryset, date_from, date_to, using):
+            yield encoder.encode(dict(zip(headers, map(_value, row)))) + '\n'
+
+
+def filename(kind, output_format):
+    return '{}.{}'.format(kind, output_format)
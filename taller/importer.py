@@ -0,0 +1,336 @@
+import csv
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from . import pdf_cache, reference, reports, totals
+from .documents import WORKSHOP_ORDER, INVOICE
+from .models import *
+
+logger = logging.getLogger(__name__)
+
+CSV = 'csv'
+JSONL = 'jsonl'
+
+AMBIGUOUS = object()
+
+
+class NaturalKeys:
+    """Mapa en memoria de clave natural a id, cargado con una sola consulta."""
+
+    def __init__(self, model, *fields):
+        self.model = model
+        self.fields = fields
+        self._ids = None
+
+    def _rows(self):
+        return self.model.objects.values_list('pk', *self.fields).iterator()
+
+    def _load(self):
+        self._ids = dict()
+        for pk, *key in self._rows():
+            key = tuple(str(value).strip() for value in key)
+            # Una clave repetida no identifica a ningún registro
+            self._ids[key] = AMBIGUOUS if key in self._ids else pk
+
+    def resolve(self, *key):
+        if self._ids is None:
+            self._load()
+        pk = self._ids.get(tuple(str(value).strip() for value in key))
+        if pk is None:
+            raise ValidationError('{} no existe: {}'.format(self.model._meta.verbose_name, ' '.join(key)))
+        if pk is AMBIGUOUS:
+            raise ValidationError('{} repetido: {}'.format(self.model._meta.verbose_name, ' '.join(key)))
+        return pk
+
+    def add(self, objects):
+        if self._ids is None:
+            return
+        for obj in objects:
+            if obj.pk is None:
+                # La base de datos no devolvió los ids; el mapa se recarga si se vuelve a usar
+                self._ids = None
+                return
+            key = tuple(str(getattr(obj, field)).strip() for field in self.fields)
+            self._ids[key] = AMBIGUOUS if key in self._ids else obj.pk
+
+    def reset(self):
+        self._ids = None
+
+
+class ReferenceKeys(NaturalKeys):
+    """Claves naturales de una tabla de referencia, leídas de la copia en memoria de ``taller.reference``."""
+
+    def __init__(self, model):
+        super().__init__(model, reference.NATURAL_KEYS[model])
+
+    def _rows(self):
+        return [(obj.pk, *[getattr(obj, field) for field in self.fields]) for obj in reference.rows(self.model)]
+
+
+class Changes:
+    """Órdenes y facturas tocadas por una importación, para recalcular sólo lo suyo al terminar."""
+
+    def __init__(self):
+        self.workshop_order_ids = set()
+        self.invoice_ids = set()
+        # Falso si se insertaron órdenes o facturas sin id, que bulk_create no siempre devuelve
+        self.known = True
+
+    def add(self, name, ids):
+        ids = set(ids)
+        if None in ids:
+            self.known = False
+            ids.discard(None)
+        getattr(self, name).update(ids)
+
+    def __bool__(self):
+        return bool(self.workshop_order_ids or self.invoice_ids) or not self.known
+
+
+class Importer:
+    """Convierte filas en instancias del modelo.
+
+    ``fields`` asocia columnas a campos del modelo y ``lookups`` asocia una o varias columnas a una
+    clave foránea que se resuelve por su clave natural. ``dates`` son los campos ``auto_now`` que se
+    conservan cuando la fila trae la fecha y el id. ``changes`` indica qué ids de ``Changes`` se
+    anotan y de qué campo: las órdenes o facturas cuyos totales, reportes y PDF dependen de la fila.
+    """
+
+    def __init__(self, model, fields, lookups=(), dates=(), natural_keys=None, changes=None):
+        self.model = model
+        self.fields = fields
+        self.lookups = lookups
+        self.dates = dates
+        self.natural_keys = natural_keys
+        self.changes = changes
+
+    def build(self, row):
+        obj = self.model()
+        errors = list()
+        for column, field_name in self.fields + [(date, date) for date in self.dates] + [('id', 'pk')]:
+            value = row.get(column)
+            if value is None or value == '':
+                if column == 'id' or column in self.dates:
+                    continue
+                field = self.model._meta.get_field(field_name)
+                if field.empty_strings_allowed:
+                    setattr(obj, field.attname, '')
+                elif not field.has_default() and not field.null:
+                    errors.append('{}: falta el valor'.format(column))
+                continue
+            field = self.model._meta.pk if field_name == 'pk' else self.model._meta.get_field(field_name)
+            try:
+                setattr(obj, field.attname, field.to_python(value))
+            except ValidationError as e:
+                errors.append('{}: {}'.format(column, ' '.join(e.messages)))
+
+        for columns, field_name, natural_keys in self.lookups:
+            try:
+                setattr(obj, self.model._meta.get_field(field_name).attname,
+                        natural_keys.resolve(*[row.get(column) or '' for column in columns]))
+            except ValidationError as e:
+                errors.append('{}: {}'.format(', '.join(columns), ' '.join(e.messages)))
+
+        if errors:
+            raise ValidationError(errors)
+        return obj
+
+    def save(self, objects):
+        # bulk_create fija la fecha actual en los campos auto_now; bulk_update no, así que las fechas
+        # que trae el archivo se restauran después en los registros con id conocido
+        dates = [{date: getattr(obj, date) for date in self.dates} for obj in objects]
+        with transaction.atomic():
+            self.model.objects.bulk_create(objects)
+            dated = list()
+            for obj, values in zip(objects, dates):
+                values = {date: value for date, value in values.items() if value is not None}
+                if obj.pk is not None and values:
+                    for date, value in values.items():
+                        setattr(obj, date, value)
+                    dated.append(obj)
+            if dated:
+                self.model.objects.bulk_update(dated, self.dates)
+            # bulk_create no envía señales
+            if self.model in reference.NATURAL_KEYS:
+                reference.invalidate(self.model)
+        if self.natural_keys is not None:
+            self.natural_keys.add(objects)
+
+
+ENTERPRISES = NaturalKeys(Enterprise, 'name')
+VEHICLES = NaturalKeys(Vehicle, 'tag')
+MECHANICALS = NaturalKeys(Mechanical, 'name', 'last_name')
+CONTACTS = NaturalKeys(Contact, 'name')
+TYPES = ReferenceKeys(Type)
+PIECES = ReferenceKeys(Piece)
+UNIT_MEASUREMENTS = ReferenceKeys(UnitMeasurement)
+METHOD_PAYMENTS = ReferenceKeys(MethodPayment)
+SERVICE_GUARANTEES = ReferenceKeys(ServiceGuarantee)
+PROVENANCES = ReferenceKeys(Provenance)
+WORKSHOP_ORDERS = NaturalKeys(WorkshopOrder, 'pk')
+INVOICES = NaturalKeys(Invoice, 'pk')
+NATURAL_KEYS = (ENTERPRISES, VEHICLES, MECHANICALS, CONTACTS, TYPES, PIECES, UNIT_MEASUREMENTS, METHOD_PAYMENTS,
+                SERVICE_GUARANTEES, PROVENANCES, WORKSHOP_ORDERS, INVOICES)
+
+
+def _columns(*names):
+    return [(name, name) for name in names]
+
+
+# Las columnas coinciden con las de los extractos de taller.extracts
+IMPORTERS = {
+    'enterprise': Importer(Enterprise, _columns('name', 'phone', 'address', 'comments'),
+                           natural_keys=ENTERPRISES),
+    'contact': Importer(Contact, _columns('name', 'address', 'email', 'phone', 'tcp', 'nit', 'no_check_cup'),
+                        natural_keys=CONTACTS),
+    'mechanical': Importer(Mechanical, _columns('name', 'last_name', 'ci', 'address'), natural_keys=MECHANICALS),
+    'piece': Importer(Piece, _columns('name'), natural_keys=PIECES),
+    'vehicle': Importer(Vehicle, _columns('tag', 'mark', 'model'),
+                        lookups=[(('enterprise',), 'enterprise', ENTERPRISES)], natural_keys=VEHICLES),
+    'workshop_order': Importer(
+        WorkshopOrder,
+        _columns('estimation', 'estimated_time', 'mileage', 'defection', 'work_done', 'delivery_date',
+                 'complaints_suggestions', 'description_raw_materials_parts', 'workforce_cost', 'amount'),
+        lookups=[
+            (('enterprise',), 'enterprise', ENTERPRISES),
+            (('vehicle_tag',), 'vehicle', VEHICLES),
+            (('mechanical', 'mechanical_last_name'), 'mechanical', MECHANICALS),
+            (('assistant', 'assistant_last_name'), 'assistant', MECHANICALS),
+            (('method_payment',), 'method_payment', METHOD_PAYMENTS),
+            (('service_guarantee',), 'service_guarantee', SERVICE_GUARANTEES),
+        ],
+        dates=('entry_date',), natural_keys=WORKSHOP_ORDERS, changes=('workshop_order_ids', 'pk')),
+    'physical_state': Importer(PhysicalState, _columns('description'), lookups=[
+        (('workshop_order',), 'workshop_order', WORKSHOP_ORDERS),
+        (('piece',), 'piece', PIECES),
+    ], changes=('workshop_order_ids', 'workshop_order_id')),
+    'invoice': Importer(
+        Invoice, _columns('services_provided', 'expendable_material', 'workforce'),
+        lookups=[
+            (('workshop_order',), 'workshop_order', WORKSHOP_ORDERS),
+            (('type',), 'type', TYPES),
+            (('contact',), 'contact', CONTACTS),
+        ],
+        dates=('date',), natural_keys=INVOICES, changes=('invoice_ids', 'pk')),
+    'activity': Importer(
+        Activity, _columns('code', 'description', 'hours_worked', 'price', 'amount'),
+        lookups=[
+            (('invoice',), 'invoice', INVOICES),
+            (('unit_measurement',), 'unit_measurement', UNIT_MEASUREMENTS),
+            (('provenance',), 'provenance', PROVENANCES),
+        ], changes=('invoice_ids', 'invoice_id')),
+}
+
+
+def read_rows(stream, input_format):
+    """Lee el archivo fila a fila; devuelve pares ``(número de línea, fila)``.
+
+    Una línea JSONL que no es un objeto JSON se devuelve como ``ValidationError`` en lugar de la
+    fila, para que ``import_rows`` la informe y siga con las demás.
+    """
+    if input_format == CSV:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_num, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_num, ValidationError('JSON inválido: {}'.format(e))
+                continue
+            if not isinstance(row, dict):
+                yield line_num, ValidationError('Se esperaba un objeto JSON')
+                continue
+            yield line_num, {key: '' if value is None else str(value) for key, value in row.items()}
+
+
+def import_rows(kind, rows, batch_size=None, on_error=None, changes=None):
+    """Inserta las filas por lotes con ``bulk_create``; devuelve ``(insertadas, erróneas, segundos)``.
+
+    Las filas inválidas se informan con ``on_error(línea, mensajes)`` y no detienen la importación.
+    Si un lote falla en la base de datos se reintenta fila a fila para señalar las culpables.
+    Las órdenes y facturas afectadas se anotan en ``changes``, para pasarlo luego a ``finish``.
+    """
+    importer = IMPORTERS[kind]
+    batch_size = batch_size or getattr(settings, 'TALLER_IMPORT_BATCH_SIZE', 1000)
+    on_error = on_error or (lambda line_num, messages: None)
+    for natural_keys in NATURAL_KEYS:
+        natural_keys.reset()
+
+    start = time.perf_counter()
+    imported = failed = 0
+    objects, line_nums = list(), list()
+
+    def saved(objects):
+        if changes is not None and importer.changes is not None:
+            name, field = importer.changes
+            changes.add(name, [getattr(obj, field) for obj in objects])
+
+    def flush():
+        nonlocal imported, failed
+        try:
+            importer.save(objects)
+            imported += len(objects)
+            saved(objects)
+        except DatabaseError:
+            for obj, line_num in zip(objects, line_nums):
+                try:
+                    importer.save([obj])
+                    imported += 1
+                    saved([obj])
+                except DatabaseError as e:
+                    failed += 1
+                    on_error(line_num, [str(e)])
+        objects.clear()
+        line_nums.clear()
+
+    for line_num, row in rows:
+        try:
+            if isinstance(row, ValidationError):
+                raise row
+            objects.append(importer.build(row))
+        except (ValidationError, ValueError) as e:
+            failed += 1
+            on_error(line_num, e.messages if isinstance(e, ValidationError) else [str(e)])
+            continue
+        line_nums.append(line_num)
+        if len(objects) >= batch_size:
+            flush()
+    if objects:
+        flush()
+
+    seconds = time.perf_counter() - start
+    logger.info('%d filas importadas en %.2f s (%.0f filas/s), %d con errores', imported, seconds,
+                imported / seconds if seconds else 0, failed)
+    return imported, failed, seconds
+
+
+def finish(changes=None):
+    """Recalcula lo que ``bulk_create`` no mantiene: totales, reportes, tablas de referencia y la caché de PDF.
+
+    Con ``changes`` sólo se recalculan las órdenes y facturas que tocó la importación; las tablas de
+    referencia ya se invalidan al guardar cada lote.
+    """
+    if changes is None or not changes.known:
+        totals.rebuild()
+        reports.rebuild()
+        reference.invalidate_all()
+        pdf_cache.clear()
+        return
+
+    totals.rebuild(workshop_order_ids=changes.workshop_order_ids, invoice_ids=changes.invoice_ids)
+    # La factura comparte la clave primaria con su orden e imprime datos de ella
+    invoice_ids = changes.workshop_order_ids | changes.invoice_ids
+    reports.rebuild(invoice_ids)
+    for workshop_order_id in changes.workshop_order_ids:
+        pdf_cache.invalidate(WORKSHOP_ORDER, workshop_order_id)
+    for invoice_id in invoice_ids:
+        pdf_cache.invalidate(INVOICE, invoice_id)
@@ -0,0 +1,111 @@
+import logging
+import os
+import shutil
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import pdf_cache, replica
+from .documents import open_pdf
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+
+def _directory():
+    return getattr(settings, 'TALLER_EXPORT_JOBS_DIR', settings.BASE_DIR / 'cache' / 'jobs')
+
+
+def job_path(job):
+    return os.path.join(_directory(), '{}.pdf'.format(job.pk))
+
+
+def enqueue(kind, object_id):
+    """Pone en cola la exportación del documento, o devuelve la que ya está pendiente para él."""
+    object_id = str(object_id)
+    while True:
+        job = ExportJob.objects.filter(kind=kind, object_id=object_id, status__in=ExportJob.PENDING).first()
+        if job is not None:
+            return job
+        try:
+            with transaction.atomic():
+                return ExportJob.objects.create(kind=kind, object_id=object_id)
+        except IntegrityError:
+            # Otra petición lo puso en cola al mismo tiempo
+            continue
+
+
+def requeue_stale(timeout):
+    """Devuelve a la cola los trabajos que llevan más de ``timeout`` segundos en proceso."""
+    return (ExportJob.objects
+            .filter(status=ExportJob.RUNNING, started__lt=timezone.now() - timedelta(seconds=timeout))
+            .update(status=ExportJob.QUEUED, started=None))
+
+
+def claim():
+    """Toma el trabajo más antiguo de la cola, o devuelve None si no hay ninguno.
+
+    La actualización condicional garantiza que dos trabajadores no tomen el mismo trabajo.
+    """
+    for job in ExportJob.objects.filter(status=ExportJob.QUEUED).order_by('pk')[:10]:
+        started = timezone.now()
+        if ExportJob.objects.filter(pk=job.pk, status=ExportJob.QUEUED).update(status=ExportJob.RUNNING,
+                                                                               started=started):
+            job.status = ExportJob.RUNNING
+            job.started = started
+            return job
+    return None
+
+
+def run(job):
+    try:
+        # Quien pidió la exportación no escribió nada después de ponerla en cola
+        with replica.reading(since=job.created.timestamp()):
+            pdf = open_pdf(job.kind, job.object_id)
+        if pdf is None:
+            raise LookupError('El documento no existe')
+
+        os.makedirs(_directory(), exist_ok=True)
+        with pdf, open(job_path(job), 'wb') as output:
+            shutil.copyfileobj(pdf, output, pdf_cache.CHUNK_SIZE)
+        job.status = ExportJob.DONE
+    except Exception as e:
+        # La traza queda en el registro; el estado, que se puede consultar desde el admin, solo lleva el motivo
+        logger.exception('Falló la exportación %s', job)
+        job.status = ExportJob.FAILED
+        job.error = str(e) if isinstance(e, LookupError) else 'Error al generar el PDF ({})'.format(
+            type(e).__name__)
+
+    job.finished = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished'])
+    if job.status == ExportJob.DONE:
+        discard_previous(job)
+    return job
+
+
+def discard_previous(job):
+    """Elimina las exportaciones terminadas anteriores del mismo documento; solo se conserva la última."""
+    previous = (ExportJob.objects
+                .filter(kind=job.kind, object_id=job.object_id, pk__lt=job.pk)
+                .exclude(status__in=ExportJob.PENDING))
+    for old_job in previous:
+        try:
+            os.remove(job_path(old_job))
+        except OSError:
+            pass
+    previous.delete()
+
+
+def work(poll_interval=1.0, once=False):
+    """Procesa trabajos de la cola hasta que se interrumpa, o hasta vaciarla si ``once`` es verdadero."""
+    while True:
+        job = claim()
+        if job is not None:
+            run(job)
+        elif once:
+            return
+        else:
+            time.sleep(poll_interval)
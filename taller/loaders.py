@@ -0,0 +1,111 @@
+import hashlib
+
+from django.db.models import Count, Max, Prefetch
+
+from . import reference
+from .models import WorkshopOrder, PhysicalState, Invoice, Activity, Type, UnitMeasurement, MethodPayment, \
+    ServiceGuarantee, Provenance, Piece
+
+WORKSHOP_ORDER_FIELDS = (
+    'entry_date', 'estimation', 'estimated_time', 'mileage', 'defection', 'work_done', 'delivery_date',
+    'complaints_suggestions', 'workforce_cost', 'description_raw_materials_parts', 'amount',
+    'total',
+    'enterprise__name',
+    'vehicle__mark', 'vehicle__model', 'vehicle__tag',
+    'mechanical__name', 'mechanical__last_name',
+    'assistant__name', 'assistant__last_name',
+    'method_payment', 'service_guarantee',
+)
+
+INVOICE_FIELDS = (
+    'services_provided', 'expendable_material', 'workforce', 'date', 'total',
+    'type',
+    'contact__name', 'contact__tcp', 'contact__address', 'contact__nit', 'contact__email', 'contact__no_check_cup',
+    'contact__phone',
+    'workshop_order__enterprise__name', 'workshop_order__enterprise__address', 'workshop_order__enterprise__phone',
+    'workshop_order__vehicle__mark', 'workshop_order__vehicle__model', 'workshop_order__vehicle__tag',
+)
+
+
+def _attach(obj, field, model):
+    # Las tablas de referencia se toman de la copia en memoria en lugar de unirlas a la consulta
+    related = reference.get(model, getattr(obj, field + '_id'))
+    if related is not None:
+        setattr(obj, field, related)
+
+
+def load_workshop_order(object_id):
+    """Carga la orden con todo lo que imprime su PDF en dos consultas.
+
+    Los estados físicos quedan precargados en ``physicalstate_set``; las tablas de referencia salen
+    de ``taller.reference``.
+    """
+    physicals_state = (PhysicalState.objects
+                       .only('workshop_order', 'description', 'piece')
+                       .order_by('pk'))
+
+    workshop_order = (WorkshopOrder.objects
+                      .select_related('enterprise', 'vehicle', 'mechanical', 'assistant')
+                      .only(*WORKSHOP_ORDER_FIELDS)
+                      .prefetch_related(Prefetch('physicalstate_set', queryset=physicals_state))
+                      .filter(pk=object_id)
+                      .first())
+    if workshop_order is not None:
+        _attach(workshop_order, 'method_payment', MethodPayment)
+        _attach(workshop_order, 'service_guarantee', ServiceGuarantee)
+        for physical_state in workshop_order.physicalstate_set.all():
+            _attach(physical_state, 'piece', Piece)
+    return workshop_order
+
+
+def load_invoice(object_id):
+    """Carga la factura con todo lo que imprime su PDF en dos consultas.
+
+    Las actividades quedan precargadas en ``activity_set``; las tablas de referencia salen de
+    ``taller.reference``.
+    """
+    activities = (Activity.objects
+                  .only('invoice', 'code', 'description', 'hours_worked', 'price', 'amount', 'unit_measurement',
+                        'provenance')
+                  .order_by('pk'))
+
+    invoice = (Invoice.objects
+               .select_related('contact', 'workshop_order__enterprise', 'workshop_order__vehicle')
+               .only(*INVOICE_FIELDS)
+               .prefetch_related(Prefetch('activity_set', queryset=activities))
+               .filter(pk=object_id)
+               .first())
+    if invoice is not None:
+        _attach(invoice, 'type', Type)
+        for activity in invoice.activity_set.all():
+            _attach(activity, 'unit_measurement', UnitMeasurement)
+            _attach(activity, 'provenance', Provenance)
+    return invoice
+
+
+def _version(row):
+    if row is None:
+        return None
+    return hashlib.sha1(repr(row).encode()).hexdigest()[:16]
+
+
+def workshop_order_version(object_id):
+    """Versión del PDF de la orden en una sola consulta, o None si la orden no existe.
+
+    ``entry_date`` cambia con cada guardado de la orden; las ediciones de estados físicos que no
+    alteran su cantidad ni su último id se invalidan mediante señales.
+    """
+    return _version(WorkshopOrder.objects
+                    .filter(pk=object_id)
+                    .annotate(lines=Count('physicalstate'), last_line=Max('physicalstate'))
+                    .values_list('entry_date', 'lines', 'last_line')
+                    .first())
+
+
+def invoice_version(object_id):
+    """Versión del PDF de la factura en una sola consulta, o None si la factura no existe."""
+    return _version(Invoice.objects
+                    .filter(pk=object_id)
+                    .annotate(lines=Count('activity'), last_line=Max('activity'))
+                    .values_list('date', 'total', 'workshop_order__entry_date', 'lines', 'last_line')
+                    .first())
@@ -0,0 +1,75 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from ...models import WorkshopOrder, Invoice
+
+URL_NAMES = {
+    'workshop_order': (WorkshopOrder, 'admin:taller_order_workshop_export_pdf'),
+    'invoice': (Invoice, 'admin:taller_invoice_export_pdf'),
+}
+
+
+def summary(name, latencies, elapsed):
+    latencies = sorted(latencies)
+    percentile = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return '{:<5} {:>4} descargas en {:6.2f} s  {:6.1f} desc/s  p50 {:6.3f} s  p95 {:6.3f} s  máx {:6.3f} s'.format(
+        name, len(latencies), elapsed, len(latencies) / elapsed, percentile[49], percentile[94], latencies[-1])
+
+
+class Command(BaseCommand):
+    help = ('Compara las vistas de exportación síncronas (WSGI, un hilo por descarga) con las asíncronas '
+            '(ASGI, grupo acotado de hilos) bajo descargas concurrentes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(URL_NAMES))
+        parser.add_argument('--id', dest='object_id', help='Documento a descargar; por defecto el primero')
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--use-cache', action='store_true', help='No desactivar la caché de PDF')
+
+    def handle(self, *args, **options):
+        model, url_name = URL_NAMES[options['kind']]
+        object_id = options['object_id'] or model.objects.values_list('pk', flat=True).order_by('pk').first()
+        if object_id is None:
+            raise CommandError('No hay documentos para descargar')
+
+        overrides = dict() if options['use_cache'] else {'TALLER_PDF_CACHE_DIR': None}
+        with override_settings(**overrides):
+            self.stdout.write(self.run_wsgi(reverse(url_name, args=[object_id]), options))
+            self.stdout.write(self.run_asgi(reverse(url_name + '_async', args=[object_id]), options))
+
+    def run_wsgi(self, url, options):
+        def download(_):
+            start = time.perf_counter()
+            response = Client().get(url)
+            b''.join(response.streaming_content)
+            response.close()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            latencies = list(executor.map(download, range(options['requests'])))
+        return summary('WSGI', latencies, time.perf_counter() - start)
+
+    def run_asgi(self, url, options):
+        async def download(client, semaphore):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(url)
+                b''.join(response.streaming_content)
+                return time.perf_counter() - start
+
+        async def run():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            return await asyncio.gather(*[download(client, semaphore) for _ in range(options['requests'])])
+
+        start = time.perf_counter()
+        latencies = asyncio.run(run())
+        return summary('ASGI', latencies, time.perf_counter() - start)
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from ... import benchmark
+
+# Configuración de SQLite sin ajustes: diario de reversión y la espera por el bloqueo de Django
+DEFAULT_SQLITE = {
+    'TALLER_SQLITE_PRAGMAS': {'synchronous': 'FULL', 'busy_timeout': 5000},
+    'TALLER_SQLITE_JOURNAL_MODE': 'DELETE',
+    'TALLER_SQLITE_IMMEDIATE_TRANSACTIONS': False,
+}
+
+
+class Command(BaseCommand):
+    help = ('Mide cuántas órdenes con factura y actividades por segundo pueden guardar varios usuarios a la vez, '
+            'y cuántas fallan por la base de datos bloqueada.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Hilos que guardan a la vez')
+        parser.add_argument('--transactions', type=int, default=20, help='Órdenes que guarda cada hilo')
+        parser.add_argument('--activities', type=int, default=5, help='Actividades por factura')
+        parser.add_argument('--compare-default', action='store_true',
+                            help='En SQLite, medir también sin TALLER_SQLITE_PRAGMAS, en modo DELETE y sin '
+                                 'transacciones inmediatas')
+
+    def run(self, label, options):
+        # Las conexiones nuevas toman la configuración vigente; el modo del diario queda guardado en el archivo
+        connection.close()
+        try:
+            result = benchmark.write_orders(options['writers'], options['transactions'], options['activities'])
+        except ValueError as e:
+            raise CommandError(e)
+        self.stdout.write('{:<22} {:>6} {:>8} {:>7.1f} {:>8} {:>8} {:>8}'.format(
+            label, result['transactions'], result['errors'], result['per_second'],
+            *['-' if result[key] is None else '{:.1f}'.format(result[key] * 1000) for key in ('p50', 'p95', 'max')]))
+        if result['first_error']:
+            self.stdout.write('    {}'.format(result['first_error']))
+
+    def handle(self, *args, **options):
+        self.stdout.write('{:<22} {:>6} {:>8} {:>7} {:>8} {:>8} {:>8}'.format(
+            'perfil', 'guard.', 'errores', 'por s', 'p50 ms', 'p95 ms', 'máx ms'))
+        journal_mode = getattr(settings, 'TALLER_SQLITE_JOURNAL_MODE', None)
+        if options['compare_default'] and connection.vendor == 'sqlite':
+            if not journal_mode:
+                # Al terminar, el archivo vuelve al modo en que estaba
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    journal_mode = cursor.fetchone()[0]
+            with override_settings(**DEFAULT_SQLITE):
+                self.run('sqlite sin ajustes', options)
+        with override_settings(TALLER_SQLITE_JOURNAL_MODE=journal_mode):
+            self.run(connection.vendor, options)
+        connection.close()
@@ -0,0 +1,45 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from ... import extracts, replica
+from .export_pdfs import parse_date
+
+
+class Command(BaseCommand):
+    help = 'Exporta órdenes de taller, facturas o actividades a CSV o JSONL, con los nombres de sus relaciones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(extracts.EXTRACTS))
+        parser.add_argument('output', help='Archivo de salida, o - para la salida estándar')
+        parser.add_argument('--format', dest='output_format', choices=[extracts.CSV, extracts.JSONL],
+                            default=extracts.CSV)
+        parser.add_argument('--from', dest='date_from', type=parse_date, help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--to', dest='date_to', type=parse_date, help='Fecha final (AAAA-MM-DD)')
+        parser.add_argument('--primary', action='store_true',
+                            help='Leer de la base principal aunque la réplica esté al día')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        using = DEFAULT_DB_ALIAS if options['primary'] else replica.read_alias()
+        lines = extracts.lines(options['kind'], options['output_format'], date_from=options['date_from'],
+                               date_to=options['date_to'], using=using)
+
+        count = -1 if options['output_format'] == extracts.CSV else 0
+        if options['output'] == '-':
+            output = sys.stdout
+        else:
+            output = open(options['output'], 'w', encoding='utf-8', newline='')
+        try:
+            for line in lines:
+                output.write(line)
+                count += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        seconds = time.perf_counter() - start
+        self.stderr.write(self.style.SUCCESS('{} filas exportadas de {} en {:.2f} s ({:.0f} filas/s)'.format(
+            count, using, seconds, count / seconds if seconds else 0)))
@@ -0,0 +1,37 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import batch
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError('Fecha inválida: {} (se espera AAAA-MM-DD)'.format(value))
+
+
+class Command(BaseCommand):
+    help = 'Exporta varias órdenes de taller o facturas a un ZIP de PDF o a un único PDF.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(batch.BATCHES))
+        parser.add_argument('output', help='Archivo de salida')
+        parser.add_argument('--ids', nargs='+', type=int, help='Documentos a exportar')
+        parser.add_argument('--from', dest='date_from', type=parse_date, help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--to', dest='date_to', type=parse_date, help='Fecha final (AAAA-MM-DD)')
+        parser.add_argument('--format', dest='output_format', choices=[batch.ZIP, batch.MERGED], default=batch.ZIP)
+        parser.add_argument('--workers', type=int, help='Procesos que generan los PDF en paralelo')
+
+    def handle(self, *args, **options):
+        object_ids = options['ids']
+        if object_ids is None:
+            object_ids = batch.select_ids(options['kind'], options['date_from'], options['date_to'])
+
+        with open(options['output'], 'wb') as output:
+            count, seconds = batch.export(options['kind'], object_ids, output, options['output_format'],
+                                          options['workers'])
+
+        self.stdout.write(self.style.SUCCESS('{} documentos exportados en {:.2f} s ({:.1f} documentos/s)'.format(
+            count, seconds, count / seconds if seconds else 0)))
@@ -0,0 +1,47 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from ... import importer
+
+
+class Command(BaseCommand):
+    help = ('Importa datos maestros u órdenes históricas desde archivos CSV o JSONL. Las relaciones se indican '
+            'por su nombre (empresa, pieza, unidad de medida, forma de pago, etc.); las órdenes y facturas por id.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(importer.IMPORTERS))
+        parser.add_argument('files', nargs='+', help='Archivos a importar')
+        parser.add_argument('--format', dest='input_format', choices=[importer.CSV, importer.JSONL],
+                            help='Formato de los archivos; por defecto según su extensión')
+        parser.add_argument('--batch-size', type=int, help='Filas insertadas por transacción')
+        parser.add_argument('--no-rebuild', action='store_true',
+                            help='No recalcular totales, reportes ni la caché de PDF al terminar')
+
+    def handle(self, *args, **options):
+        imported = failed = 0
+        seconds = 0.0
+        changes = importer.Changes()
+        for filename in options['files']:
+            input_format = options['input_format'] or (
+                importer.JSONL if os.path.splitext(filename)[1].lower() in ('.jsonl', '.json') else importer.CSV)
+
+            def on_error(line_num, messages):
+                self.stderr.write('{}:{}: {}'.format(filename, line_num, '; '.join(messages)))
+
+            with open(filename, encoding='utf-8-sig', newline='') as stream:
+                file_imported, file_failed, file_seconds = importer.import_rows(
+                    options['kind'], importer.read_rows(stream, input_format), options['batch_size'], on_error,
+                    changes)
+            imported += file_imported
+            failed += file_failed
+            seconds += file_seconds
+
+        self.stdout.write(self.style.SUCCESS('{} filas importadas en {:.2f} s ({:.0f} filas/s)'.format(
+            imported, seconds, imported / seconds if seconds else 0)))
+        if failed:
+            self.stdout.write(self.style.WARNING('{} filas con errores'.format(failed)))
+
+        if changes and not options['no_rebuild']:
+            importer.finish(changes)
+            self.stdout.write('Totales y reportes recalculados')
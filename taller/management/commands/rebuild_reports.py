@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from taller import reports
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde las facturas las tablas de resumen del panel de reportes.'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = reports.rebuild()
+        self.stdout.write(self.style.SUCCESS('{} facturas resumidas en {:.2f} s'.format(
+            count, time.perf_counter() - start)))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from taller import search
+
+
+class Command(BaseCommand):
+    help = ('Vuelve a crear los disparadores de la búsqueda de texto del historial de reparaciones '
+            'y reindexa todas las órdenes.')
+
+    def handle(self, *args, **options):
+        if not search.supported():
+            raise CommandError('La búsqueda de texto solo está disponible en SQLite y PostgreSQL.')
+        start = time.perf_counter()
+        search.install()
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Índice de búsqueda reconstruido en {:.2f} s'.format(
+            time.perf_counter() - start)))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from taller import totals
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los totales guardados de facturas y órdenes, o comprueba que coincidan con sus líneas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Solo compara los totales guardados con los calculados, sin modificarlos')
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            totals.rebuild()
+            self.stdout.write(self.style.SUCCESS('Totales recalculados'))
+
+        mismatches = totals.verify()
+        for model, pk, field, stored, expected in mismatches:
+            self.stderr.write('{} {}: {} es {} y debería ser {}'.format(model, pk, field, stored, expected))
+        if mismatches:
+            raise CommandError('{} totales no coinciden'.format(len(mismatches)))
+        self.stdout.write(self.style.SUCCESS('Todos los totales coinciden'))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ... import replica
+
+
+class Command(BaseCommand):
+    help = ('Copia la base principal de SQLite en la réplica de solo lectura usada por las exportaciones y los '
+            'reportes. Con --interval la copia se repite hasta que se interrumpa.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Segundos entre copias')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Solo hace falta con SQLite: en PostgreSQL la réplica se actualiza por streaming')
+        if replica.snapshot_path() is None:
+            raise CommandError('La réplica no está configurada (BUENVECINO_DB_REPLICA)')
+
+        while True:
+            seconds = replica.refresh_snapshot()
+            self.stdout.write(self.style.SUCCESS('Réplica actualizada en {:.2f} s: {}'.format(
+                seconds, replica.snapshot_path())))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from ... import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Mide latencia (percentiles), consultas y memoria máxima de las exportaciones a PDF y de cada listado '
+            'del admin, y guarda los resultados en JSON para compararlos entre ejecuciones.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Peticiones por medición')
+        parser.add_argument('--samples', type=int, default=5, help='Documentos distintos por exportación')
+        parser.add_argument('--only', nargs='+', help='Medir solo los nombres que contengan alguno de estos textos')
+        parser.add_argument('--output', help='Archivo JSON donde guardar los resultados')
+        parser.add_argument('--compare', help='Resultados JSON de una ejecución anterior')
+        parser.add_argument('--use-cache', action='store_true', help='No desactivar la caché de PDF')
+
+    def handle(self, *args, **options):
+        overrides = dict() if options['use_cache'] else {'TALLER_PDF_CACHE_DIR': None}
+        with override_settings(**overrides):
+            result = benchmark.run(options['requests'], options['samples'], options['only'])
+
+        changes = dict()
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as previous:
+                changes = benchmark.compare(result, json.load(previous))
+
+        self.stdout.write('{:<40} {:>8} {:>8} {:>8} {:>9} {:>10} {:>9} {:>8}'.format(
+            'nombre', 'p50 ms', 'p95 ms', 'p99 ms', 'consultas', 'memoria KB', 'p50 ant.', 'errores'))
+        for entry in result['results']:
+            change = changes.get(entry['name'])
+            self.stdout.write('{:<40} {:>8.1f} {:>8.1f} {:>8.1f} {:>9} {:>10.0f} {:>9} {:>8}'.format(
+                entry['name'], entry['p50'] * 1000, entry['p95'] * 1000, entry['p99'] * 1000, entry['queries'],
+                entry['peak_memory'] / 1024, '' if change is None else '{:+.0%}'.format(change), entry['failed']))
+
+        failures = [failure for entry in result['results'] for failure in entry['failures']]
+        for failure in failures:
+            self.stdout.write(self.style.ERROR('{} {}: {}'.format(failure['status'] or '-', failure['url'],
+                                                                  failure['error'])))
+        if failures:
+            self.stdout.write(self.style.ERROR('{} de {} mediciones con errores'.format(
+                sum(1 for entry in result['results'] if entry['failed']), len(result['results']))))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(result, output, indent=2)
+            self.stdout.write(self.style.SUCCESS('Resultados guardados en {}'.format(options['output'])))
@@ -0,0 +1,48 @@
+import multiprocessing
+import os
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from ... import jobs
+
+
+def _work(poll_interval, once):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'buenvecino.settings')
+    django.setup()
+    jobs.work(poll_interval, once)
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de exportaciones a PDF con varios procesos trabajadores.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'TALLER_EXPORT_JOB_WORKERS', 2),
+                            help='Procesos trabajadores')
+        parser.add_argument('--poll', type=float, default=1.0, help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--once', action='store_true', help='Terminar cuando la cola esté vacía')
+
+    def handle(self, *args, **options):
+        timeout = getattr(settings, 'TALLER_EXPORT_JOB_TIMEOUT', 600)
+        requeued = jobs.requeue_stale(timeout)
+        if requeued:
+            self.stdout.write('{} trabajos interrumpidos devueltos a la cola'.format(requeued))
+
+        if options['workers'] <= 1:
+            jobs.work(options['poll'], options['once'])
+            return
+
+        # Los procesos hijos no deben heredar conexiones abiertas a la base de datos
+        connections.close_all()
+        processes = [multiprocessing.Process(target=_work, args=(options['poll'], options['once']))
+                     for _ in range(options['workers'])]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ... import seed
+
+
+class Command(BaseCommand):
+    help = 'Genera datos de prueba: empresas, vehículos, mecánicos, órdenes con estados físicos y facturas con ' \
+           'actividades.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enterprises', type=int, default=10, help='Empresas, y otros tantos contactos')
+        parser.add_argument('--vehicles', type=int, default=50)
+        parser.add_argument('--mechanicals', type=int, default=10)
+        parser.add_argument('--orders', type=int, default=200, help='Órdenes, cada una con su factura')
+        parser.add_argument('--physical-states', type=int, default=3, help='Estados físicos por orden')
+        parser.add_argument('--activities', type=int, default=5, help='Actividades por factura')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla del generador aleatorio')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        created = seed.seed(options['enterprises'], options['vehicles'], options['mechanicals'], options['orders'],
+                            options['physical_states'], options['activities'], options['seed'])
+        for model_name, count in created.items():
+            self.stdout.write('{:<16} {:>8}'.format(model_name, count))
+        self.stdout.write(self.style.SUCCESS('Datos generados en {:.2f} s'.format(time.perf_counter() - start)))
@@ -0,0 +1,41 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import slow_queries
+
+
+class Command(BaseCommand):
+    help = ('Resume el registro de consultas lentas agrupando las consultas por huella, de mayor a menor tiempo '
+            'total, con el plan de ejecución de la más lenta de cada grupo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', nargs='?', help='Registro a leer; por defecto TALLER_SLOW_QUERY_LOG')
+        parser.add_argument('--limit', type=int, default=10, help='Cantidad de huellas a mostrar')
+        parser.add_argument('--json', action='store_true', help='Escribir el resumen en JSON')
+
+    def handle(self, *args, **options):
+        path = options['log'] or getattr(settings, 'TALLER_SLOW_QUERY_LOG', None)
+        if path is None:
+            raise CommandError('El registro de consultas lentas está desactivado')
+
+        groups = slow_queries.aggregate(slow_queries.read(path))[:options['limit']]
+        if options['json']:
+            self.stdout.write(json.dumps(groups, ensure_ascii=False, indent=2))
+            return
+        if not groups:
+            self.stdout.write('No hay consultas lentas registradas')
+            return
+
+        for group in groups:
+            self.stdout.write(self.style.WARNING('{} veces, total {:.3f} s, media {:.3f} s, máximo {:.3f} s'.format(
+                group['count'], group['total'], group['mean'], group['max'])))
+            self.stdout.write(group['fingerprint'])
+            if group['views']:
+                self.stdout.write('  vistas: {}'.format(', '.join(group['views'])))
+            for caller in group['callers']:
+                self.stdout.write('  desde: {}'.format(caller))
+            for line in group['slowest']['plan'] or ():
+                self.stdout.write('  plan: {}'.format(line))
+            self.stdout.write('')
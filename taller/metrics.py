@@ -0,0 +1,111 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Límites superiores de los intervalos de los histogramas, en segundos
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'taller_http_requests_total': ('counter', 'Peticiones atendidas por vista, método y código de estado'),
+    'taller_http_request_duration_seconds': ('histogram', 'Tiempo hasta devolver la respuesta, por vista'),
+    'taller_http_response_bytes_total': ('counter', 'Bytes enviados en las respuestas, por vista'),
+    'taller_db_queries_total': ('counter', 'Consultas a la base de datos, por vista'),
+    'taller_db_query_duration_seconds_total': ('counter', 'Tiempo de las consultas a la base de datos, por vista'),
+    'taller_pdf_phase_duration_seconds': ('histogram', 'Tiempo de cada fase de la generación de PDF: carga de '
+                                                       'datos, construcción, composición y escritura'),
+    'taller_pdf_cache_hits_total': ('counter', 'PDF servidos desde la caché'),
+    'taller_pdf_cache_misses_total': ('counter', 'PDF que no estaban en la caché'),
+    'taller_pdf_cache_entries': ('gauge', 'PDF guardados en la caché'),
+    'taller_pdf_cache_bytes': ('gauge', 'Tamaño de la caché de PDF'),
+    'taller_reference_cache_hits_total': ('counter', 'Lecturas de tablas de referencia servidas desde la memoria'),
+    'taller_reference_cache_misses_total': ('counter', 'Tablas de referencia leídas de la base de datos'),
+}
+
+_lock = threading.Lock()
+_counters = dict()
+_histograms = dict()
+
+
+def enabled():
+    return getattr(settings, 'TALLER_METRICS', True)
+
+
+def inc(name, labels=(), value=1):
+    key = (name, tuple(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, labels=()):
+    key = (name, tuple(labels))
+    position = bisect.bisect_left(BUCKETS, value)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0]
+        histogram[0][position] += 1
+        histogram[1] += value
+
+
+@contextmanager
+def pdf_phase(kind, phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if enabled():
+            observe('taller_pdf_phase_duration_seconds', time.perf_counter() - start,
+                    (('kind', kind), ('phase', phase)))
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ''
+    return '{{{}}}'.format(','.join('{}="{}"'.format(
+        key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for key, value in labels))
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(extra=None):
+    """Métricas en el formato de texto de Prometheus.
+
+    ``extra`` agrega valores ``{nombre: valor}`` que se leen al momento de la consulta.
+    """
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: ([*buckets], total) for key, (buckets, total) in _histograms.items()}
+
+    samples = dict()
+    for (name, labels), value in sorted(counters.items(), key=str):
+        samples.setdefault(name, list()).append('{}{} {}'.format(name, _labels(labels), _number(value)))
+    for (name, labels), (buckets, total) in sorted(histograms.items(), key=lambda item: str(item[0])):
+        lines = samples.setdefault(name, list())
+        count = 0
+        for bound, bucket in zip(BUCKETS + ('+Inf',), buckets):
+            count += bucket
+            lines.append('{}_bucket{} {}'.format(name, _labels(labels, [('le', bound)]), count))
+        lines.append('{}_sum{} {}'.format(name, _labels(labels), _number(total)))
+        lines.append('{}_count{} {}'.format(name, _labels(labels), count))
+    for name, value in (extra or dict()).items():
+        samples[name] = ['{} {}'.format(name, _number(value))]
+
+    output = list()
+    for name in sorted(samples):
+        kind, description = METRICS.get(name, ('untyped', ''))
+        output.append('# HELP {} {}'.format(name, description))
+        output.append('# TYPE {} {}'.format(name, kind))
+        output.extend(samples[name])
+    return '\n'.join(output) + '\n'
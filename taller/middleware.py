@@ -0,0 +1,106 @@
+import re
+import time
+
+from django.db import connection
+
+from . import metrics, replica, slow_queries
+
+_WRITE = re.compile(r'\s*(INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+
+class MetricsMiddleware:
+    """Mide cada petición: duración, consultas a la base de datos y bytes enviados, por nombre de vista."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metrics.enabled():
+            return self.get_response(request)
+
+        queries = [0, 0.0]
+
+        def count_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match is not None else '') or 'unknown'
+        metrics.inc('taller_http_requests_total',
+                    (('view', view), ('method', request.method), ('status', response.status_code)))
+        metrics.observe('taller_http_request_duration_seconds', duration, (('view', view),))
+        metrics.inc('taller_db_queries_total', (('view', view),), queries[0])
+        metrics.inc('taller_db_query_duration_seconds_total', (('view', view),), queries[1])
+
+        if response.has_header('Content-Length'):
+            metrics.inc('taller_http_response_bytes_total', (('view', view),), int(response['Content-Length']))
+        elif not response.streaming:
+            metrics.inc('taller_http_response_bytes_total', (('view', view),), len(response.content))
+        else:
+            response.streaming_content = self.count_bytes(response.streaming_content, view)
+        return response
+
+    @staticmethod
+    def count_bytes(content, view):
+        size = 0
+        try:
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            metrics.inc('taller_http_response_bytes_total', (('view', view),), size)
+
+
+class SlowQueryMiddleware:
+    """Registra las consultas que superan ``TALLER_SLOW_QUERY_SECONDS`` con la vista que las hizo."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if slow_queries.threshold() is None:
+            return self.get_response(request)
+
+        def view():
+            match = getattr(request, 'resolver_match', None)
+            return match.view_name if match is not None else request.path
+
+        with connection.execute_wrapper(slow_queries.SlowQueryLogger(view)):
+            return self.get_response(request)
+
+
+class ReplicaMiddleware:
+    """Marca con una cookie firmada las peticiones que escribieron en la base de datos.
+
+    Mientras la réplica no tenga esas escrituras, las lecturas de ``replica.reading`` de ese navegador
+    van a la base principal.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica.configured():
+            return self.get_response(request)
+
+        wrote = [False]
+
+        def watch_writes(execute, sql, params, many, context):
+            if not wrote[0] and _WRITE.match(sql):
+                wrote[0] = True
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(watch_writes):
+            response = self.get_response(request)
+        if wrote[0]:
+            replica.mark_write(response)
+        return response
@@ -0,0 +1,215 @@
+# Generated by Django 3.1.7 on 2026-10-18 08:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Contact',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Nombre del contacto', max_length=255, verbose_name='Nombre')),
+                ('address', models.TextField(help_text='Dirección del contacto', verbose_name='Dirección')),
+                ('email', models.EmailField(help_text='Correo electrónico del contacto', max_length=254, verbose_name='Correo electrónico')),
+                ('phone', models.PositiveIntegerField(help_text='Teléfono del contacto', verbose_name='Teléfono')),
+                ('tcp', models.CharField(help_text='Nombre del trabajador por cuenta propia', max_length=255, verbose_name='TCP')),
+                ('nit', models.PositiveIntegerField(help_text='Número de identidad del contacto', verbose_name='NIT')),
+                ('no_check_cup', models.PositiveIntegerField(help_text='Número de cuenta de CUP del contacto', verbose_name='# de la cuenta en cup')),
+            ],
+            options={
+                'verbose_name': 'contacto',
+                'verbose_name_plural': 'Contactos',
+            },
+        ),
+        migrations.CreateModel(
+            name='Enterprise',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Nombre de la empresa', max_length=255, verbose_name='Nombre')),
+                ('phone', models.PositiveIntegerField(help_text='# de teléfono', verbose_name='Télefono')),
+                ('address', models.TextField(help_text='Dirección de la empresa', verbose_name='Dirección')),
+                ('comments', models.TextField(help_text='Comentarios', verbose_name='Comentarios')),
+            ],
+            options={
+                'verbose_name': 'empresa',
+                'verbose_name_plural': 'Empresas',
+            },
+        ),
+        migrations.CreateModel(
+            name='Mechanical',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Nombre del mecánico', max_length=255, verbose_name='Nombre')),
+                ('last_name', models.CharField(help_text='Apellidos del mecánico', max_length=255, verbose_name='Apellidos')),
+                ('ci', models.PositiveIntegerField(help_text='Carnet Identidad', verbose_name='Canet Identidad')),
+                ('address', models.TextField(help_text='Dirección', verbose_name='Dirección')),
+            ],
+            options={
+                'verbose_name': 'mecánico',
+                'verbose_name_plural': 'Mecánicos',
+            },
+        ),
+        migrations.CreateModel(
+            name='MethodPayment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(help_text='Tipo de forma de pago', max_length=255, unique=True, verbose_name='Tipo')),
+            ],
+            options={
+                'verbose_name': 'método de pago',
+                'verbose_name_plural': 'Métodos de pago',
+            },
+        ),
+        migrations.CreateModel(
+            name='Piece',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Nombre de la pieza', max_length=255, unique=True, verbose_name='Nombre')),
+            ],
+            options={
+                'verbose_name': 'pieza',
+                'verbose_name_plural': 'Piezas',
+            },
+        ),
+        migrations.CreateModel(
+            name='Provenance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provenance', models.CharField(help_text='Procedencia', max_length=255, verbose_name='Procedencia')),
+            ],
+            options={
+                'verbose_name': 'procedencia',
+                'verbose_name_plural': 'Procedencias',
+            },
+        ),
+        migrations.CreateModel(
+            name='ServiceGuarantee',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.TextField(help_text='Pautas de la garantía del servicio ofrecido', unique=True, verbose_name='Descripción')),
+            ],
+            options={
+                'verbose_name': 'garantía de servicio',
+                'verbose_name_plural': 'Garantías de servicio',
+            },
+        ),
+        migrations.CreateModel(
+            name='Type',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(help_text='Tipo de factura', max_length=255, verbose_name='Tipo')),
+                ('title', models.CharField(help_text='Título de la factura', max_length=255, verbose_name='Título')),
+            ],
+            options={
+                'verbose_name': 'tipo',
+                'verbose_name_plural': 'Tipos',
+            },
+        ),
+        migrations.CreateModel(
+            name='UnitMeasurement',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Unidad de médida', max_length=255, unique=True, verbose_name='Nombre')),
+            ],
+            options={
+                'verbose_name': 'unidad de medida',
+                'verbose_name_plural': 'Unidades de medida',
+            },
+        ),
+        migrations.CreateModel(
+            name='Vehicle',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mark', models.CharField(help_text='Marca del vehiculo', max_length=255, verbose_name='Marca')),
+                ('model', models.CharField(help_text='Modelo del vehiculo', max_length=255, verbose_name='Modelo')),
+                ('tag', models.CharField(help_text='Chapa del vehiculo', max_length=7, verbose_name='Chapa')),
+                ('enterprise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='taller.enterprise', verbose_name='Empresa')),
+            ],
+            options={
+                'verbose_name': 'vehículo',
+                'verbose_name_plural': 'Vehículos',
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkshopOrder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_date', models.DateTimeField(auto_now=True, verbose_name='Fecha de entrada')),
+                ('estimation', models.DecimalField(decimal_places=2, help_text='Presupuesto disponible', max_digits=7, verbose_name='Presupuesto')),
+                ('estimated_time', models.PositiveIntegerField(help_text='Tiempo estimado en horas', verbose_name='Tiempo estimado')),
+                ('mileage', models.PositiveIntegerField(help_text='kms recorrido por vehículo', verbose_name='kilometraje')),
+                ('defection', models.TextField(help_text='Problemas encontrados en el vehículo', verbose_name='Defectación')),
+                ('work_done', models.TextField(help_text='Descripción del trabajo realizado', verbose_name='Trabajo realizado')),
+                ('delivery_date', models.DateField(help_text='Fecha que será entregado', verbose_name='Fecha de entrega al cliente')),
+                ('complaints_suggestions', models.TextField(help_text='Quejas y sugerencias de los clientes', verbose_name='Quejas o sugerencias')),
+                ('workforce_cost', models.DecimalField(decimal_places=2, help_text='Valor de la mano de obra', max_digits=7, verbose_name='Costo mano de obra')),
+                ('description_raw_materials_parts', models.TextField(help_text='Nombre de las materias primas y piezas', verbose_name='Descripción Materias primas y piezas')),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Importe', max_digits=7, verbose_name='Importe en Piezas y Materias primas')),
+                ('assistant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ayudante_id', to='taller.mechanical', verbose_name='Ayudante')),
+                ('enterprise', models.ForeignKey(help_text='Nombre de la empresa', on_delete=django.db.models.deletion.CASCADE, to='taller.enterprise', verbose_name='Cliente o Empresa')),
+                ('mechanical', models.ForeignKey(help_text='Nombre del mecánico', on_delete=django.db.models.deletion.CASCADE, related_name='mecanico_id', to='taller.mechanical', verbose_name='Mecánico responsable')),
+                ('method_payment', models.ForeignKey(help_text='Forma de pago', on_delete=django.db.models.deletion.CASCADE, to='taller.methodpayment', verbose_name='Forma de pago')),
+                ('service_guarantee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='taller.serviceguarantee', verbose_name='Garantía del servicio')),
+                ('vehicle', models.ForeignKey(help_text='Vehículo', on_delete=django.db.models.deletion.CASCADE, to='taller.vehicle', verbose_name='Vehículo')),
+            ],
+            options={
+                'verbose_name': 'orden del taller',
+                'verbose_name_plural': 'Ordenes del taller',
+            },
+        ),
+        migrations.CreateModel(
+            name='PhysicalState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.TextField(help_text='Como se encuentra el vehículo al entrar al taller', verbose_name='Descripción')),
+                ('piece', models.ForeignKey(help_text='Pieza', on_delete=django.db.models.deletion.CASCADE, to='taller.piece', verbose_name='Pieza')),
+                ('workshop_order', models.ForeignKey(help_text='Orden del taller', on_delete=django.db.models.deletion.CASCADE, to='taller.workshoporder', verbose_name='Orden del taller')),
+            ],
+            options={
+                'verbose_name': 'estado físico',
+                'verbose_name_plural': 'Estados físicos',
+            },
+        ),
+        migrations.CreateModel(
+            name='Invoice',
+            fields=[
+                ('workshop_order', models.OneToOneField(help_text='Orden del taller correspondiente', on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='taller.workshoporder', verbose_name='Orden del taller')),
+                ('services_provided', models.DecimalField(decimal_places=2, help_text='Servicios Prestados en el Taller', max_digits=7, verbose_name='Servicios Prestados en el Taller')),
+                ('expendable_material', models.DecimalField(decimal_places=2, help_text='Material Gastable', max_digits=7, verbose_name='Material Gastable')),
+                ('workforce', models.DecimalField(decimal_places=2, help_text='Mano de Obra', max_digits=7, verbose_name='Mano de Obra')),
+                ('date', models.DateTimeField(auto_now=True, help_text='Fecha de la factura', verbose_name='Fecha')),
+                ('contact', models.ForeignKey(help_text='Contacto', on_delete=django.db.models.deletion.CASCADE, to='taller.contact', verbose_name='Contacto')),
+                ('type', models.ForeignKey(help_text='Tipo de factura', on_delete=django.db.models.deletion.CASCADE, to='taller.type', verbose_name='Tipo')),
+            ],
+            options={
+                'verbose_name': 'factura',
+                'verbose_name_plural': 'Facturas',
+            },
+        ),
+        migrations.CreateModel(
+            name='Activity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.PositiveIntegerField(help_text='Código', unique=True, verbose_name='Código')),
+                ('description', models.CharField(help_text='Descripción', max_length=255, verbose_name='Descripción')),
+                ('hours_worked', models.DecimalField(decimal_places=2, help_text='Cantidad de horas trabajadas', max_digits=4, verbose_name='Horas trabajadas')),
+                ('price', models.DecimalField(decimal_places=2, help_text='Precio', max_digits=7, verbose_name='Precio')),
+                ('amount', models.PositiveIntegerField(help_text='Cantidad', verbose_name='Cantidad')),
+                ('provenance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='taller.provenance', verbose_name='Procedencia')),
+                ('unit_measurement', models.ForeignKey(help_text='Unidad de medida', on_delete=django.db.models.deletion.CASCADE, to='taller.unitmeasurement', verbose_name='Unidad de medidas')),
+                ('invoice', models.ForeignKey(help_text='Factura correspondiente', on_delete=django.db.models.deletion.CASCADE, to='taller.invoice', verbose_name='Factura')),
+            ],
+            options={
+                'verbose_name': 'actividad',
+                'verbose_name_plural': 'Actividades',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.1.7 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taller', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('workshop_order', 'Orden del taller'), ('invoice', 'Factura')], max_length=32, verbose_name='Documento')),
+                ('object_id', models.CharField(max_length=255, verbose_name='Id del documento')),
+                ('status', models.CharField(choices=[('queued', 'En cola'), ('running', 'En proceso'), ('done', 'Terminado'), ('failed', 'Fallido')], default='queued', max_length=16, verbose_name='Estado')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Creado')),
+                ('started', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Terminado')),
+            ],
+            options={
+                'verbose_name': 'exportación a PDF',
+                'verbose_name_plural': 'Exportaciones a PDF',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='exportjob',
+            constraint=models.UniqueConstraint(condition=models.Q(status__in=['queued', 'running']), fields=('kind', 'object_id'), name='unique_pending_export_job'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.1.7 on 2026-10-18 08:51
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_totals(apps, schema_editor):
+    WorkshopOrder = apps.get_model('taller', 'WorkshopOrder')
+    Invoice = apps.get_model('taller', 'Invoice')
+    Activity = apps.get_model('taller', 'Activity')
+    money = DecimalField(max_digits=12, decimal_places=2)
+
+    def activities(field, aggregate):
+        return Coalesce(Subquery(Activity.objects
+                                 .filter(invoice=OuterRef('pk'))
+                                 .order_by()
+                                 .values('invoice')
+                                 .annotate(value=aggregate)
+                                 .values('value')[:1], output_field=field), Value(0), output_field=field)
+
+    WorkshopOrder.objects.update(total=F('workforce_cost') + F('amount'))
+    Invoice.objects.update(
+        activities_total=activities(money, Sum(ExpressionWrapper(F('price') * F('amount'), output_field=money))),
+        line_count=activities(models.PositiveIntegerField(), Count('pk')),
+    )
+    Invoice.objects.update(total=F('services_provided') + F('expendable_material') + F('workforce')
+                           + F('activities_total'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taller', '0002_export_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='activities_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Suma de precio por cantidad de las actividades', max_digits=12, verbose_name='Importe de las actividades'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='line_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Cantidad de actividades', verbose_name='Actividades'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Servicios, material gastable y mano de obra más el importe de las actividades', max_digits=12, verbose_name='Total'),
+        ),
+        migrations.AddField(
+            model_name='workshoporder',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Costo mano de obra más importe en piezas', max_digits=12, verbose_name='Total a pagar'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
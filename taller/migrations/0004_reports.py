@@ -0,0 +1,96 @@
+# Generated by Django 3.1.7 on 2026-10-18 08:54
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+
+
+def fill_reports(apps, schema_editor):
+    Invoice = apps.get_model('taller', 'Invoice')
+    Activity = apps.get_model('taller', 'Activity')
+    ReportSummary = apps.get_model('taller', 'ReportSummary')
+    ReportedInvoice = apps.get_model('taller', 'ReportedInvoice')
+    money = DecimalField(max_digits=14, decimal_places=2)
+
+    provenances = defaultdict(list)
+    for invoice_id, provenance, hours, revenue in (Activity.objects
+                                                   .order_by()
+                                                   .values_list('invoice', 'provenance')
+                                                   .annotate(hours=Sum('hours_worked'),
+                                                             revenue=Sum(ExpressionWrapper(F('price') * F('amount'),
+                                                                                           output_field=money)))
+                                                   .iterator()):
+        provenances[invoice_id].append((provenance, hours, revenue))
+
+    totals = defaultdict(lambda: [Decimal('0'), Decimal('0'), 0])
+    reported = list()
+    for invoice_id, invoice_date, total, enterprise_id, method_payment_id, mechanical_id in (
+            Invoice.objects.values_list('pk', 'date', 'total', 'workshop_order__enterprise',
+                                        'workshop_order__method_payment', 'workshop_order__mechanical').iterator()):
+        month = timezone.localtime(invoice_date).date().replace(day=1).isoformat()
+        hours = sum((Decimal(provenance_hours) for _, provenance_hours, _ in provenances[invoice_id]), Decimal('0'))
+        rows = [
+            ['month', 0, month, str(total), str(hours), 1],
+            ['enterprise', enterprise_id, month, str(total), str(hours), 1],
+            ['method_payment', method_payment_id, month, str(total), str(hours), 1],
+            ['mechanical', mechanical_id, month, str(total), str(hours), 1],
+        ]
+        for provenance_id, provenance_hours, revenue in provenances[invoice_id]:
+            rows.append(['provenance', provenance_id, month, str(revenue), str(provenance_hours), 1])
+
+        reported.append(ReportedInvoice(invoice_id=invoice_id, rows=rows))
+        for dimension, key, month, revenue, hours, invoices in rows:
+            summary = totals[(dimension, key, month)]
+            summary[0] += Decimal(revenue)
+            summary[1] += Decimal(hours)
+            summary[2] += invoices
+
+    ReportSummary.objects.bulk_create(
+        [ReportSummary(dimension=dimension, key=key, month=month, revenue=revenue, hours=hours, invoices=invoices)
+         for (dimension, key, month), (revenue, hours, invoices) in totals.items()], batch_size=500)
+    ReportedInvoice.objects.bulk_create(reported, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taller', '0003_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportedInvoice',
+            fields=[
+                ('invoice_id', models.PositiveIntegerField(primary_key=True, serialize=False, verbose_name='Factura')),
+                ('rows', models.JSONField(default=list, verbose_name='Aportes')),
+            ],
+            options={
+                'verbose_name': 'factura reportada',
+                'verbose_name_plural': 'Facturas reportadas',
+            },
+        ),
+        migrations.CreateModel(
+            name='ReportSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('month', 'Mes'), ('enterprise', 'Cliente'), ('method_payment', 'Método de pago'), ('mechanical', 'Mecánico'), ('provenance', 'Procedencia')], max_length=16, verbose_name='Dimensión')),
+                ('key', models.PositiveIntegerField(help_text='Id del cliente, mecánico, etc.; 0 por mes', verbose_name='Id')),
+                ('month', models.DateField(help_text='Primer día del mes', verbose_name='Mes')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Ingresos')),
+                ('hours', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Horas trabajadas')),
+                ('invoices', models.IntegerField(default=0, verbose_name='Facturas')),
+            ],
+            options={
+                'verbose_name': 'reporte',
+                'verbose_name_plural': 'Reportes',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reportsummary',
+            constraint=models.UniqueConstraint(fields=('dimension', 'key', 'month'), name='unique_report_summary'),
+        ),
+        migrations.RunPython(fill_reports, migrations.RunPython.noop),
+    ]
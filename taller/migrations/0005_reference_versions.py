@@ -0,0 +1,24 @@
+# Generated by Django 3.1.7 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taller', '0004_reports'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceVersion',
+            fields=[
+                ('model', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Modelo')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Versión')),
+            ],
+            options={
+                'verbose_name': 'versión de tabla de referencia',
+                'verbose_name_plural': 'Versiones de tablas de referencia',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.1.7 on 2026-10-18 09:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taller', '0005_reference_versions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activity',
+            name='invoice',
+            field=models.ForeignKey(db_index=False, help_text='Factura correspondiente', on_delete=django.db.models.deletion.CASCADE, to='taller.invoice', verbose_name='Factura'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['invoice', 'code'], name='activity_invoice_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['date', 'workshop_order'], name='invoice_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workshoporder',
+            index=models.Index(fields=['entry_date', 'id'], name='workshoporder_entry_date_idx'),
+        ),
+    ]
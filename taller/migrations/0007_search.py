@@ -0,0 +1,148 @@
+from django.db import migrations
+
+# Copia fija de las sentencias de taller.search al crear esta migración, para que cambios posteriores
+# en ese módulo no alteren lo que hace. Las sentencias de cada base de datos solo se ejecutan en ella.
+
+SQLITE_INSTALL = [
+    'CREATE VIRTUAL TABLE IF NOT EXISTS taller_workshoporder_search USING fts5(defection, work_done, '
+    "description_raw_materials_parts, complaints_suggestions, physical_states, tokenize = 'unicode61 "
+    "remove_diacritics 2', prefix = '2 3')",
+    "INSERT INTO taller_workshoporder_search (taller_workshoporder_search, rank) VALUES ('rank', 'bm25(3.0, 2.0, 1.0, "
+    "1.0, 2.0)')",
+    'CREATE VIRTUAL TABLE IF NOT EXISTS taller_physicalstate_search USING fts5(description, content = '
+    "'taller_physicalstate', content_rowid = 'id', tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    'CREATE TRIGGER IF NOT EXISTS taller_workshoporder_search_insert AFTER INSERT ON taller_workshoporder BEGIN '
+    'INSERT INTO taller_workshoporder_search (rowid, defection, work_done, description_raw_materials_parts, '
+    'complaints_suggestions, physical_states) VALUES (new.id, new.defection, new.work_done, '
+    "new.description_raw_materials_parts, new.complaints_suggestions, (SELECT group_concat(description, ' ') FROM "
+    'taller_physicalstate WHERE workshop_order_id = new.id)); END',
+    'CREATE TRIGGER IF NOT EXISTS taller_workshoporder_search_update AFTER UPDATE ON taller_workshoporder WHEN '
+    'old.defection IS NOT new.defection OR old.work_done IS NOT new.work_done OR old.description_raw_materials_parts '
+    'IS NOT new.description_raw_materials_parts OR old.complaints_suggestions IS NOT new.complaints_suggestions BEGIN '
+    'UPDATE taller_workshoporder_search SET defection = new.defection, work_done = new.work_done, '
+    'description_raw_materials_parts = new.description_raw_materials_parts, complaints_suggestions = '
+    'new.complaints_suggestions WHERE rowid = new.id; END',
+    'CREATE TRIGGER IF NOT EXISTS taller_workshoporder_search_delete AFTER DELETE ON taller_workshoporder BEGIN '
+    'DELETE FROM taller_workshoporder_search WHERE rowid = old.id; END',
+    'CREATE TRIGGER IF NOT EXISTS taller_physicalstate_search_insert AFTER INSERT ON taller_physicalstate BEGIN '
+    'INSERT INTO taller_physicalstate_search (rowid, description) VALUES (new.id, new.description); UPDATE '
+    "taller_workshoporder_search SET physical_states = (SELECT group_concat(description, ' ') FROM "
+    'taller_physicalstate WHERE workshop_order_id = new.workshop_order_id) WHERE rowid = new.workshop_order_id; END',
+    'CREATE TRIGGER IF NOT EXISTS taller_physicalstate_search_update AFTER UPDATE ON taller_physicalstate WHEN '
+    'old.description IS NOT new.description OR old.workshop_order_id IS NOT new.workshop_order_id BEGIN INSERT INTO '
+    "taller_physicalstate_search (taller_physicalstate_search, rowid, description) VALUES ('delete', old.id, "
+    'old.description); INSERT INTO taller_physicalstate_search (rowid, description) VALUES (new.id, new.description); '
+    "UPDATE taller_workshoporder_search SET physical_states = (SELECT group_concat(description, ' ') FROM "
+    'taller_physicalstate WHERE workshop_order_id = old.workshop_order_id) WHERE rowid = old.workshop_order_id; '
+    "UPDATE taller_workshoporder_search SET physical_states = (SELECT group_concat(description, ' ') FROM "
+    'taller_physicalstate WHERE workshop_order_id = new.workshop_order_id) WHERE rowid = new.workshop_order_id; END',
+    'CREATE TRIGGER IF NOT EXISTS taller_physicalstate_search_delete AFTER DELETE ON taller_physicalstate BEGIN '
+    "INSERT INTO taller_physicalstate_search (taller_physicalstate_search, rowid, description) VALUES ('delete', "
+    'old.id, old.description); UPDATE taller_workshoporder_search SET physical_states = (SELECT '
+    "group_concat(description, ' ') FROM taller_physicalstate WHERE workshop_order_id = old.workshop_order_id) WHERE "
+    'rowid = old.workshop_order_id; END',
+]
+
+SQLITE_REBUILD = [
+    'DELETE FROM taller_workshoporder_search',
+    'INSERT INTO taller_workshoporder_search (rowid, defection, work_done, description_raw_materials_parts, '
+    'complaints_suggestions, physical_states) SELECT o.id, o.defection, o.work_done, '
+    "o.description_raw_materials_parts, o.complaints_suggestions, (SELECT group_concat(description, ' ') FROM "
+    'taller_physicalstate WHERE workshop_order_id = o.id) FROM taller_workshoporder o',
+    "INSERT INTO taller_workshoporder_search (taller_workshoporder_search) VALUES ('optimize')",
+    "INSERT INTO taller_physicalstate_search (taller_physicalstate_search) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS taller_workshoporder_search_insert',
+    'DROP TRIGGER IF EXISTS taller_workshoporder_search_update',
+    'DROP TRIGGER IF EXISTS taller_workshoporder_search_delete',
+    'DROP TRIGGER IF EXISTS taller_physicalstate_search_insert',
+    'DROP TRIGGER IF EXISTS taller_physicalstate_search_update',
+    'DROP TRIGGER IF EXISTS taller_physicalstate_search_delete',
+    'DROP TABLE IF EXISTS taller_workshoporder_search',
+    'DROP TABLE IF EXISTS taller_physicalstate_search',
+]
+
+POSTGRESQL_INSTALL = [
+    'CREATE TABLE IF NOT EXISTS taller_workshoporder_search (workshop_order_id integer PRIMARY KEY, document tsvector '
+    'NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS taller_workshoporder_search_document ON taller_workshoporder_search USING GIN '
+    '(document)',
+    "CREATE INDEX IF NOT EXISTS taller_physicalstate_search ON taller_physicalstate USING GIN (to_tsvector('spanish', "
+    'description))',
+    'CREATE OR REPLACE FUNCTION taller_workshoporder_search_refresh(order_id integer) RETURNS void AS $$ INSERT INTO '
+    "taller_workshoporder_search (workshop_order_id, document) SELECT o.id, setweight(to_tsvector('spanish', "
+    "coalesce(o.defection, '')), 'A') || setweight(to_tsvector('spanish', coalesce(o.work_done, '')), 'B') || "
+    "setweight(to_tsvector('spanish', coalesce((SELECT string_agg(description, ' ') FROM taller_physicalstate WHERE "
+    "workshop_order_id = o.id), '')), 'B') || setweight(to_tsvector('spanish', "
+    "coalesce(o.description_raw_materials_parts, '') || ' ' || coalesce(o.complaints_suggestions, '')), 'C') FROM "
+    'taller_workshoporder o WHERE o.id = order_id ON CONFLICT (workshop_order_id) DO UPDATE SET document = '
+    'EXCLUDED.document $$ LANGUAGE sql',
+    "CREATE OR REPLACE FUNCTION taller_workshoporder_search_trigger() RETURNS trigger AS $$ BEGIN IF TG_OP = 'DELETE' "
+    'THEN DELETE FROM taller_workshoporder_search WHERE workshop_order_id = OLD.id; ELSE PERFORM '
+    'taller_workshoporder_search_refresh(NEW.id); END IF; RETURN NULL; END $$ LANGUAGE plpgsql',
+    'CREATE OR REPLACE FUNCTION taller_physicalstate_search_trigger() RETURNS trigger AS $$ BEGIN IF TG_OP <> '
+    "'INSERT' THEN PERFORM taller_workshoporder_search_refresh(OLD.workshop_order_id); END IF; IF TG_OP <> 'DELETE' "
+    'THEN PERFORM taller_workshoporder_search_refresh(NEW.workshop_order_id); END IF; RETURN NULL; END $$ LANGUAGE '
+    'plpgsql',
+    'DROP TRIGGER IF EXISTS taller_workshoporder_search ON taller_workshoporder',
+    'CREATE TRIGGER taller_workshoporder_search AFTER INSERT OR DELETE OR UPDATE OF defection, work_done, '
+    'description_raw_materials_parts, complaints_suggestions ON taller_workshoporder FOR EACH ROW EXECUTE PROCEDURE '
+    'taller_workshoporder_search_trigger()',
+    'DROP TRIGGER IF EXISTS taller_physicalstate_search ON taller_physicalstate',
+    'CREATE TRIGGER taller_physicalstate_search AFTER INSERT OR DELETE OR UPDATE OF description, workshop_order_id ON '
+    'taller_physicalstate FOR EACH ROW EXECUTE PROCEDURE taller_physicalstate_search_trigger()',
+]
+
+POSTGRESQL_REBUILD = [
+    'TRUNCATE taller_workshoporder_search',
+    'INSERT INTO taller_workshoporder_search (workshop_order_id, document) SELECT o.id, '
+    "setweight(to_tsvector('spanish', coalesce(o.defection, '')), 'A') || setweight(to_tsvector('spanish', "
+    "coalesce(o.work_done, '')), 'B') || setweight(to_tsvector('spanish', coalesce((SELECT string_agg(description, ' "
+    "') FROM taller_physicalstate WHERE workshop_order_id = o.id), '')), 'B') || setweight(to_tsvector('spanish', "
+    "coalesce(o.description_raw_materials_parts, '') || ' ' || coalesce(o.complaints_suggestions, '')), 'C') FROM "
+    'taller_workshoporder o',
+]
+
+POSTGRESQL_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS taller_workshoporder_search ON taller_workshoporder',
+    'DROP TRIGGER IF EXISTS taller_physicalstate_search ON taller_physicalstate',
+    'DROP FUNCTION IF EXISTS taller_workshoporder_search_trigger()',
+    'DROP FUNCTION IF EXISTS taller_physicalstate_search_trigger()',
+    'DROP FUNCTION IF EXISTS taller_workshoporder_search_refresh(integer)',
+    'DROP INDEX IF EXISTS taller_physicalstate_search',
+    'DROP TABLE IF EXISTS taller_workshoporder_search',
+]
+
+
+class VendorRunSQL(migrations.RunSQL):
+    """RunSQL que solo se ejecuta en las bases de datos de ``vendor``."""
+
+    def __init__(self, vendor, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.vendor = vendor
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        return name, [self.vendor, *args], kwargs
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taller', '0006_indexes'),
+    ]
+
+    operations = [
+        VendorRunSQL('sqlite', SQLITE_INSTALL + SQLITE_REBUILD, SQLITE_UNINSTALL),
+        VendorRunSQL('postgresql', POSTGRESQL_INSTALL + POSTGRESQL_REBUILD, POSTGRESQL_UNINSTALL),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 
 
 class Contact(models.Model):
@@ -146,14 +147,26 @@ class WorkshopOrder(models.Model):
                                  help_text='Importe')
     service_guarantee = models.ForeignKey(ServiceGuarantee, verbose_name='Garantía del servicio',
                                           on_delete=models.CASCADE)
+    total = models.DecimalField(verbose_name='Total a pagar', max_digits=12, decimal_places=2, default=0,
+                                editable=False, help_text='Costo mano de obra más importe en piezas')
 
     class Meta:
         verbose_name = 'orden del taller'
         verbose_name_plural = 'Ordenes del taller'
+        indexes = [
+            # Con el id, el índice ordena el listado por fecha y cubre la consulta de ids de cada página
+            models.Index(fields=['entry_date', 'id'], name='workshoporder_entry_date_idx'),
+        ]
 
     def __str__(self):
         return str(self.pk)
 
+    def save(self, *args, **kwargs):
+        self.total = self.workforce_cost + self.amount
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'total'}
+        super().save(*args, **kwargs)
+
 
 class PhysicalState(models.Model):
     workshop_order = models.ForeignKey(WorkshopOrder, verbose_name='Orden del taller', on_delete=models.CASCADE,
@@ -183,14 +196,45 @@ class Invoice(models.Model):
     workforce = models.DecimalField(verbose_name='Mano de Obra', max_digits=7, decimal_places=2,
                                     help_text='Mano de Obra')
     date = models.DateTimeField(verbose_name='Fecha', help_text='Fecha de la factura', auto_now=True)
+    activities_total = models.DecimalField(verbose_name='Importe de las actividades', max_digits=12,
+                                           decimal_places=2, default=0, editable=False,
+                                           help_text='Suma de precio por cantidad de las actividades')
+    line_count = models.PositiveIntegerField(verbose_name='Actividades', default=0, editable=False,
+                                             help_text='Cantidad de actividades')
+    total = models.DecimalField(verbose_name='Total', max_digits=12, decimal_places=2, default=0, editable=False,
+                                help_text='Servicios, material gastable y mano de obra más el importe de las '
+                                          'actividades')
 
     class Meta:
         verbose_name = 'factura'
         verbose_name_plural = 'Facturas'
+        indexes = [
+            models.Index(fields=['date', 'workshop_order'], name='invoice_date_idx'),
+        ]
 
     def __str__(self):
         return str(self.pk)
 
+    def save(self, *args, **kwargs):
+        # activities_total y line_count los mantiene Activity; se releen para no pisar cambios concurrentes
+        with transaction.atomic():
+            current = (Invoice.objects.select_for_update()
+                       .filter(pk=self.pk)
+                       .values_list('activities_total', 'line_count')
+                       .first())
+            if current is not None:
+                self.activities_total, self.line_count = current
+            self.total = self.services_provided + self.expendable_material + self.workforce + self.activities_total
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'total'}
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def add_activity_amount(cls, invoice_id, amount, lines):
+        cls.objects.filter(pk=invoice_id).update(activities_total=F('activities_total') + amount,
+                                                 line_count=F('line_count') + lines,
+                                                 total=F('total') + amount)
+
 
 class Provenance(models.Model):
     provenance = models.CharField(verbose_name='Procedencia', max_length=255, help_text='Procedencia')
@@ -204,7 +248,8 @@ class Provenance(models.Model):
 
 
 class Activity(models.Model):
-    invoice = models.ForeignKey(Invoice, verbose_name='Factura', on_delete=models.CASCADE,
+    # Sin índice propio: lo cubre activity_invoice_code_idx, que empieza por la factura
+    invoice = models.ForeignKey(Invoice, verbose_name='Factura', on_delete=models.CASCADE, db_index=False,
                                 help_text='Factura correspondiente')
     code = models.PositiveIntegerField(verbose_name='Código', unique=True, help_text='Código')
     description = models.CharField(verbose_name='Descripción', max_length=255, help_text='Descripción')
@@ -219,6 +264,118 @@ class Activity(models.Model):
     class Meta:
         verbose_name = 'actividad'
         verbose_name_plural = 'Actividades'
+        indexes = [
+            # Las actividades de una factura ordenadas por código, sin ordenarlas en memoria
+            models.Index(fields=['invoice', 'code'], name='activity_invoice_code_idx'),
+        ]
 
     def __str__(self):
         return str(self.code)
+
+    def save(self, *args, **kwargs):
+        # Los borrados se descuentan en el receptor post_delete de taller.signals
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = Activity.objects.filter(pk=self.pk).values_list('invoice_id', 'price', 'amount').first()
+            super().save(*args, **kwargs)
+            if previous is not None:
+                invoice_id, price, amount = previous
+                Invoice.add_activity_amount(invoice_id, -price * amount, -1)
+            Invoice.add_activity_amount(self.invoice_id, self.price * self.amount, 1)
+
+
+class ExportJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'En cola'),
+        (RUNNING, 'En proceso'),
+        (DONE, 'Terminado'),
+        (FAILED, 'Fallido'),
+    ]
+    PENDING = (QUEUED, RUNNING)
+
+    KIND_CHOICES = [
+        ('workshop_order', 'Orden del taller'),
+        ('invoice', 'Factura'),
+    ]
+
+    kind = models.CharField(verbose_name='Documento', max_length=32, choices=KIND_CHOICES)
+    object_id = models.CharField(verbose_name='Id del documento', max_length=255)
+    status = models.CharField(verbose_name='Estado', max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    error = models.TextField(verbose_name='Error', blank=True)
+    created = models.DateTimeField(verbose_name='Creado', auto_now_add=True)
+    started = models.DateTimeField(verbose_name='Iniciado', null=True, blank=True)
+    finished = models.DateTimeField(verbose_name='Terminado', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'exportación a PDF'
+        verbose_name_plural = 'Exportaciones a PDF'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], condition=models.Q(status__in=['queued', 'running']),
+                                    name='unique_pending_export_job'),
+        ]
+
+    def __str__(self):
+        return '{} {}'.format(self.get_kind_display(), self.object_id)
+
+
+class ReportSummary(models.Model):
+    MONTH = 'month'
+    ENTERPRISE = 'enterprise'
+    METHOD_PAYMENT = 'method_payment'
+    MECHANICAL = 'mechanical'
+    PROVENANCE = 'provenance'
+    DIMENSION_CHOICES = [
+        (MONTH, 'Mes'),
+        (ENTERPRISE, 'Cliente'),
+        (METHOD_PAYMENT, 'Método de pago'),
+        (MECHANICAL, 'Mecánico'),
+        (PROVENANCE, 'Procedencia'),
+    ]
+
+    dimension = models.CharField(verbose_name='Dimensión', max_length=16, choices=DIMENSION_CHOICES)
+    key = models.PositiveIntegerField(verbose_name='Id', help_text='Id del cliente, mecánico, etc.; 0 por mes')
+    month = models.DateField(verbose_name='Mes', help_text='Primer día del mes')
+    revenue = models.DecimalField(verbose_name='Ingresos', max_digits=14, decimal_places=2, default=0)
+    hours = models.DecimalField(verbose_name='Horas trabajadas', max_digits=14, decimal_places=2, default=0)
+    invoices = models.IntegerField(verbose_name='Facturas', default=0)
+
+    class Meta:
+        verbose_name = 'reporte'
+        verbose_name_plural = 'Reportes'
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key', 'month'], name='unique_report_summary'),
+        ]
+
+    def __str__(self):
+        return '{} {} {:%m/%Y}'.format(self.get_dimension_display(), self.key, self.month)
+
+
+class ReportedInvoice(models.Model):
+    """Lo que cada factura aportó a los reportes, para descontarlo cuando la factura cambia."""
+    invoice_id = models.PositiveIntegerField(verbose_name='Factura', primary_key=True)
+    rows = models.JSONField(verbose_name='Aportes', default=list)
+
+    class Meta:
+        verbose_name = 'factura reportada'
+        verbose_name_plural = 'Facturas reportadas'
+
+    def __str__(self):
+        return str(self.invoice_id)
+
+
+class ReferenceVersion(models.Model):
+    """Versión de cada tabla de referencia; cambia con cada edición para que los procesos recarguen su copia."""
+    model = models.CharField(verbose_name='Modelo', max_length=100, primary_key=True)
+    version = models.PositiveIntegerField(verbose_name='Versión', default=0)
+
+    class Meta:
+        verbose_name = 'versión de tabla de referencia'
+        verbose_name_plural = 'Versiones de tablas de referencia'
+
+    def __str__(self):
+        return '{} {}'.format(self.model, self.version)
@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def _estimated_rows(queryset):
+    """Filas de la tabla según las estadísticas de PostgreSQL, sin recorrerla; ``None`` si no aplica."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                       [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    return row[0] if row and row[0] > 0 else None
+
+
+class LargeTablePaginator(Paginator):
+    """Paginador para los listados de tablas grandes.
+
+    Cuenta como mucho ``TALLER_ADMIN_COUNT_LIMIT`` filas (en PostgreSQL, sin filtros, usa la
+    estimación del planificador) y arma cada página en dos pasos: primero los ids de la página sobre el
+    índice de la clave primaria, y después solo esas filas con sus relaciones. Así el desplazamiento
+    no recorre las filas completas ni sus uniones, y una página lejana cuesta casi lo mismo que la primera.
+    """
+    capped = False
+    estimated = False
+
+    @cached_property
+    def count(self):
+        limit = getattr(settings, 'TALLER_ADMIN_COUNT_LIMIT', 100000)
+        if limit is None:
+            return super().count
+
+        estimate = _estimated_rows(self.object_list)
+        if estimate is not None and estimate > limit:
+            self.estimated = True
+            return estimate
+
+        count = self.object_list.order_by().values('pk')[:limit + 1].count()
+        if count > limit:
+            self.capped = True
+            return limit
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Con un total aproximado puede haber páginas después de la última calculada
+            if (self.capped or self.estimated) and int(number) > 1:
+                return int(number)
+            raise
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if not (self.capped or self.estimated) and top + self.orphans >= self.count:
+            top = self.count
+        page_ids = list(self.object_list.values_list('pk', flat=True)[bottom:top])
+        if not page_ids and number > 1:
+            raise EmptyPage('Esa página no contiene resultados')
+        return self._get_page(list(self.object_list.filter(pk__in=page_ids)), number, self)
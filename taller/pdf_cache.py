@@ -0,0 +1,157 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+CHUNK_SIZE = 64 * 1024
+
+_lock = threading.Lock()
+
+hits = 0
+misses = 0
+
+
+def _directory():
+    return getattr(settings, 'TALLER_PDF_CACHE_DIR', None)
+
+
+def _prefix(kind, object_id):
+    return '{}-{}-'.format(kind, object_id)
+
+
+def _path(directory, kind, object_id, version):
+    return os.path.join(directory, '{}{}.pdf'.format(_prefix(kind, object_id), version))
+
+
+def _entries(directory):
+    try:
+        with os.scandir(directory) as entries:
+            return [entry for entry in entries if entry.name.endswith('.pdf')]
+    except FileNotFoundError:
+        return list()
+
+
+def _size(entry):
+    try:
+        return entry.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _touch(path):
+    # La fecha de modificación marca el último uso para el desalojo LRU; se fija explícitamente
+    # porque el reloj que usa el sistema de archivos puede tener una resolución de varios milisegundos
+    now = time.time()
+    os.utime(path, (now, now))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        # Ya fue eliminado por otro proceso o todavía se está enviando (Windows)
+        pass
+
+
+def get(kind, object_id, version):
+    """Devuelve el PDF guardado para esta versión del documento como archivo abierto, o None."""
+    global hits, misses
+
+    directory = _directory()
+    if directory is None:
+        return None
+
+    path = _path(directory, kind, object_id, version)
+    try:
+        pdf = open(path, 'rb')
+    except FileNotFoundError:
+        with _lock:
+            misses += 1
+        return None
+
+    try:
+        _touch(path)
+    except OSError:
+        pass
+    with _lock:
+        hits += 1
+    return pdf
+
+
+def put(kind, object_id, version, source):
+    """Guarda el PDF, descarta las versiones anteriores del documento y lo devuelve como archivo abierto."""
+    directory = _directory()
+    if directory is None:
+        return None
+
+    os.makedirs(directory, exist_ok=True)
+    invalidate(kind, object_id)
+
+    path = _path(directory, kind, object_id, version)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp:
+        shutil.copyfileobj(source, tmp, CHUNK_SIZE)
+    os.replace(tmp_path, path)
+    _touch(path)
+
+    pdf = open(path, 'rb')
+    evict()
+    return pdf
+
+
+def invalidate(kind, object_id):
+    directory = _directory()
+    if directory is None:
+        return
+
+    prefix = _prefix(kind, object_id)
+    for entry in _entries(directory):
+        if entry.name.startswith(prefix):
+            _remove(entry.path)
+
+
+def clear():
+    directory = _directory()
+    if directory is None:
+        return
+
+    for entry in _entries(directory):
+        _remove(entry.path)
+
+
+def evict():
+    """Elimina los PDF usados hace más tiempo hasta que la caché quepa en TALLER_PDF_CACHE_MAX_BYTES."""
+    directory = _directory()
+    if directory is None:
+        return
+
+    max_bytes = getattr(settings, 'TALLER_PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+    entries = list()
+    for entry in _entries(directory):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    size = sum(entry_size for _, entry_size, _ in entries)
+    for _, entry_size, path in sorted(entries):
+        if size <= max_bytes:
+            break
+        _remove(path)
+        size -= entry_size
+
+
+def stats():
+    entries = _entries(_directory()) if _directory() is not None else list()
+    requests = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / requests if requests else 0.0,
+        'entries': len(entries),
+        'bytes': sum(_size(entry) for entry in entries),
+    }
@@ -0,0 +1,71 @@
+import time
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import cm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+from . import pdf_registry
+
+HEADER_FOOTER_FORM = 'HeaderFooter'
+PAGE_COUNT_FORM = 'PageCount'
+
+PAGE_NUMBER_FONT_SIZE = 9
+
+
+def define_header_footer_form(canv):
+    """Dibuja el encabezado y el pie una sola vez por documento como un XObject de formulario.
+
+    Las páginas lo referencian con doForm antes de que exista, por lo que debe llamarse
+    antes de guardar el documento y fuera de cualquier página con contenido.
+    """
+    w, h = letter
+
+    canv.beginForm(HEADER_FOOTER_FORM)
+    canv.drawImage(pdf_registry.get_header_image(), 0, h - 3.55 * cm, width=w, height=3.55 * cm, mask='auto')
+    canv.drawImage(pdf_registry.get_footer_image(), 0, 0 * cm, width=w, height=3.18 * cm, mask='auto')
+    canv.endForm()
+
+
+def define_page_count_form(canv, page_count):
+    canv.beginForm(PAGE_COUNT_FORM)
+    canv.setFont(pdf_registry.get_font('Calibri'), PAGE_NUMBER_FONT_SIZE)
+    canv.drawString(0, 0, str(page_count))
+    canv.endForm()
+
+
+class PageDecoratedCanvas(canvas.Canvas):
+    """Canvas que emite cada página en cuanto se termina.
+
+    El encabezado, el pie y el total de páginas son formularios referenciados por cada
+    página y definidos al guardar, así que no se conserva ningún estado por página.
+    """
+
+    save_seconds = 0.0
+
+    def save(self):
+        start = time.perf_counter()
+        define_header_footer_form(self)
+        define_page_count_form(self, self.getPageNumber() - 1)
+        canvas.Canvas.save(self)
+        self.save_seconds = time.perf_counter() - start
+
+
+def decorate_page(canv, doc):
+    canv.doForm(HEADER_FOOTER_FORM)
+
+
+def decorate_numbered_page(canv, doc):
+    decorate_page(canv, doc)
+
+    font_name = pdf_registry.get_font('Calibri')
+    text = 'Página {} de '.format(canv.getPageNumber())
+    x = doc.leftMargin + doc.width - stringWidth(text + '000', font_name, PAGE_NUMBER_FONT_SIZE)
+    y = doc.bottomMargin - 0.5 * cm
+
+    canv.saveState()
+    canv.setFont(font_name, PAGE_NUMBER_FONT_SIZE)
+    canv.drawString(x, y, text)
+    canv.translate(x + stringWidth(text, font_name, PAGE_NUMBER_FONT_SIZE), y)
+    canv.doForm(PAGE_COUNT_FORM)
+    canv.restoreState()
@@ -0,0 +1,175 @@
+import logging
+import os
+import threading
+import time
+
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_JUSTIFY
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+
+logger = logging.getLogger(__name__)
+
+FONTS = (
+    ('Calibri', 'Calibri.ttf', 'Helvetica'),
+    ('Calibri-Bold', 'CalibriB.ttf', 'Helvetica-Bold'),
+)
+
+IMG_DIR = os.path.join(os.path.dirname(__file__), 'img')
+
+_lock = threading.Lock()
+_fonts = dict()
+_order_styles = None
+_invoice_styles = None
+_header_image = None
+_footer_image = None
+
+warmup_seconds = None
+
+
+def _register_fonts():
+    for name, filename, fallback in FONTS:
+        try:
+            pdfmetrics.registerFont(TTFont(name, filename))
+            _fonts[name] = name
+        except TTFError:
+            logger.warning('No se encontró la fuente %s, se usará %s', filename, fallback)
+            _fonts[name] = fallback
+
+
+def _build_order_styles():
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='Workshop_Order_Title',
+                              fontName=_fonts['Calibri-Bold'],
+                              fontSize=20,
+                              leading=24,
+                              alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal',
+                              fontName=_fonts['Calibri']))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal_12',
+                              parent=styles['Workshop_Order_Normal'],
+                              fontSize=12,
+                              leading=14.4))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal_12_Right',
+                              parent=styles['Workshop_Order_Normal_12'],
+                              alignment=TA_RIGHT))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal_Bold_12',
+                              parent=styles['Workshop_Order_Normal_12'],
+                              fontName=_fonts['Calibri-Bold']))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal_Bold_12_Right',
+                              parent=styles['Workshop_Order_Normal_Bold_12'],
+                              alignment=TA_RIGHT))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal_12_Justify',
+                              parent=styles['Workshop_Order_Normal_12'],
+                              alignment=TA_JUSTIFY))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal_Bold_12_Center',
+                              parent=styles['Workshop_Order_Normal_Bold_12'],
+                              alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal_14',
+                              parent=styles['Workshop_Order_Normal'],
+                              fontSize=14,
+                              leading=16.8))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal_14_Right',
+                              parent=styles['Workshop_Order_Normal_14'],
+                              alignment=TA_RIGHT))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal_Bold_14',
+                              parent=styles['Workshop_Order_Normal_14'],
+                              fontName=_fonts['Calibri-Bold']))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal_Bold_14_Right',
+                              parent=styles['Workshop_Order_Normal_Bold_14'],
+                              alignment=TA_RIGHT))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal_14_Justify',
+                              parent=styles['Workshop_Order_Normal_14'],
+                              alignment=TA_JUSTIFY))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal_14_Center',
+                              parent=styles['Workshop_Order_Normal_14'],
+                              alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal_16',
+                              parent=styles['Workshop_Order_Normal'],
+                              fontSize=16,
+                              leading=19.2))
+    styles.add(ParagraphStyle(name='Workshop_Order_Normal_16_Justify',
+                              parent=styles['Workshop_Order_Normal_16'],
+                              alignment=TA_JUSTIFY))
+    return styles
+
+
+def _build_invoice_styles():
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='Invoice_Normal',
+                              fontName=_fonts['Calibri'],
+                              fontSize=11,
+                              leading=13.2))
+    styles.add(ParagraphStyle(name='Invoice_Normal_Center',
+                              parent=styles['Invoice_Normal'],
+                              alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='Invoice_Normal_Right',
+                              parent=styles['Invoice_Normal'],
+                              alignment=TA_RIGHT))
+    styles.add(ParagraphStyle(name='Invoice_Normal_Bold',
+                              parent=styles['Invoice_Normal'],
+                              fontName=_fonts['Calibri-Bold']))
+    styles.add(ParagraphStyle(name='Invoice_Normal_Bold_Right',
+                              parent=styles['Invoice_Normal_Bold'],
+                              alignment=TA_RIGHT))
+    styles.add(ParagraphStyle(name='Invoice_Normal_Bold_Center',
+                              parent=styles['Invoice_Normal_Bold'],
+                              alignment=TA_CENTER))
+    return styles
+
+
+def _load_image(filename):
+    image = ImageReader(os.path.join(IMG_DIR, filename))
+    # Decodifica los píxeles ahora para que cada documento solo tenga que comprimirlos
+    image.getRGBData()
+    return image
+
+
+def warm_up():
+    """Registra las fuentes, construye las hojas de estilo y decodifica las imágenes una sola vez por proceso.
+
+    Los objetos resultantes se comparten entre hilos y no deben modificarse.
+    """
+    global _order_styles, _invoice_styles, _header_image, _footer_image, warmup_seconds
+
+    if warmup_seconds is not None:
+        return warmup_seconds
+
+    with _lock:
+        if warmup_seconds is None:
+            start = time.perf_counter()
+            _register_fonts()
+            _order_styles = _build_order_styles()
+            _invoice_styles = _build_invoice_styles()
+            _header_image = _load_image('header.png')
+            _footer_image = _load_image('footer.png')
+            warmup_seconds = time.perf_counter() - start
+            logger.info('Fuentes, estilos e imágenes PDF cargados en %.3f s', warmup_seconds)
+
+    return warmup_seconds
+
+
+def get_order_styles():
+    warm_up()
+    return _order_styles
+
+
+def get_invoice_styles():
+    warm_up()
+    return _invoice_styles
+
+
+def get_font(name):
+    warm_up()
+    return _fonts[name]
+
+
+def get_header_image():
+    warm_up()
+    return _header_image
+
+
+def get_footer_image():
+    warm_up()
+    return _footer_image
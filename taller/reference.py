@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+
+from . import metrics
+from .models import Type, UnitMeasurement, MethodPayment, ServiceGuarantee, Provenance, Piece, ReferenceVersion
+
+logger = logging.getLogger(__name__)
+
+# Tablas de referencia y el campo que las identifica en los archivos importados
+NATURAL_KEYS = {
+    Type: 'title',
+    UnitMeasurement: 'name',
+    MethodPayment: 'type',
+    ServiceGuarantee: 'description',
+    Provenance: 'provenance',
+    Piece: 'name',
+}
+
+_lock = threading.Lock()
+_tables = dict()
+_versions = None
+_checked = 0.0
+
+
+class Table:
+    def __init__(self, model, version):
+        self.version = version
+        # Siempre de la base principal: la copia la comparten todas las lecturas del proceso
+        self.objects = list(model.objects.using(DEFAULT_DB_ALIAS).order_by('pk'))
+        self.by_pk = {obj.pk: obj for obj in self.objects}
+        self.by_key = dict()
+        for obj in self.objects:
+            self.by_key.setdefault(getattr(obj, NATURAL_KEYS[model]), obj)
+
+
+def _current_versions():
+    # Las ediciones de otros procesos se ven al volver a leer las versiones, como mucho cada
+    # TALLER_REFERENCE_CACHE_CHECK_SECONDS; las de este proceso, enseguida
+    global _versions, _checked
+    versions = _versions
+    interval = getattr(settings, 'TALLER_REFERENCE_CACHE_CHECK_SECONDS', 1.0)
+    if versions is None or time.monotonic() - _checked >= interval:
+        queryset = ReferenceVersion.objects.using(DEFAULT_DB_ALIAS).values_list('model', 'version')
+        versions = _versions = dict(queryset)
+        _checked = time.monotonic()
+    return versions
+
+
+def _table(model):
+    label = model._meta.label
+    version = _current_versions().get(label, 0)
+    table = _tables.get(model)
+    if table is not None and table.version == version:
+        metrics.inc('taller_reference_cache_hits_total', (('model', label),))
+        return table
+
+    metrics.inc('taller_reference_cache_misses_total', (('model', label),))
+    table = Table(model, version)
+    with _lock:
+        _tables[model] = table
+    logger.debug('%s: %d filas cargadas, versión %d', label, len(table.objects), version)
+    return table
+
+
+def rows(model):
+    """Todas las filas de la tabla, ordenadas por id. Las instancias se comparten: no deben modificarse."""
+    return _table(model).objects
+
+
+def get(model, pk):
+    return _table(model).by_pk.get(pk)
+
+
+def get_by_natural_key(model, value):
+    return _table(model).by_key.get(value)
+
+
+def warm_up():
+    for model in NATURAL_KEYS:
+        _table(model)
+
+
+def invalidate(model):
+    """Descarta la copia de la tabla y avanza su versión para que los demás procesos la recarguen."""
+    global _versions
+    label = model._meta.label
+    with _lock:
+        _tables.pop(model, None)
+        _versions = None
+    if not ReferenceVersion.objects.filter(model=label).update(version=F('version') + 1):
+        ReferenceVersion.objects.get_or_create(model=label, defaults={'version': 1})
+    logger.debug('%s: tabla de referencia invalidada', label)
+
+
+def invalidate_all():
+    for model in NATURAL_KEYS:
+        invalidate(model)
+
+
+def clear():
+    """Descarta las copias de este proceso, sin avisar a los demás."""
+    global _versions
+    with _lock:
+        _tables.clear()
+        _versions = None
+
@@ -0,0 +1,151 @@
+import contextlib
+import contextvars
+import logging
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+LAST_WRITE_COOKIE = 'taller_last_write'
+
+_current = contextvars.ContextVar('taller_read_database', default=None)
+_synced = dict()
+
+
+def alias():
+    return getattr(settings, 'TALLER_REPLICA_DATABASE', 'replica')
+
+
+def configured():
+    return alias() in settings.DATABASES
+
+
+def max_lag():
+    """Segundos de atraso admitidos en la réplica; con más, las lecturas vuelven a la base principal."""
+    return getattr(settings, 'TALLER_REPLICA_MAX_LAG_SECONDS', 300)
+
+
+def snapshot_path():
+    return getattr(settings, 'TALLER_REPLICA_SNAPSHOT', None)
+
+
+def _read_synced_at():
+    connection = connections[alias()]
+    if connection.vendor == 'sqlite':
+        # La copia tiene como fecha de modificación el momento en que se empezó a copiar
+        return os.path.getmtime(snapshot_path())
+    with connection.cursor() as cursor:
+        # Una réplica que ya aplicó todo lo recibido está al día aunque la última transacción sea antigua
+        cursor.execute('SELECT CASE WHEN NOT pg_is_in_recovery() '
+                       'OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                       'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END')
+        lag = cursor.fetchone()[0]
+    return None if lag is None else time.time() - float(lag)
+
+
+def synced_at():
+    """Momento (``time.time()``) hasta el que la réplica tiene los datos, o ``None`` si no se puede saber.
+
+    Se vuelve a consultar como mucho cada ``TALLER_REPLICA_CHECK_SECONDS``.
+    """
+    checked, value = _synced.get(alias(), (None, None))
+    if checked is None or time.monotonic() - checked >= getattr(settings, 'TALLER_REPLICA_CHECK_SECONDS', 5.0):
+        try:
+            value = _read_synced_at()
+        except (DatabaseError, OSError) as e:
+            logger.warning('No se pudo consultar el atraso de la réplica: %s', e)
+            value = None
+        _synced[alias()] = (time.monotonic(), value)
+    return value
+
+
+def read_alias(since=None):
+    """Base de datos para una lectura de solo consulta.
+
+    La réplica si está configurada, su atraso no supera ``TALLER_REPLICA_MAX_LAG_SECONDS`` y ya tiene lo
+    escrito hasta ``since``; si no, la base principal.
+    """
+    if not configured():
+        return DEFAULT_DB_ALIAS
+    synced = synced_at()
+    if synced is None or time.time() - synced > max_lag() or (since is not None and since > synced):
+        return DEFAULT_DB_ALIAS
+    return alias()
+
+
+def current():
+    """Base de datos elegida para las lecturas en curso, o ``None`` fuera de ``reading``."""
+    return _current.get()
+
+
+def use(database):
+    """Fija la base de lectura para el resto del hilo."""
+    _current.set(database)
+
+
+@contextlib.contextmanager
+def using(database):
+    token = _current.set(database)
+    try:
+        yield database
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def reading(since=None):
+    """Envía a la réplica las lecturas hechas dentro del bloque, si ``read_alias`` lo permite."""
+    database = read_alias(since)
+    metrics.inc('taller_read_queries_routed_total', (('database', database),))
+    with using(database):
+        yield database
+
+
+def last_write(request):
+    """Momento de la última escritura hecha por este navegador, según la cookie de ``ReplicaMiddleware``."""
+    try:
+        return float(request.get_signed_cookie(LAST_WRITE_COOKIE, salt=LAST_WRITE_COOKIE))
+    except (KeyError, ValueError, signing.BadSignature):
+        return None
+
+
+def mark_write(response):
+    # Pasado el atraso máximo la réplica ya tiene la escritura, y la cookie deja de hacer falta
+    response.set_signed_cookie(LAST_WRITE_COOKIE, repr(time.time()), salt=LAST_WRITE_COOKIE, max_age=max_lag(),
+                               httponly=True, samesite='Lax')
+
+
+def refresh_snapshot(path=None):
+    """Copia la base principal de SQLite en ``TALLER_REPLICA_SNAPSHOT`` y devuelve los segundos empleados.
+
+    Se copia con la API de respaldo de SQLite, que no bloquea a los escritores en modo WAL, a un archivo
+    temporal que luego reemplaza a la copia anterior: las conexiones abiertas siguen leyendo la anterior
+    hasta que se cierran.
+    """
+    path = str(path or snapshot_path())
+    source = connections[DEFAULT_DB_ALIAS]
+    source.ensure_connection()
+    start = time.time()
+
+    temporary = path + '.tmp'
+    target = sqlite3.connect(temporary)
+    try:
+        source.connection.backup(target)
+        # Sin WAL, la copia se puede abrir solo para lectura
+        target.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        target.close()
+    os.utime(temporary, (start, start))
+    os.replace(temporary, path)
+
+    if configured():
+        connections[alias()].close()
+    _synced.pop(alias(), None)
+    return time.time() - start
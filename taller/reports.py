@@ -0,0 +1,233 @@
+import threading
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+
+from .models import Enterprise, MethodPayment, Mechanical, Provenance, Invoice, Activity, ReportSummary, \
+    ReportedInvoice
+
+INVOICE_FIELDS = ('pk', 'date', 'total', 'workshop_order__enterprise', 'workshop_order__method_payment',
+                  'workshop_order__mechanical')
+
+LABELS = {
+    ReportSummary.ENTERPRISE: Enterprise,
+    ReportSummary.METHOD_PAYMENT: MethodPayment,
+    ReportSummary.MECHANICAL: Mechanical,
+    ReportSummary.PROVENANCE: Provenance,
+}
+
+# Facturas por consulta al recalcular sólo algunas; SQLite limita los parámetros de cada consulta
+CHUNK_SIZE = 500
+
+_local = threading.local()
+
+
+def _activities(invoice_ids=None):
+    money = DecimalField(max_digits=14, decimal_places=2)
+    activities = Activity.objects.all() if invoice_ids is None else Activity.objects.filter(invoice__in=invoice_ids)
+    return (activities
+            .order_by()
+            .values_list('invoice', 'provenance')
+            .annotate(hours=Sum('hours_worked'),
+                      revenue=Sum(ExpressionWrapper(F('price') * F('amount'), output_field=money))))
+
+
+def _rows(invoice, provenances):
+    """Aportes de una factura: ``[dimensión, id, mes, ingresos, horas, facturas]`` con importes como texto."""
+    _, invoice_date, total, enterprise_id, method_payment_id, mechanical_id = invoice
+    month = timezone.localtime(invoice_date).date().replace(day=1).isoformat()
+    hours = sum((Decimal(provenance_hours) for _, provenance_hours, _ in provenances), Decimal('0'))
+
+    rows = [
+        [ReportSummary.MONTH, 0, month, str(total), str(hours), 1],
+        [ReportSummary.ENTERPRISE, enterprise_id, month, str(total), str(hours), 1],
+        [ReportSummary.METHOD_PAYMENT, method_payment_id, month, str(total), str(hours), 1],
+        [ReportSummary.MECHANICAL, mechanical_id, month, str(total), str(hours), 1],
+    ]
+    for provenance_id, provenance_hours, revenue in provenances:
+        rows.append([ReportSummary.PROVENANCE, provenance_id, month, str(revenue), str(provenance_hours), 1])
+    return rows
+
+
+def contribution(invoice_id):
+    """Aportes actuales de la factura a los reportes, en dos consultas; vacío si la factura no existe."""
+    invoice = Invoice.objects.filter(pk=invoice_id).values_list(*INVOICE_FIELDS).first()
+    if invoice is None:
+        return list()
+    provenances = [(provenance, hours, revenue) for _, provenance, hours, revenue in _activities([invoice_id])]
+    return _rows(invoice, provenances)
+
+
+def _apply(rows, sign):
+    for dimension, key, month, revenue, hours, invoices in rows:
+        revenue, hours, invoices = sign * Decimal(revenue), sign * Decimal(hours), sign * invoices
+        summary = ReportSummary.objects.filter(dimension=dimension, key=key, month=month)
+        changes = dict(revenue=F('revenue') + revenue, hours=F('hours') + hours, invoices=F('invoices') + invoices)
+        if summary.update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                ReportSummary.objects.create(dimension=dimension, key=key, month=month, revenue=revenue,
+                                             hours=hours, invoices=invoices)
+        except IntegrityError:
+            # Otro proceso creó la fila al mismo tiempo
+            summary.update(**changes)
+
+
+def refresh(invoice_ids):
+    """Descuenta de los reportes lo que aportaban las facturas y suma lo que aportan ahora."""
+    with transaction.atomic():
+        for invoice_id in sorted(invoice_ids):
+            reported = ReportedInvoice.objects.select_for_update().filter(pk=invoice_id).first()
+            rows = contribution(invoice_id)
+            previous = reported.rows if reported is not None else list()
+            if rows == previous:
+                continue
+
+            _apply(previous, -1)
+            _apply(rows, 1)
+            if rows:
+                ReportedInvoice.objects.update_or_create(invoice_id=invoice_id, defaults={'rows': rows})
+            else:
+                ReportedInvoice.objects.filter(pk=invoice_id).delete()
+
+
+class _PendingRefresh:
+    def __init__(self):
+        self.invoice_ids = set()
+
+    def __call__(self):
+        refresh(self.invoice_ids)
+
+
+def schedule_refresh(invoice_id):
+    """Actualiza los reportes de la factura al confirmarse la transacción en curso.
+
+    Todos los cambios de una misma transacción se agrupan en una sola actualización por factura.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        refresh([invoice_id])
+        return
+
+    pending = getattr(_local, 'pending', None)
+    if pending is None or not any(entry[1] is pending for entry in connection.run_on_commit):
+        # La actualización anterior ya se ejecutó o se descartó con un rollback
+        pending = _local.pending = _PendingRefresh()
+        transaction.on_commit(pending)
+    pending.invoice_ids.add(invoice_id)
+
+
+def _contributions(invoice_ids=None):
+    """Pares ``(factura, aportes)`` calculados con dos consultas."""
+    provenances = defaultdict(list)
+    for invoice_id, provenance, hours, revenue in _activities(invoice_ids).iterator():
+        provenances[invoice_id].append((provenance, hours, revenue))
+
+    invoices = Invoice.objects.all() if invoice_ids is None else Invoice.objects.filter(pk__in=invoice_ids)
+    for invoice in invoices.values_list(*INVOICE_FIELDS).iterator():
+        yield invoice[0], _rows(invoice, provenances.get(invoice[0], list()))
+
+
+def _add(totals, rows, sign=1):
+    for dimension, key, month, revenue, hours, invoices in rows:
+        summary = totals[(dimension, key, month)]
+        summary[0] += sign * Decimal(revenue)
+        summary[1] += sign * Decimal(hours)
+        summary[2] += sign * invoices
+
+
+def _refresh_chunk(invoice_ids):
+    previous = dict(ReportedInvoice.objects.select_for_update().filter(pk__in=invoice_ids)
+                    .values_list('pk', 'rows'))
+    current = dict(_contributions(invoice_ids))
+    changed = [invoice_id for invoice_id in invoice_ids
+               if current.get(invoice_id, list()) != previous.get(invoice_id, list())]
+
+    deltas = defaultdict(lambda: [Decimal('0'), Decimal('0'), 0])
+    for invoice_id in changed:
+        _add(deltas, previous.get(invoice_id, list()), -1)
+        _add(deltas, current.get(invoice_id, list()))
+    _apply([[dimension, key, month, revenue, hours, invoices]
+            for (dimension, key, month), (revenue, hours, invoices) in sorted(deltas.items())
+            if revenue or hours or invoices], 1)
+
+    ReportedInvoice.objects.filter(pk__in=changed).delete()
+    ReportedInvoice.objects.bulk_create([ReportedInvoice(invoice_id=invoice_id, rows=current[invoice_id])
+                                         for invoice_id in changed if current.get(invoice_id)], batch_size=500)
+
+
+def rebuild(invoice_ids=None):
+    """Recalcula las tablas de reportes desde las facturas; devuelve la cantidad de facturas.
+
+    Si se indican ids sólo se reemplazan los aportes de esas facturas, por lotes.
+    """
+    if invoice_ids is not None:
+        invoice_ids = sorted(invoice_ids)
+        with transaction.atomic():
+            for start in range(0, len(invoice_ids), CHUNK_SIZE):
+                _refresh_chunk(invoice_ids[start:start + CHUNK_SIZE])
+        return len(invoice_ids)
+
+    totals = defaultdict(lambda: [Decimal('0'), Decimal('0'), 0])
+    reported = list()
+
+    with transaction.atomic():
+        for invoice_id, rows in _contributions():
+            reported.append(ReportedInvoice(invoice_id=invoice_id, rows=rows))
+            _add(totals, rows)
+
+        ReportSummary.objects.all().delete()
+        ReportedInvoice.objects.all().delete()
+        ReportSummary.objects.bulk_create(
+            [ReportSummary(dimension=dimension, key=key, month=month, revenue=revenue, hours=hours, invoices=invoices)
+             for (dimension, key, month), (revenue, hours, invoices) in totals.items()], batch_size=500)
+        ReportedInvoice.objects.bulk_create(reported, batch_size=500)
+    return len(reported)
+
+
+def years():
+    return [month.year for month in ReportSummary.objects.filter(dimension=ReportSummary.MONTH)
+            .dates('month', 'year', order='DESC')]
+
+
+def dashboard(year):
+    """Datos del panel de reportes del año, leídos solo de las tablas de resumen."""
+    months = [{'month': date(year, month, 1), 'revenue': Decimal('0'), 'hours': Decimal('0'), 'invoices': 0}
+              for month in range(1, 13)]
+    for summary in ReportSummary.objects.filter(dimension=ReportSummary.MONTH, month__year=year):
+        months[summary.month.month - 1].update(revenue=summary.revenue, hours=summary.hours,
+                                               invoices=summary.invoices)
+
+    rows = defaultdict(list)
+    for row in (ReportSummary.objects
+                .filter(month__year=year, dimension__in=LABELS)
+                .values('dimension', 'key')
+                .annotate(total_revenue=Sum('revenue'), total_hours=Sum('hours'), total_invoices=Sum('invoices'))
+                .filter(total_invoices__gt=0)
+                .order_by('-total_revenue', '-total_hours')):
+        rows[row['dimension']].append(row)
+
+    for dimension, model in LABELS.items():
+        labels = model.objects.in_bulk([row['key'] for row in rows[dimension]])
+        for row in rows[dimension]:
+            row['label'] = str(labels.get(row['key'], '#{}'.format(row['key'])))
+
+    return {
+        'months': months,
+        'total': {
+            'revenue': sum((month['revenue'] for month in months), Decimal('0')),
+            'hours': sum((month['hours'] for month in months), Decimal('0')),
+            'invoices': sum(month['invoices'] for month in months),
+        },
+        'sections': [
+            ('Ingresos por cliente', 'Cliente', rows[ReportSummary.ENTERPRISE]),
+            ('Ingresos por método de pago', 'Método de pago', rows[ReportSummary.METHOD_PAYMENT]),
+            ('Ingresos y horas por mecánico', 'Mecánico', rows[ReportSummary.MECHANICAL]),
+            ('Horas trabajadas por procedencia', 'Procedencia', rows[ReportSummary.PROVENANCE]),
+        ],
+    }
@@ -0,0 +1,25 @@
+from django.db import DEFAULT_DB_ALIAS
+
+from . import replica
+
+
+class ReplicaRouter:
+    """Envía a la réplica las lecturas hechas dentro de ``replica.reading``; todo lo demás va a la base principal."""
+
+    def db_for_read(self, model, **hints):
+        return replica.current()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica es una copia de la base principal: sus objetos se pueden relacionar entre sí
+        databases = {DEFAULT_DB_ALIAS, replica.alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica.alias():
+            return False
+        return None
@@ -0,0 +1,266 @@
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection as default_connection, connections
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+# Marcas del fragmento resaltado; se convierten en <mark> después de escapar el texto
+MARK_START = ''
+MARK_END = ''
+
+ORDER_TABLE = 'taller_workshoporder_search'
+STATE_TABLE = 'taller_physicalstate_search'
+
+# Pesos de defectación, trabajo realizado, materiales, quejas y estados físicos en el orden de los resultados
+WEIGHTS = (3.0, 2.0, 1.0, 1.0, 2.0)
+
+_SQLITE_STATE_TEXT = ("(SELECT group_concat(description, ' ') FROM taller_physicalstate "
+                      "WHERE workshop_order_id = {})")
+_SQLITE_REFRESH_STATES = ('UPDATE taller_workshoporder_search SET physical_states = {} WHERE rowid = {{order}};'
+                          .format(_SQLITE_STATE_TEXT.format('{order}')))
+
+SQLITE_INSTALL = [
+    # Copia propia del texto de cada orden con el de sus estados físicos; rowid es el id de la orden
+    "CREATE VIRTUAL TABLE IF NOT EXISTS taller_workshoporder_search USING fts5("
+    "defection, work_done, description_raw_materials_parts, complaints_suggestions, physical_states, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    "INSERT INTO taller_workshoporder_search (taller_workshoporder_search, rank) "
+    "VALUES ('rank', 'bm25({})')".format(', '.join(map(str, WEIGHTS))),
+    # Los estados físicos se indexan sobre su propia tabla, sin copiar el texto
+    "CREATE VIRTUAL TABLE IF NOT EXISTS taller_physicalstate_search USING fts5("
+    "description, content = 'taller_physicalstate', content_rowid = 'id', "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+
+    "CREATE TRIGGER IF NOT EXISTS taller_workshoporder_search_insert AFTER INSERT ON taller_workshoporder BEGIN "
+    "INSERT INTO taller_workshoporder_search (rowid, defection, work_done, description_raw_materials_parts, "
+    "complaints_suggestions, physical_states) VALUES (new.id, new.defection, new.work_done, "
+    "new.description_raw_materials_parts, new.complaints_suggestions, {}); END".format(
+        _SQLITE_STATE_TEXT.format('new.id')),
+    "CREATE TRIGGER IF NOT EXISTS taller_workshoporder_search_update AFTER UPDATE ON taller_workshoporder "
+    "WHEN old.defection IS NOT new.defection OR old.work_done IS NOT new.work_done "
+    "OR old.description_raw_materials_parts IS NOT new.description_raw_materials_parts "
+    "OR old.complaints_suggestions IS NOT new.complaints_suggestions BEGIN "
+    "UPDATE taller_workshoporder_search SET defection = new.defection, work_done = new.work_done, "
+    "description_raw_materials_parts = new.description_raw_materials_parts, "
+    "complaints_suggestions = new.complaints_suggestions WHERE rowid = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS taller_workshoporder_search_delete AFTER DELETE ON taller_workshoporder BEGIN "
+    "DELETE FROM taller_workshoporder_search WHERE rowid = old.id; END",
+
+    "CREATE TRIGGER IF NOT EXISTS taller_physicalstate_search_insert AFTER INSERT ON taller_physicalstate BEGIN "
+    "INSERT INTO taller_physicalstate_search (rowid, description) VALUES (new.id, new.description); "
+    + _SQLITE_REFRESH_STATES.format(order='new.workshop_order_id') + " END",
+    "CREATE TRIGGER IF NOT EXISTS taller_physicalstate_search_update AFTER UPDATE ON taller_physicalstate "
+    "WHEN old.description IS NOT new.description OR old.workshop_order_id IS NOT new.workshop_order_id BEGIN "
+    "INSERT INTO taller_physicalstate_search (taller_physicalstate_search, rowid, description) "
+    "VALUES ('delete', old.id, old.description); "
+    "INSERT INTO taller_physicalstate_search (rowid, description) VALUES (new.id, new.description); "
+    + _SQLITE_REFRESH_STATES.format(order='old.workshop_order_id') + ' '
+    + _SQLITE_REFRESH_STATES.format(order='new.workshop_order_id') + " END",
+    "CREATE TRIGGER IF NOT EXISTS taller_physicalstate_search_delete AFTER DELETE ON taller_physicalstate BEGIN "
+    "INSERT INTO taller_physicalstate_search (taller_physicalstate_search, rowid, description) "
+    "VALUES ('delete', old.id, old.description); "
+    + _SQLITE_REFRESH_STATES.format(order='old.workshop_order_id') + " END",
+]
+
+SQLITE_REBUILD = [
+    'DELETE FROM taller_workshoporder_search',
+    "INSERT INTO taller_workshoporder_search (rowid, defection, work_done, description_raw_materials_parts, "
+    "complaints_suggestions, physical_states) SELECT o.id, o.defection, o.work_done, "
+    "o.description_raw_materials_parts, o.complaints_suggestions, {} FROM taller_workshoporder o".format(
+        _SQLITE_STATE_TEXT.format('o.id')),
+    "INSERT INTO taller_workshoporder_search (taller_workshoporder_search) VALUES ('optimize')",
+    "INSERT INTO taller_physicalstate_search (taller_physicalstate_search) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS taller_workshoporder_search_insert',
+    'DROP TRIGGER IF EXISTS taller_workshoporder_search_update',
+    'DROP TRIGGER IF EXISTS taller_workshoporder_search_delete',
+    'DROP TRIGGER IF EXISTS taller_physicalstate_search_insert',
+    'DROP TRIGGER IF EXISTS taller_physicalstate_search_update',
+    'DROP TRIGGER IF EXISTS taller_physicalstate_search_delete',
+    'DROP TABLE IF EXISTS taller_workshoporder_search',
+    'DROP TABLE IF EXISTS taller_physicalstate_search',
+]
+
+_POSTGRESQL_DOCUMENT = (
+    "setweight(to_tsvector('spanish', coalesce(o.defection, '')), 'A') || "
+    "setweight(to_tsvector('spanish', coalesce(o.work_done, '')), 'B') || "
+    "setweight(to_tsvector('spanish', coalesce((SELECT string_agg(description, ' ') FROM taller_physicalstate "
+    "WHERE workshop_order_id = o.id), '')), 'B') || "
+    "setweight(to_tsvector('spanish', coalesce(o.description_raw_materials_parts, '') || ' ' || "
+    "coalesce(o.complaints_suggestions, '')), 'C')")
+
+POSTGRESQL_INSTALL = [
+    'CREATE TABLE IF NOT EXISTS taller_workshoporder_search ('
+    'workshop_order_id integer PRIMARY KEY, document tsvector NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS taller_workshoporder_search_document ON taller_workshoporder_search '
+    'USING GIN (document)',
+    # Los estados físicos se buscan con un índice sobre la expresión, que se mantiene solo
+    "CREATE INDEX IF NOT EXISTS taller_physicalstate_search ON taller_physicalstate "
+    "USING GIN (to_tsvector('spanish', description))",
+
+    'CREATE OR REPLACE FUNCTION taller_workshoporder_search_refresh(order_id integer) RETURNS void AS $$ '
+    'INSERT INTO taller_workshoporder_search (workshop_order_id, document) '
+    'SELECT o.id, {} FROM taller_workshoporder o WHERE o.id = order_id '
+    'ON CONFLICT (workshop_order_id) DO UPDATE SET document = EXCLUDED.document '
+    '$$ LANGUAGE sql'.format(_POSTGRESQL_DOCUMENT),
+    'CREATE OR REPLACE FUNCTION taller_workshoporder_search_trigger() RETURNS trigger AS $$ BEGIN '
+    "IF TG_OP = 'DELETE' THEN "
+    'DELETE FROM taller_workshoporder_search WHERE workshop_order_id = OLD.id; '
+    'ELSE PERFORM taller_workshoporder_search_refresh(NEW.id); END IF; '
+    'RETURN NULL; END $$ LANGUAGE plpgsql',
+    'CREATE OR REPLACE FUNCTION taller_physicalstate_search_trigger() RETURNS trigger AS $$ BEGIN '
+    "IF TG_OP <> 'INSERT' THEN PERFORM taller_workshoporder_search_refresh(OLD.workshop_order_id); END IF; "
+    "IF TG_OP <> 'DELETE' THEN PERFORM taller_workshoporder_search_refresh(NEW.workshop_order_id); END IF; "
+    'RETURN NULL; END $$ LANGUAGE plpgsql',
+
+    'DROP TRIGGER IF EXISTS taller_workshoporder_search ON taller_workshoporder',
+    'CREATE TRIGGER taller_workshoporder_search AFTER INSERT OR DELETE OR UPDATE OF defection, work_done, '
+    'description_raw_materials_parts, complaints_suggestions ON taller_workshoporder '
+    'FOR EACH ROW EXECUTE PROCEDURE taller_workshoporder_search_trigger()',
+    'DROP TRIGGER IF EXISTS taller_physicalstate_search ON taller_physicalstate',
+    'CREATE TRIGGER taller_physicalstate_search AFTER INSERT OR DELETE OR UPDATE OF description, workshop_order_id '
+    'ON taller_physicalstate FOR EACH ROW EXECUTE PROCEDURE taller_physicalstate_search_trigger()',
+]
+
+POSTGRESQL_REBUILD = [
+    'TRUNCATE taller_workshoporder_search',
+    'INSERT INTO taller_workshoporder_search (workshop_order_id, document) '
+    'SELECT o.id, {} FROM taller_workshoporder o'.format(_POSTGRESQL_DOCUMENT),
+]
+
+POSTGRESQL_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS taller_workshoporder_search ON taller_workshoporder',
+    'DROP TRIGGER IF EXISTS taller_physicalstate_search ON taller_physicalstate',
+    'DROP FUNCTION IF EXISTS taller_workshoporder_search_trigger()',
+    'DROP FUNCTION IF EXISTS taller_physicalstate_search_trigger()',
+    'DROP FUNCTION IF EXISTS taller_workshoporder_search_refresh(integer)',
+    'DROP INDEX IF EXISTS taller_physicalstate_search',
+    'DROP TABLE IF EXISTS taller_workshoporder_search',
+]
+
+STATEMENTS = {
+    'sqlite': (SQLITE_INSTALL, SQLITE_REBUILD, SQLITE_UNINSTALL),
+    'postgresql': (POSTGRESQL_INSTALL, POSTGRESQL_REBUILD, POSTGRESQL_UNINSTALL),
+}
+
+TRIGGERS = {
+    'sqlite': ['{}_search_{}'.format(table, event) for table in ('taller_workshoporder', 'taller_physicalstate')
+               for event in ('insert', 'update', 'delete')],
+    'postgresql': [ORDER_TABLE, STATE_TABLE],
+}
+
+
+def supported(connection=default_connection):
+    return connection.vendor in STATEMENTS
+
+
+def _execute(connection, statements):
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def install(connection=default_connection):
+    """Crea los índices de texto y los disparadores que los mantienen; se puede repetir sin riesgo.
+
+    En SQLite, rehacer una tabla (lo que hace Django al alterar una columna) borra sus disparadores:
+    ``manage.py check --database default`` avisa de ello y ``manage.py rebuild_search_index`` los vuelve a crear.
+    """
+    if supported(connection):
+        _execute(connection, STATEMENTS[connection.vendor][0])
+
+
+def rebuild(connection=default_connection):
+    """Vuelve a indexar todas las órdenes y estados físicos."""
+    if supported(connection):
+        _execute(connection, STATEMENTS[connection.vendor][1])
+
+
+def uninstall(connection=default_connection):
+    if supported(connection):
+        _execute(connection, STATEMENTS[connection.vendor][2])
+
+
+def missing_triggers(connection=default_connection):
+    """Disparadores del índice que faltan; vacío si el índice todavía no se ha creado."""
+    if not supported(connection) or ORDER_TABLE not in connection.introspection.table_names():
+        return []
+    if connection.vendor == 'sqlite':
+        sql = "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+    else:
+        sql = 'SELECT tgname FROM pg_trigger WHERE NOT tgisinternal'
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        existing = {name for name, in cursor.fetchall()}
+    return [name for name in TRIGGERS[connection.vendor] if name not in existing]
+
+
+def terms(text):
+    """Palabras del texto buscado; cada una se busca como prefijo y deben aparecer todas."""
+    return re.findall(r'\w+', text or '')
+
+
+def _query(text, connection):
+    words = terms(text)
+    if not words:
+        return None
+    if connection.vendor == 'sqlite':
+        return ' '.join('"{}"*'.format(word) for word in words)
+    return ' & '.join('{}:*'.format(word) for word in words)
+
+
+def _matching(table, text, connection=default_connection):
+    query = _query(text, connection)
+    if query is None:
+        return None
+    if connection.vendor == 'sqlite':
+        return RawSQL('SELECT rowid FROM {0} WHERE {0} MATCH %s'.format(table), [query])
+    if table == ORDER_TABLE:
+        return RawSQL("SELECT workshop_order_id FROM taller_workshoporder_search "
+                      "WHERE document @@ to_tsquery('spanish', %s)", [query])
+    return RawSQL("SELECT id FROM taller_physicalstate "
+                  "WHERE to_tsvector('spanish', description) @@ to_tsquery('spanish', %s)", [query])
+
+
+def matching_orders(text):
+    """Subconsulta con los ids de las órdenes cuyo texto contiene el buscado, para ``pk__in``; None si no hay palabras."""
+    return _matching(ORDER_TABLE, text)
+
+
+def matching_physical_states(text):
+    return _matching(STATE_TABLE, text)
+
+
+def highlight(fragment):
+    """El fragmento escapado, con las palabras encontradas entre ``<mark>``."""
+    return mark_safe(escape(fragment or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def search_orders(text, limit=50, using=None):
+    """Órdenes que contienen el texto, de la más a la menos relevante, con el fragmento donde aparece.
+
+    Devuelve una lista de ``(id de la orden, fragmento resaltado)``.
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    query = _query(text, connection)
+    if query is None or not supported(connection):
+        return []
+
+    if connection.vendor == 'sqlite':
+        sql = ("SELECT rowid, snippet(taller_workshoporder_search, -1, %s, %s, '…', 16) "
+               "FROM taller_workshoporder_search WHERE taller_workshoporder_search MATCH %s "
+               "ORDER BY rank LIMIT %s")
+        params = [MARK_START, MARK_END, query, limit]
+    else:
+        sql = ("SELECT o.id, ts_headline('spanish', concat_ws(' … ', o.defection, o.work_done, "
+               "o.description_raw_materials_parts, o.complaints_suggestions), q, %s) "
+               "FROM taller_workshoporder_search s JOIN taller_workshoporder o ON o.id = s.workshop_order_id, "
+               "to_tsquery('spanish', %s) q WHERE s.document @@ q "
+               "ORDER BY ts_rank(s.document, q) DESC LIMIT %s")
+        params = ['StartSel={}, StopSel={}, MaxWords=20, MinWords=8'.format(MARK_START, MARK_END), query, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(order_id, highlight(fragment)) for order_id, fragment in cursor.fetchall()]
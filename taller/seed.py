@@ -0,0 +1,148 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import importer
+from .models import *
+
+MARKS = (('Lada', '2107'), ('Lada', '2105'), ('Moskvich', '412'), ('Hyundai', 'Accent'), ('Kia', 'Rio'),
+         ('Geely', 'CK'), ('Toyota', 'Hilux'), ('Peugeot', '206'))
+NAMES = ('Juan', 'Pedro', 'María', 'Ana', 'Luis', 'Carlos', 'Yanet', 'Osmany', 'Yudith', 'Raúl')
+LAST_NAMES = ('Pérez', 'Gómez', 'Rodríguez', 'Fernández', 'González', 'Hernández', 'Díaz', 'Castillo')
+PIECES = ('Motor', 'Caja de velocidades', 'Frenos', 'Suspensión', 'Carrocería', 'Luces', 'Neumáticos',
+          'Sistema eléctrico', 'Radiador', 'Embrague')
+DEFECTIONS = ('Ruido en el motor', 'Pérdida de aceite', 'Frenos desgastados', 'No arranca', 'Vibración al frenar',
+              'Sobrecalentamiento', 'Falla eléctrica')
+PAYMENTS = ('Efectivo', 'Transferencia', 'Cheque')
+GUARANTEES = ('30 días', '90 días', '6 meses')
+UNITS = ('U', 'h', 'L', 'kg')
+PROVENANCES = ('Taller', 'Almacén', 'Cliente', 'Proveedor')
+
+BATCH_SIZE = 1000
+
+
+def _next_pk(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def _lookups(model, field, values):
+    existing = set(model.objects.filter(**{'{}__in'.format(field): values}).values_list(field, flat=True))
+    model.objects.bulk_create([model(**{field: value}) for value in values if value not in existing])
+    return list(model.objects.filter(**{'{}__in'.format(field): values}).values_list('pk', flat=True))
+
+
+def _money(rand, low, high):
+    return Decimal(rand.randint(low * 100, high * 100)) / 100
+
+
+def seed(enterprises=10, vehicles=50, mechanicals=10, orders=200, physical_states=3, activities=5,
+         random_seed=0):
+    """Genera un conjunto de datos de prueba y devuelve la cantidad de filas creadas por modelo.
+
+    Los ids se asignan aquí para poder relacionar los lotes de ``bulk_create`` sin leerlos de vuelta;
+    al terminar se recalculan los totales y los reportes, que ``bulk_create`` no mantiene.
+    """
+    rand = random.Random(random_seed)
+    now = timezone.now()
+    created = dict()
+
+    def insert(model, objects):
+        model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+        created[model._meta.model_name] = created.get(model._meta.model_name, 0) + len(objects)
+
+    with transaction.atomic():
+        pieces = _lookups(Piece, 'name', PIECES)
+        payments = _lookups(MethodPayment, 'type', PAYMENTS)
+        guarantees = _lookups(ServiceGuarantee, 'description', GUARANTEES)
+        units = _lookups(UnitMeasurement, 'name', UNITS)
+        provenances = list(Provenance.objects.values_list('pk', flat=True)) or \
+            [Provenance.objects.create(provenance=name).pk for name in PROVENANCES]
+        types = list(Type.objects.values_list('pk', flat=True)) or \
+            [Type.objects.create(type='Servicio', title='Factura de servicio').pk]
+
+        first = _next_pk(Enterprise)
+        enterprise_ids = list(range(first, first + enterprises))
+        insert(Enterprise, [Enterprise(pk=pk, name='Empresa {}'.format(pk), phone=rand.randint(7000000, 7999999),
+                                       address='Calle {} # {}'.format(rand.randint(1, 300), rand.randint(1, 999)),
+                                       comments='') for pk in enterprise_ids])
+
+        first = _next_pk(Contact)
+        contact_ids = list(range(first, first + enterprises))
+        insert(Contact, [Contact(pk=pk, name='Contacto {}'.format(pk), address='Calle {}'.format(pk),
+                                 email='contacto{}@example.com'.format(pk), phone=rand.randint(50000000, 59999999),
+                                 tcp='', nit=rand.randint(10000000, 99999999),
+                                 no_check_cup=rand.randint(100000, 999999)) for pk in contact_ids])
+
+        first = _next_pk(Vehicle)
+        vehicle_rows = [(pk, rand.choice(enterprise_ids)) for pk in range(first, first + vehicles)]
+        insert(Vehicle, [Vehicle(pk=pk, enterprise_id=enterprise_id, tag='P{:06d}'.format(pk % 1000000),
+                                 **dict(zip(('mark', 'model'), rand.choice(MARKS))))
+                         for pk, enterprise_id in vehicle_rows])
+
+        first = _next_pk(Mechanical)
+        mechanical_ids = list(range(first, first + max(mechanicals, 2)))
+        insert(Mechanical, [Mechanical(pk=pk, name=rand.choice(NAMES), last_name=rand.choice(LAST_NAMES), ci=pk,
+                                       address='Calle {}'.format(pk)) for pk in mechanical_ids])
+
+        def insert_orders(order_objects, state_objects, invoice_objects, activity_objects):
+            # bulk_create fija la fecha actual en los campos auto_now; las fechas generadas se escriben después
+            entry_dates = [order.entry_date for order in order_objects]
+            invoice_dates = [invoice.date for invoice in invoice_objects]
+            insert(WorkshopOrder, order_objects)
+            insert(PhysicalState, state_objects)
+            insert(Invoice, invoice_objects)
+            insert(Activity, activity_objects)
+            for order, entry_date in zip(order_objects, entry_dates):
+                order.entry_date = entry_date
+            for invoice, invoice_date in zip(invoice_objects, invoice_dates):
+                invoice.date = invoice_date
+            WorkshopOrder.objects.bulk_update(order_objects, ['entry_date'], batch_size=BATCH_SIZE)
+            Invoice.objects.bulk_update(invoice_objects, ['date'], batch_size=BATCH_SIZE)
+
+        first = _next_pk(WorkshopOrder)
+        code = (Activity.objects.aggregate(last=Max('code'))['last'] or 0) + 1
+        batch = (list(), list(), list(), list())
+        for pk in range(first, first + orders):
+            order_objects, state_objects, invoice_objects, activity_objects = batch
+            vehicle_id, enterprise_id = rand.choice(vehicle_rows)
+            mechanical, assistant = rand.sample(mechanical_ids, 2)
+            entry_date = now - timedelta(days=rand.randint(0, 730), seconds=rand.randint(0, 86400))
+            order_objects.append(WorkshopOrder(
+                pk=pk, vehicle_id=vehicle_id, enterprise_id=enterprise_id, mechanical_id=mechanical,
+                assistant_id=assistant, estimation=_money(rand, 50, 2000), estimated_time=rand.randint(1, 40),
+                mileage=rand.randint(1000, 400000), defection=rand.choice(DEFECTIONS), work_done='Reparación',
+                delivery_date=(entry_date + timedelta(days=rand.randint(1, 30))).date(), complaints_suggestions='',
+                method_payment_id=rand.choice(payments), workforce_cost=_money(rand, 10, 500),
+                description_raw_materials_parts='Piezas varias', amount=_money(rand, 0, 1500),
+                service_guarantee_id=rand.choice(guarantees), entry_date=entry_date))
+            for _ in range(physical_states):
+                state_objects.append(PhysicalState(workshop_order_id=pk, piece_id=rand.choice(pieces),
+                                                   description=rand.choice(('Bien', 'Regular', 'Mal'))))
+            invoice_objects.append(Invoice(
+                workshop_order_id=pk, type_id=rand.choice(types), contact_id=rand.choice(contact_ids),
+                services_provided=_money(rand, 0, 300), expendable_material=_money(rand, 0, 100),
+                workforce=_money(rand, 10, 500), date=min(now, entry_date + timedelta(days=rand.randint(0, 15)))))
+            for _ in range(activities):
+                activity_objects.append(Activity(
+                    invoice_id=pk, code=code, description='Actividad {}'.format(code),
+                    unit_measurement_id=rand.choice(units), hours_worked=_money(rand, 0, 8),
+                    provenance_id=rand.choice(provenances), price=_money(rand, 1, 200), amount=rand.randint(1, 5)))
+                code += 1
+            if len(order_objects) >= BATCH_SIZE:
+                insert_orders(*batch)
+                batch = (list(), list(), list(), list())
+        insert_orders(*batch)
+
+        # Con ids explícitos las secuencias de PostgreSQL no avanzan solas
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Enterprise, Contact, Vehicle, Mechanical,
+                                                                      WorkshopOrder]):
+                cursor.execute(sql)
+
+    importer.finish()
+    return created
@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import pdf_cache, reference, replica, reports
+from .documents import WORKSHOP_ORDER, INVOICE
+from .models import *
+
+LOOKUP_MODELS = (Contact, Type, UnitMeasurement, Enterprise, Mechanical, Piece, MethodPayment, ServiceGuarantee,
+                 Vehicle, Provenance)
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or connection.alias == replica.alias():
+        # La copia de la réplica se abre solo para lectura
+        return
+    # Directamente sobre la conexión de sqlite3, fuera del registro de consultas
+    for name, value in getattr(settings, 'TALLER_SQLITE_PRAGMAS', dict()).items():
+        connection.connection.execute('PRAGMA {} = {}'.format(name, value))
+    # A diferencia de los anteriores, el modo del diario se guarda en el archivo
+    journal_mode = getattr(settings, 'TALLER_SQLITE_JOURNAL_MODE', None)
+    if journal_mode:
+        connection.connection.execute('PRAGMA journal_mode = {}'.format(journal_mode))
+
+    if getattr(settings, 'TALLER_SQLITE_IMMEDIATE_TRANSACTIONS', True):
+        # Una transacción que lee antes de escribir no espera el bloqueo (busy_timeout): SQLite la hace
+        # fallar con "database is locked". Tomándolo al empezar, espera su turno.
+        connection._start_transaction_under_autocommit = lambda: connection.cursor().execute('BEGIN IMMEDIATE')
+
+
+@receiver(request_started)
+def close_unusable_connections(**kwargs):
+    # Django 3.1 no comprueba las conexiones persistentes (CONN_MAX_AGE) antes de reutilizarlas; una
+    # que el servidor cerró fallaría en la primera consulta de la petición
+    if not getattr(settings, 'TALLER_DB_HEALTH_CHECKS', True):
+        return
+    for connection in connections.all():
+        if connection.connection is not None and connection.settings_dict['CONN_MAX_AGE'] \
+                and not connection.is_usable():
+            connection.close()
+
+
+def invalidate_pdf(kind, object_id):
+    transaction.on_commit(lambda: pdf_cache.invalidate(kind, object_id))
+
+
+@receiver([post_save, post_delete], sender=WorkshopOrder)
+def invalidate_workshop_order_pdf(sender, instance, **kwargs):
+    # La factura comparte la clave primaria con su orden e imprime datos de ella
+    invalidate_pdf(WORKSHOP_ORDER, instance.pk)
+    invalidate_pdf(INVOICE, instance.pk)
+
+
+@receiver([post_save, post_delete], sender=PhysicalState)
+def invalidate_physical_state_pdf(sender, instance, **kwargs):
+    invalidate_pdf(WORKSHOP_ORDER, instance.workshop_order_id)
+
+
+@receiver([post_save, post_delete], sender=Invoice)
+def invalidate_invoice_pdf(sender, instance, **kwargs):
+    invalidate_pdf(INVOICE, instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Activity)
+def invalidate_activity_pdf(sender, instance, **kwargs):
+    invalidate_pdf(INVOICE, instance.invoice_id)
+
+
+@receiver(post_delete, sender=Activity)
+def subtract_activity_from_invoice(sender, instance, **kwargs):
+    # Se ejecuta dentro de la transacción del borrado, también en borrados masivos y en cascada
+    Invoice.add_activity_amount(instance.invoice_id, -instance.price * instance.amount, -1)
+
+
+@receiver([post_save, post_delete], sender=WorkshopOrder)
+@receiver([post_save, post_delete], sender=Invoice)
+def refresh_invoice_reports(sender, instance, **kwargs):
+    # La factura comparte la clave primaria con su orden
+    reports.schedule_refresh(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Activity)
+def refresh_activity_reports(sender, instance, **kwargs):
+    reports.schedule_refresh(instance.invoice_id)
+
+
+def clear_pdf_cache(sender, **kwargs):
+    transaction.on_commit(pdf_cache.clear)
+
+
+def invalidate_reference_table(sender, **kwargs):
+    reference.invalidate(sender)
+
+
+for model in LOOKUP_MODELS:
+    post_save.connect(clear_pdf_cache, sender=model, dispatch_uid='clear_pdf_cache_{}'.format(model.__name__))
+    post_delete.connect(clear_pdf_cache, sender=model, dispatch_uid='clear_pdf_cache_{}'.format(model.__name__))
+
+for model in reference.NATURAL_KEYS:
+    post_save.connect(invalidate_reference_table, sender=model,
+                      dispatch_uid='invalidate_reference_table_{}'.format(model.__name__))
+    post_delete.connect(invalidate_reference_table, sender=model,
+                        dispatch_uid='invalidate_reference_table_{}'.format(model.__name__))
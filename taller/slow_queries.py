@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_handler_lock = threading.Lock()
+_handler = None
+
+# Frames que no explican de dónde viene la consulta
+_IGNORED_FILES = (os.sep + 'django' + os.sep, os.sep + 'site-packages' + os.sep, __file__,
+                  os.path.join('taller', 'middleware.py'))
+
+
+def threshold():
+    """Segundos a partir de los cuales se registra una consulta; ``None`` desactiva el registro."""
+    return getattr(settings, 'TALLER_SLOW_QUERY_SECONDS', 0.2)
+
+
+def fingerprint(sql):
+    """La consulta sin sus valores, para agrupar las que solo difieren en los parámetros."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b|%s', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def _caller():
+    for frame in reversed(traceback.extract_stack()):
+        if str(settings.BASE_DIR) in frame.filename and not any(part in frame.filename for part in _IGNORED_FILES):
+            return '{}:{} en {}'.format(os.path.relpath(frame.filename, settings.BASE_DIR), frame.lineno, frame.name)
+    return ''
+
+
+def explain(sql, params):
+    """Plan de la consulta según la base de datos, o ``None`` si no es una lectura."""
+    if not re.match(r'\s*(SELECT|WITH)\b', sql, re.IGNORECASE):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    _local.explaining = True
+    try:
+        # En PostgreSQL un error anula la transacción; el punto de guardado lo aísla
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            # SQLite devuelve (id, padre, sin uso, detalle); PostgreSQL, una columna por línea
+            return [row[-1] for row in cursor.fetchall()]
+    except DatabaseError as e:
+        return ['No se pudo obtener el plan: {}'.format(e)]
+    finally:
+        _local.explaining = False
+
+
+def _log_handler():
+    global _handler
+    path = getattr(settings, 'TALLER_SLOW_QUERY_LOG', None)
+    with _handler_lock:
+        if _handler is not None and (path is None or _handler.baseFilename != os.path.abspath(path)):
+            logger.removeHandler(_handler)
+            _handler.close()
+            _handler = None
+        if _handler is None and path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            _handler = RotatingFileHandler(
+                path, maxBytes=getattr(settings, 'TALLER_SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024),
+                backupCount=getattr(settings, 'TALLER_SLOW_QUERY_LOG_BACKUPS', 5), encoding='utf-8')
+            logger.addHandler(_handler)
+    return _handler
+
+
+class SlowQueryLogger:
+    """Envoltorio de ``connection.execute_wrapper`` que registra las consultas lentas.
+
+    Cada registro es una línea JSON con la consulta, su huella, la duración, el plan de ejecución, la
+    vista que la originó y la línea del proyecto desde donde se hizo.
+    """
+
+    def __init__(self, source=None):
+        self.source = source
+
+    def __call__(self, execute, sql, params, many, context):
+        limit = threshold()
+        if limit is None or getattr(_local, 'explaining', False):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - start
+        if duration >= limit:
+            self.log(sql, params, many, duration)
+        return result
+
+    def log(self, sql, params, many, duration):
+        source = self.source() if callable(self.source) else self.source
+        record = {
+            'time': timezone.now().isoformat(),
+            'duration': round(duration, 6),
+            'fingerprint': fingerprint(sql),
+            'sql': sql,
+            'params': None if many else [str(param) for param in params or ()],
+            'view': source or '',
+            'caller': _caller(),
+            'plan': None if many else explain(sql, params),
+        }
+        _log_handler()
+        logger.warning(json.dumps(record, ensure_ascii=False))
+
+
+def read(path=None):
+    """Registros del archivo y de sus copias rotadas, del más antiguo al más reciente."""
+    path = Path(path or settings.TALLER_SLOW_QUERY_LOG)
+    backups = sorted(path.parent.glob(path.name + '.*'), key=lambda backup: -int(backup.suffix[1:])
+                     if backup.suffix[1:].isdigit() else 0)
+    for log_path in backups + [path]:
+        if not log_path.exists():
+            continue
+        with open(log_path, encoding='utf-8') as log:
+            for line in log:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def aggregate(records):
+    """Agrupa los registros por huella, de mayor a menor tiempo total."""
+    groups = dict()
+    for record in records:
+        group = groups.setdefault(record['fingerprint'], {
+            'fingerprint': record['fingerprint'], 'count': 0, 'total': 0.0, 'max': 0.0,
+            'views': set(), 'callers': set(), 'slowest': record,
+        })
+        group['count'] += 1
+        group['total'] += record['duration']
+        group['views'].add(record['view'])
+        group['callers'].add(record['caller'])
+        if record['duration'] >= group['max']:
+            group['max'] = record['duration']
+            group['slowest'] = record
+    result = sorted(groups.values(), key=lambda group: group['total'], reverse=True)
+    for group in result:
+        group['mean'] = group['total'] / group['count']
+        group['views'] = sorted(filter(None, group['views']))
+        group['callers'] = sorted(filter(None, group['callers']))
+    return result
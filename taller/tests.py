@@ -1,3 +1,1387 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from collections import Counter
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.core.paginator import EmptyPage
+from django.db import connection, connections, router, transaction
+from django.db.models import F, Sum
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+from reportlab.platypus import SimpleDocTemplate, Paragraph, PageBreak
+
+from . import batch, benchmark, checks, documents, extracts, importer, jobs, loaders, metrics, pdf_cache, pdf_pages, \
+    pdf_registry, reference, replica, reports, search, seed, signals, slow_queries, totals
+from .models import *
+from .pagination import LargeTablePaginator
+
+
+def create_invoice(activity_count=3, physical_state_count=3):
+    enterprise = Enterprise.objects.create(name='Empresa', phone=5555, address='Calle 1', comments='')
+    vehicle = Vehicle.objects.create(mark='Lada', model='2107', tag='P123456', enterprise=enterprise)
+    mechanical = Mechanical.objects.create(name='Juan', last_name='Pérez', ci=1, address='Calle 2')
+    assistant = Mechanical.objects.create(name='Pedro', last_name='Gómez', ci=2, address='Calle 3')
+    workshop_order = WorkshopOrder.objects.create(
+        vehicle=vehicle, mechanical=mechanical, assistant=assistant, enterprise=enterprise,
+        estimation=Decimal('100.00'), estimated_time=4, mileage=1000, defection='Ruido en el motor',
+        work_done='Cambio de correa', delivery_date='2021-05-01', complaints_suggestions='',
+        method_payment=MethodPayment.objects.get_or_create(type='Efectivo')[0],
+        workforce_cost=Decimal('30.00'), description_raw_materials_parts='Correa', amount=Decimal('15.00'),
+        service_guarantee=ServiceGuarantee.objects.get_or_create(description='30 días')[0])
+    piece = Piece.objects.get_or_create(name='Motor')[0]
+    for pos in range(physical_state_count):
+        PhysicalState.objects.create(workshop_order=workshop_order, piece=piece, description='Bien {}'.format(pos))
+
+    invoice = Invoice.objects.create(
+        type=Type.objects.create(type='Servicio', title='Factura de servicio'),
+        contact=Contact.objects.create(name='Contacto', address='Calle 4', email='contacto@example.com',
+                                       phone=5556, tcp='TCP', nit=123, no_check_cup=456),
+        workshop_order=workshop_order, services_provided=Decimal('10.00'), expendable_material=Decimal('5.00'),
+        workforce=Decimal('20.00'))
+    unit_measurement = UnitMeasurement.objects.get_or_create(name='U')[0]
+    provenance = Provenance.objects.create(provenance='Taller')
+    code = Activity.objects.count()
+    for pos in range(activity_count):
+        Activity.objects.create(invoice=invoice, code=code + pos, description='Actividad {}'.format(pos),
+                                unit_measurement=unit_measurement, hours_worked=Decimal('1.50'),
+                                provenance=provenance, price=Decimal('2.00'), amount=3)
+    return invoice
+
+
+def duplicated_queries(queries):
+    """Consultas que se repiten con distintos parámetros, con la cantidad de veces; típico de un N+1."""
+    fingerprints = Counter(slow_queries.fingerprint(query['sql']) for query in queries)
+    return '\n'.join('{} x {}'.format(count, sql) for sql, count in fingerprints.most_common() if count > 1)
+
+
+def deep_size(obj, exclude=(), seen=None):
+    """Bytes que ocupa el objeto junto con todo lo que referencia, sin contar los objetos de ``exclude``."""
+    seen = {id(excluded) for excluded in exclude} if seen is None else seen
+    if id(obj) in seen or isinstance(obj, type):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen=seen) + deep_size(value, seen=seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen=seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += deep_size(vars(obj), seen=seen)
+    return size
+
+
+class PageDecoratedCanvasTests(SimpleTestCase):
+    def build(self, page_count):
+        retained = dict()
+
+        class MeasuredCanvas(pdf_pages.PageDecoratedCanvas):
+            def save(self):
+                # El documento PDF guarda por diseño cada página terminada hasta escribirla; lo que el
+                # canvas retenga además, venga de donde venga, crece con la cantidad de páginas
+                retained['size'] = deep_size(self, exclude=[self._doc])
+                super().save()
+
+        styles = pdf_registry.get_invoice_styles()
+        story = list()
+        for pos in range(page_count):
+            story += [Paragraph('Página de prueba {}'.format(pos), styles['Invoice_Normal']), PageBreak()]
+
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(buffer, pageCompression=0)
+        doc.build(story, onFirstPage=pdf_pages.decorate_numbered_page,
+                  onLaterPages=pdf_pages.decorate_numbered_page, canvasmaker=MeasuredCanvas)
+        return retained['size'], buffer.getvalue()
+
+    def test_memory_does_not_grow_with_page_count(self):
+        small, _ = self.build(40)
+        large, _ = self.build(400)
+
+        self.assertLess(large, small * 1.1)
+
+    def test_artwork_and_page_count_are_stored_once(self):
+        _, pdf = self.build(30)
+
+        self.assertEqual(pdf.count(b'/Subtype /Form'), 2)
+        self.assertTrue(b'(P\\341gina 30 de ) Tj' in pdf)
+        self.assertEqual(pdf.count(b'(30) Tj'), 1)
+
+
+class LargeInvoiceTests(SimpleTestCase):
+    def render(self, activity_count):
+        invoice = Invoice(services_provided=Decimal('10.00'), expendable_material=Decimal('5.00'),
+                          workforce=Decimal('20.00'), total=Decimal('35.00') + 6 * activity_count)
+        unit_measurement = UnitMeasurement(name='U')
+        provenance = Provenance(provenance='Taller')
+        activities = [Activity(code=code, description='Actividad {}'.format(code), unit_measurement=unit_measurement,
+                               hours_worked=Decimal('1.50'), provenance=provenance, price=Decimal('2.00'), amount=3)
+                      for code in range(activity_count)]
+
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(buffer, pageCompression=0)
+        start = time.perf_counter()
+        doc.build(documents.large_invoice_activities(invoice, activities, pdf_registry.get_invoice_styles(), doc.width),
+                  onFirstPage=pdf_pages.decorate_numbered_page, onLaterPages=pdf_pages.decorate_numbered_page,
+                  canvasmaker=pdf_pages.PageDecoratedCanvas)
+        return time.perf_counter() - start, buffer.getvalue()
+
+    def test_header_repeats_and_totals_follow(self):
+        _, pdf = self.render(300)
+
+        pages = pdf.count(b'/Type /Page\n')
+        self.assertGreater(pages, 1)
+        self.assertGreaterEqual(pdf.count(b'(Importe) Tj'), pages)
+        self.assertTrue(b'(1,835.00) Tj' in pdf)
+
+    def test_header_is_not_repeated_mid_page(self):
+        # Los saltos de página caen entre tablas (de una fila) o dentro de ellas (de 7 o 500 filas)
+        for chunk_rows in (1, 7, 500):
+            with self.subTest(chunk_rows=chunk_rows), mock.patch.object(documents, 'LARGE_INVOICE_CHUNK_ROWS',
+                                                                         chunk_rows):
+                _, pdf = self.render(120)
+                pages = pdf.count(b'/Type /Page\n')
+                self.assertGreater(pages, 1)
+                self.assertEqual(pdf.count(b'(Importe) Tj'), pages)
+                self.assertEqual(pdf.count(b'(Actividad 119) Tj'), 1)
+
+    def test_render_time_is_roughly_linear(self):
+        small, _ = self.render(250)
+        large, _ = self.render(2000)
+
+        self.assertLess(large / 2000, 2 * small / 250)
+
+
+class DocumentLoaderTests(TestCase):
+    def test_workshop_order_is_loaded_in_two_queries(self):
+        for physical_state_count in (1, 20):
+            invoice = create_invoice(physical_state_count=physical_state_count)
+            reference.warm_up()
+
+            with self.assertNumQueries(2):
+                workshop_order = loaders.load_workshop_order(invoice.pk)
+                self.assertEqual(len(workshop_order.physicalstate_set.all()), physical_state_count)
+                for physical_state in workshop_order.physicalstate_set.all():
+                    physical_state.piece.name
+                workshop_order.enterprise.name, workshop_order.vehicle.tag, workshop_order.mechanical.last_name
+                workshop_order.assistant.last_name, workshop_order.method_payment.type
+                workshop_order.service_guarantee.description
+
+    def test_invoice_is_loaded_in_two_queries(self):
+        for activity_count in (1, 20):
+            invoice = create_invoice(activity_count=activity_count)
+            reference.warm_up()
+
+            with self.assertNumQueries(2):
+                invoice = loaders.load_invoice(invoice.pk)
+                self.assertEqual(len(invoice.activity_set.all()), activity_count)
+                for activity in invoice.activity_set.all():
+                    activity.unit_measurement.name, activity.provenance.provenance
+                invoice.type.title, invoice.contact.no_check_cup, invoice.workshop_order.enterprise.address
+                invoice.workshop_order.vehicle.tag
+
+    @override_settings(TALLER_PDF_CACHE_DIR=None)
+    def test_exports_stay_within_query_budget(self):
+        invoice = create_invoice(activity_count=30, physical_state_count=3)
+        reference.warm_up()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+
+        # La sesión y el usuario, más tres consultas para el documento
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('admin:taller_order_workshop_export_pdf', args=[invoice.pk]))
+            self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('admin:taller_invoice_export_pdf', args=[invoice.pk]))
+            self.assertEqual(response.status_code, 200)
+
+    def test_missing_document_is_not_found(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        response = self.client.get(reverse('admin:taller_invoice_export_pdf', args=[404]))
+        self.assertEqual(response.status_code, 404)
+
+
+class InvoiceLayoutTests(TestCase):
+    @override_settings(TALLER_PDF_CACHE_DIR=None)
+    def test_page_break_anywhere_near_the_totals(self):
+        # Con cada actividad más el salto de página cae una fila antes, hasta caer justo antes de los totales
+        invoice = create_invoice(activity_count=1)
+        unit_measurement, provenance = UnitMeasurement.objects.get(), Provenance.objects.get()
+        pages = set()
+        for code in range(1, 40):
+            Activity.objects.create(invoice=invoice, code=code, description='Actividad {}'.format(code),
+                                    unit_measurement=unit_measurement, hours_worked=Decimal('1.50'),
+                                    provenance=provenance, price=Decimal('2.00'), amount=3)
+            stream = io.BytesIO()
+            documents.render_invoice(loaders.load_invoice(invoice.pk), stream)
+            pages.add(stream.getvalue().count(b'/Type /Page\n'))
+        self.assertEqual(len(pages), 2)
+
+
+class TotalsTests(TestCase):
+    def test_activity_changes_update_invoice_totals(self):
+        invoice = create_invoice()
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.activities_total, invoice.line_count, invoice.total),
+                         (Decimal('18.00'), 3, Decimal('53.00')))
+
+        activity = invoice.activity_set.first()
+        activity.amount = 5
+        activity.save()
+        invoice.activity_set.last().delete()
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.activities_total, invoice.line_count, invoice.total),
+                         (Decimal('16.00'), 2, Decimal('51.00')))
+
+        invoice.activity_set.all().delete()
+        invoice.workforce = Decimal('25.00')
+        invoice.save()
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.activities_total, invoice.line_count, invoice.total),
+                         (Decimal('0.00'), 0, Decimal('40.00')))
+
+    def test_stale_instance_does_not_overwrite_activity_totals(self):
+        invoice = create_invoice(activity_count=0)
+        Activity.objects.create(invoice=invoice, code=99, description='Actividad',
+                                unit_measurement=UnitMeasurement.objects.create(name='h'), hours_worked=1,
+                                provenance=Provenance.objects.create(provenance='Taller'), price=4, amount=2)
+        invoice.save()
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.line_count, invoice.total), (1, Decimal('43.00')))
+
+    def test_workshop_order_total(self):
+        workshop_order = create_invoice().workshop_order
+        workshop_order.refresh_from_db()
+        self.assertEqual(workshop_order.total, Decimal('45.00'))
+
+    def test_command_rebuilds_and_verifies_totals(self):
+        invoice = create_invoice()
+        Invoice.objects.filter(pk=invoice.pk).update(total=0, line_count=7)
+        WorkshopOrder.objects.filter(pk=invoice.pk).update(total=0)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_totals', verify=True, stdout=io.StringIO(), stderr=io.StringIO())
+        call_command('rebuild_totals', stdout=io.StringIO())
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.line_count, invoice.total), (3, Decimal('53.00')))
+        self.assertEqual(totals.verify(), [])
+
+    def test_admin_sorts_and_filters_by_total(self):
+        create_invoice()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        response = self.client.get(reverse('admin:taller_invoice_changelist'), {'o': '-6', 'total_range': '0-1000'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get(reverse('admin:taller_invoice_changelist'), {'total_range': '20000-'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+
+class ReportTests(TransactionTestCase):
+    def summaries(self):
+        return sorted(ReportSummary.objects.filter(invoices__gt=0)
+                      .values_list('dimension', 'key', 'month', 'revenue', 'hours', 'invoices'))
+
+    def test_summaries_follow_invoice_changes(self):
+        invoice = create_invoice()
+        month = timezone.localdate().replace(day=1)
+        monthly = ReportSummary.objects.get(dimension=ReportSummary.MONTH, month=month)
+        self.assertEqual((monthly.revenue, monthly.hours, monthly.invoices), (Decimal('53.00'), Decimal('4.50'), 1))
+        mechanical = ReportSummary.objects.get(dimension=ReportSummary.MECHANICAL,
+                                               key=invoice.workshop_order.mechanical_id)
+        self.assertEqual(mechanical.revenue, Decimal('53.00'))
+
+        with transaction.atomic():
+            invoice.activity_set.first().delete()
+            invoice.workforce = Decimal('30.00')
+            invoice.save()
+        monthly.refresh_from_db()
+        self.assertEqual((monthly.revenue, monthly.hours, monthly.invoices), (Decimal('57.00'), Decimal('3.00'), 1))
+
+        invoice.delete()
+        self.assertEqual(self.summaries(), [])
+        self.assertFalse(ReportedInvoice.objects.exists())
+
+    def test_incremental_summaries_match_rebuild(self):
+        first = create_invoice()
+        create_invoice(activity_count=5)
+        first.activity_set.last().delete()
+        incremental = self.summaries()
+
+        call_command('rebuild_reports', stdout=io.StringIO())
+        self.assertEqual(self.summaries(), incremental)
+
+    def test_dashboard_reads_only_summaries(self):
+        create_invoice()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:taller_reportsummary_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Empresa')
+        self.assertFalse([query for query in queries if 'taller_invoice' in query['sql']
+                          or 'taller_activity' in query['sql']])
+
+
+class PdfCacheTests(TransactionTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(TALLER_PDF_CACHE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.invoice = create_invoice()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+
+    def export_invoice(self):
+        response = self.client.get(reverse('admin:taller_invoice_export_pdf', args=[self.invoice.pk]))
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_repeated_download_is_served_from_cache(self):
+        hits, misses = pdf_cache.hits, pdf_cache.misses
+
+        pdf = self.export_invoice()
+        # La sesión, el usuario y la versión del documento
+        with self.assertNumQueries(3):
+            self.assertEqual(self.export_invoice(), pdf)
+
+        self.assertEqual((pdf_cache.hits - hits, pdf_cache.misses - misses), (1, 1))
+        self.assertEqual(pdf_cache.stats()['entries'], 1)
+
+    def test_activity_change_invalidates_invoice(self):
+        self.export_invoice()
+        activity = self.invoice.activity_set.first()
+        activity.description = 'Descripción corregida'
+        activity.save()
+
+        self.assertEqual(pdf_cache.stats()['entries'], 0)
+        self.export_invoice()
+        self.assertEqual(pdf_cache.stats()['entries'], 1)
+
+    def test_lookup_change_clears_cache(self):
+        self.export_invoice()
+        Provenance.objects.create(provenance='Importado')
+
+        self.assertEqual(pdf_cache.stats()['entries'], 0)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        with override_settings(TALLER_PDF_CACHE_MAX_BYTES=25):
+            pdf_cache.put('invoice', 1, 'a', io.BytesIO(b'0' * 10)).close()
+            pdf_cache.put('invoice', 2, 'a', io.BytesIO(b'0' * 10)).close()
+            pdf_cache.get('invoice', 1, 'a').close()
+            pdf_cache.put('invoice', 3, 'a', io.BytesIO(b'0' * 10)).close()
+
+            self.assertIsNotNone(pdf_cache.get('invoice', 1, 'a'))
+            self.assertIsNone(pdf_cache.get('invoice', 2, 'a'))
+
+
+@override_settings(TALLER_PDF_CACHE_DIR=None)
+class PdfStreamingTests(TestCase):
+    def test_large_pdf_is_streamed_from_disk(self):
+        invoice = create_invoice(activity_count=300)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        url = reverse('admin:taller_invoice_export_pdf', args=[invoice.pk])
+
+        def retained(spool_max_size):
+            # Lo que la respuesta conserva mientras espera a enviarse, una vez generado el PDF
+            with override_settings(TALLER_PDF_SPOOL_MAX_SIZE=spool_max_size):
+                tracemalloc.start()
+                try:
+                    response = self.client.get(url)
+                    size = tracemalloc.get_traced_memory()[0]
+                finally:
+                    tracemalloc.stop()
+            pdf = b''.join(response.streaming_content)
+            response.close()
+            return size, len(pdf)
+
+        # La primera exportación llena cachés de fuentes y estilos que no dependen del PDF
+        retained(1024)
+        in_memory, pdf_size = retained(64 * 1024 * 1024)
+        on_disk, _ = retained(1024)
+
+        self.assertGreater(pdf_size, 2 * pdf_cache.CHUNK_SIZE)
+        self.assertLess(on_disk, in_memory - pdf_size * 3 // 4)
+
+    def test_pdf_is_streamed_in_chunks(self):
+        invoice = create_invoice(activity_count=300)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+
+        response = self.client.get(reverse('admin:taller_invoice_export_pdf', args=[invoice.pk]))
+        chunks = list(response.streaming_content)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertLessEqual(max(len(chunk) for chunk in chunks), pdf_cache.CHUNK_SIZE)
+        self.assertTrue(b''.join(chunks).startswith(b'%PDF'))
+
+
+# Los hilos no ven los datos de la transacción de TestCase; el grupo de hilos se prueba aparte
+@override_settings(TALLER_PDF_CACHE_DIR=None, TALLER_BATCH_EXPORT_WORKERS=1, TALLER_BATCH_EXPORT_THREADS=1)
+class BatchExportTests(TestCase):
+    def setUp(self):
+        self.invoices = [create_invoice(), create_invoice()]
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+
+    def run_action(self, model_name, action):
+        return self.client.post(reverse('admin:taller_{}_changelist'.format(model_name)), {
+            'action': action,
+            '_selected_action': [invoice.pk for invoice in self.invoices],
+        })
+
+    def test_zip_action(self):
+        for model_name in ('invoice', 'workshoporder'):
+            response = self.run_action(model_name, 'export_pdf_zip')
+
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('X-Documents-Per-Second', response)
+            with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+                self.assertEqual(len(archive.namelist()), 2)
+                for name in archive.namelist():
+                    self.assertTrue(archive.read(name).startswith(b'%PDF'))
+
+    def test_merged_action(self):
+        response = self.run_action('invoice', 'export_pdf_merged')
+
+        pdf = b''.join(response.streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_command_exports_date_range(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'facturas.zip')
+            stdout = io.StringIO()
+            today = timezone.localdate().isoformat()
+            call_command('export_pdfs', 'invoice', output, '--from', today, '--to', today, stdout=stdout)
+
+            with zipfile.ZipFile(output) as archive:
+                self.assertEqual(len(archive.namelist()), 2)
+            self.assertIn('documentos/s', stdout.getvalue())
+
+    def test_merged_documents_are_loaded_as_they_are_composed(self):
+        story_of = batch.BATCHES[documents.INVOICE][2]
+        canvases = list()
+        pages = list()
+
+        class RecordingCanvas(pdf_pages.PageDecoratedCanvas):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                canvases.append(self)
+
+        def recording_story_of(document, width):
+            pages.append(canvases[0].getPageNumber() if canvases else None)
+            return story_of(document, width)
+
+        batches = {documents.INVOICE: (*batch.BATCHES[documents.INVOICE][:2], recording_story_of,
+                                       *batch.BATCHES[documents.INVOICE][3:])}
+        with mock.patch.dict(batch.BATCHES, batches), \
+                mock.patch.object(batch, 'PageDecoratedCanvas', RecordingCanvas):
+            count = batch.export_merged(documents.INVOICE, [self.invoices[0].pk, 0, self.invoices[1].pk],
+                                        io.BytesIO())
+
+        self.assertEqual(count, 2)
+        # El segundo documento se carga cuando las páginas del primero ya se emitieron
+        self.assertEqual(pages, [1, 2])
+
+
+class ThreadedBatchExportTests(TransactionTestCase):
+    def test_zip_is_rendered_by_a_bounded_thread_pool(self):
+        invoices = [create_invoice(), create_invoice()]
+
+        with override_settings(TALLER_PDF_CACHE_DIR=None, TALLER_BATCH_EXPORT_THREADS=2), \
+                mock.patch.object(batch, 'ProcessPoolExecutor') as process_pool:
+            stream = io.BytesIO()
+            count, _ = batch.export(documents.INVOICE, [invoice.pk for invoice in invoices], stream, processes=False)
+
+        process_pool.assert_not_called()
+        self.assertEqual(count, 2)
+        with zipfile.ZipFile(stream) as archive:
+            self.assertEqual(len(archive.namelist()), 2)
+
+
+@override_settings(TALLER_PDF_CACHE_DIR=None)
+class ExtractTests(TestCase):
+    def setUp(self):
+        self.invoice = create_invoice()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+
+    def test_csv_action_streams_rows_with_lookup_names(self):
+        response = self.client.post(reverse('admin:taller_workshoporder_changelist'),
+                                    {'action': 'export_csv', '_selected_action': [self.invoice.pk]})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+        header, row = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(header.startswith('id,entry_date,enterprise,vehicle_tag'))
+        self.assertIn(',Empresa,P123456,Lada,2107,Juan,Pérez,', row)
+
+    def test_jsonl_action_exports_activities(self):
+        response = self.client.post(reverse('admin:taller_activity_changelist'),
+                                    {'action': 'export_jsonl',
+                                     '_selected_action': self.invoice.activity_set.values_list('pk', flat=True)})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn('"provenance": "Taller", "price": "2.00", "amount": 3', lines[0])
+
+    def test_rows_are_read_in_chunks(self):
+        create_invoice(activity_count=5)
+        with override_settings(TALLER_EXTRACT_CHUNK_ROWS=2):
+            self.assertEqual(len(list(extracts.rows(extracts.ACTIVITY))), 8)
+
+    def test_command_filters_by_date_range(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        output = os.path.join(directory.name, 'facturas.csv')
+        today = timezone.localdate()
+
+        call_command('export_data', 'invoice', output, '--from', today.isoformat(), stderr=io.StringIO())
+        with open(output, encoding='utf-8') as extract:
+            self.assertEqual(len(extract.read().splitlines()), 2)
+
+        call_command('export_data', 'invoice', output, '--to', '2000-01-01', stderr=io.StringIO())
+        with open(output, encoding='utf-8') as extract:
+            self.assertEqual(len(extract.read().splitlines()), 1)
+
+    @override_settings(TIME_ZONE='America/Havana')
+    def test_days_when_havana_changes_the_time_at_midnight(self):
+        def on(day):
+            return set(Invoice.objects.filter(**extracts.date_filters('date', day, day)).values_list('pk', flat=True))
+
+        utc = datetime.timezone.utc
+        invoice = self.invoice
+        # 00:30 del 14 de marzo no existe: a medianoche se pasa a la 1:00, 05:00 UTC
+        for date, day in ((datetime.datetime(2021, 3, 14, 4, 30, tzinfo=utc), datetime.date(2021, 3, 13)),
+                          (datetime.datetime(2021, 3, 14, 5, 30, tzinfo=utc), datetime.date(2021, 3, 14)),
+                          # 00:30 del 7 de noviembre ocurre dos veces, 04:30 y 05:30 UTC
+                          (datetime.datetime(2021, 11, 7, 3, 30, tzinfo=utc), datetime.date(2021, 11, 6)),
+                          (datetime.datetime(2021, 11, 7, 4, 30, tzinfo=utc), datetime.date(2021, 11, 7))):
+            with self.subTest(date=date):
+                Invoice.objects.filter(pk=invoice.pk).update(date=date)
+                self.assertEqual(on(day), {invoice.pk})
+                self.assertEqual(on(day + datetime.timedelta(days=1)), set())
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        output = os.path.join(directory.name, 'facturas.csv')
+        call_command('export_data', 'invoice', output, '--from', '2021-11-07', '--to', '2022-03-13',
+                     stderr=io.StringIO())
+        with open(output, encoding='utf-8') as extract:
+            self.assertEqual(len(extract.read().splitlines()), 2)
+
+
+class ImportTests(TestCase):
+    def write(self, name, content):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, name)
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(content)
+        return path
+
+    def test_rows_are_resolved_by_natural_key_and_errors_reported(self):
+        enterprise = Enterprise.objects.create(name='Flota', phone=5555, address='Calle 1', comments='')
+        path = self.write('vehiculos.csv', 'tag,mark,model,enterprise\n'
+                                           'P000001,Lada,2107,Flota\n'
+                                           'P000002,Moskvich,412,Otra\n'
+                                           'P000003,Lada,2105,Flota\n')
+        errors = io.StringIO()
+
+        # Una consulta para el mapa de empresas y un único INSERT dentro de su transacción
+        with self.assertNumQueries(4), open(path, encoding='utf-8', newline='') as stream:
+            imported, failed, _ = importer.import_rows(
+                'vehicle', importer.read_rows(stream, importer.CSV),
+                on_error=lambda line_num, messages: errors.write('{}: {}\n'.format(line_num, messages)))
+
+        self.assertEqual((imported, failed), (2, 1))
+        self.assertIn('3: ', errors.getvalue())
+        self.assertEqual(list(enterprise.vehicle_set.order_by('tag').values_list('tag', flat=True)),
+                         ['P000001', 'P000003'])
+
+    def test_malformed_jsonl_lines_are_reported_and_skipped(self):
+        path = self.write('piezas.jsonl', '{"name": "Luces"}\n{"name": \n["Frenos"]\n{"name": "Bujías"}\n')
+        stdout, stderr = io.StringIO(), io.StringIO()
+
+        call_command('import_data', 'piece', path, stdout=stdout, stderr=stderr)
+
+        self.assertEqual(Piece.objects.filter(name__in=['Luces', 'Bujías']).count(), 2)
+        self.assertIn('2 filas con errores', stdout.getvalue())
+        self.assertIn(':2: JSON inválido', stderr.getvalue())
+        self.assertIn(':3: Se esperaba un objeto JSON', stderr.getvalue())
+
+    def test_historical_order_keeps_id_and_dates(self):
+        source = create_invoice()
+        orders = self.write('ordenes.jsonl', ''.join(extracts.lines(extracts.WORKSHOP_ORDER, extracts.JSONL)))
+        invoices = self.write('facturas.csv', ''.join(extracts.lines(extracts.INVOICE, extracts.CSV)))
+        activities = self.write('actividades.jsonl', ''.join(extracts.lines(extracts.ACTIVITY, extracts.JSONL)))
+        entry_date = timezone.now() - timezone.timedelta(days=400)
+        WorkshopOrder.objects.all().delete()
+        with open(orders, encoding='utf-8') as extract:
+            content = extract.read()
+        orders = self.write('ordenes.jsonl', content.replace(
+            timezone.localtime(source.workshop_order.entry_date).isoformat(),
+            timezone.localtime(entry_date).isoformat()))
+
+        for kind, path in (('workshop_order', orders), ('invoice', invoices), ('activity', activities)):
+            call_command('import_data', kind, path, stdout=io.StringIO(), stderr=io.StringIO())
+
+        invoice = Invoice.objects.get(pk=source.pk)
+        self.assertEqual(invoice.workshop_order.entry_date, entry_date)
+        self.assertEqual((invoice.line_count, invoice.total), (3, Decimal('53.00')))
+        self.assertEqual(totals.verify(), [])
+
+    def test_only_the_imported_orders_and_invoices_are_recalculated(self):
+        def summaries():
+            return sorted(ReportSummary.objects.filter(invoices__gt=0)
+                          .values_list('dimension', 'key', 'month', 'revenue', 'hours', 'invoices'))
+
+        invoice = create_invoice(activity_count=0)
+        pieces = self.write('piezas.csv', 'name\nLuces\n')
+        activities = self.write('actividades.csv',
+                                'code,description,hours_worked,price,amount,invoice,unit_measurement,provenance\n'
+                                '900,Pintura,1.00,10.00,2,{},U,Taller\n'.format(invoice.pk))
+
+        with mock.patch.object(totals, 'rebuild', wraps=totals.rebuild) as rebuild_totals, \
+                mock.patch.object(reports, 'rebuild', wraps=reports.rebuild) as rebuild_reports:
+            call_command('import_data', 'piece', pieces, stdout=io.StringIO(), stderr=io.StringIO())
+            rebuild_totals.assert_not_called()
+            rebuild_reports.assert_not_called()
+
+            call_command('import_data', 'activity', activities, stdout=io.StringIO(), stderr=io.StringIO())
+        rebuild_totals.assert_called_once_with(workshop_order_ids=set(), invoice_ids={invoice.pk})
+        rebuild_reports.assert_called_once_with({invoice.pk})
+
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.line_count, invoice.total), (1, Decimal('55.00')))
+        imported = summaries()
+        reports.rebuild()
+        self.assertEqual(imported, summaries())
+
+
+class BenchmarkTests(TestCase):
+    def test_seed_generates_consistent_data(self):
+        created = seed.seed(enterprises=2, vehicles=3, mechanicals=2, orders=4, physical_states=2, activities=3)
+
+        self.assertEqual((created['workshoporder'], created['physicalstate'], created['activity']), (4, 8, 12))
+        self.assertEqual(totals.verify(), [])
+        self.assertEqual(ReportSummary.objects.filter(dimension=ReportSummary.MONTH)
+                         .aggregate(invoices=Sum('invoices'))['invoices'], 4)
+
+    def test_benchmark_measures_exports_and_changelists(self):
+        seed.seed(enterprises=1, vehicles=1, mechanicals=2, orders=2, physical_states=1, activities=1)
+
+        with override_settings(TALLER_PDF_CACHE_DIR=None):
+            result = benchmark.run(requests=2, samples=1, only=['pdf:invoice', 'taller.invoice'])
+
+        self.assertEqual([entry['name'] for entry in result['results']],
+                         ['pdf:invoice', 'changelist:taller.invoice'])
+        for entry in result['results']:
+            self.assertEqual(entry['status'], [200])
+            self.assertGreater(entry['queries'], 0)
+            self.assertGreater(entry['peak_memory'], 0)
+        self.assertEqual(benchmark.compare(result, result), {'pdf:invoice': 0.0, 'changelist:taller.invoice': 0.0})
+        self.assertFalse(User.objects.exists())
+
+    def test_failing_page_is_reported_and_the_rest_are_measured(self):
+        seed.seed(enterprises=1, vehicles=1, mechanicals=2, orders=2, physical_states=1, activities=1)
+
+        stdout = io.StringIO()
+        with override_settings(TALLER_PDF_CACHE_DIR=None), \
+                mock.patch('taller.views.open_pdf', side_effect=RuntimeError('sin fuente')), \
+                self.assertLogs('django.request', 'ERROR'):
+            call_command('run_benchmarks', '--requests', '2', '--samples', '1', '--only', 'pdf:invoice',
+                         'taller.invoice', stdout=stdout)
+
+        self.assertIn('RuntimeError: sin fuente', stdout.getvalue())
+        self.assertIn('1 de 2 mediciones con errores', stdout.getvalue())
+        with override_settings(TALLER_PDF_CACHE_DIR=None), \
+                mock.patch('taller.views.open_pdf', side_effect=RuntimeError('sin fuente')), \
+                self.assertLogs('django.request', 'ERROR'):
+            pdf, changelist = benchmark.run(requests=2, samples=1, only=['pdf:invoice', 'taller.invoice'])['results']
+        self.assertEqual((pdf['status'], pdf['failed'], len(pdf['failures'])), ([500], 2, 1))
+        self.assertEqual((changelist['status'], changelist['failed'], changelist['failures']), ([200], 0, []))
+
+
+@override_settings(TALLER_PDF_CACHE_DIR=None)
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed.seed(enterprises=1, vehicles=1, mechanicals=2, orders=1, physical_states=1, activities=2)
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_export_records_request_and_pdf_phases(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('admin:taller_invoice_export_pdf', args=[1]))
+        size = len(b''.join(response.streaming_content))
+
+        output = self.client.get(reverse('metrics')).content.decode()
+        view = 'view="admin:taller_invoice_export_pdf"'
+        self.assertIn('taller_http_requests_total{{{},method="GET",status="200"}} 1'.format(view), output)
+        self.assertIn('taller_http_response_bytes_total{{{}}} {}'.format(view, size), output)
+        self.assertIn('taller_http_request_duration_seconds_count{{{}}} 1'.format(view), output)
+        self.assertRegex(output, r'taller_db_queries_total\{%s\} [1-9]' % re.escape(view))
+        for phase in ('load', 'build', 'layout', 'write'):
+            self.assertIn('taller_pdf_phase_duration_seconds_bucket{{kind="invoice",phase="{}",le="+Inf"}} 1'
+                          .format(phase), output)
+        self.assertIn('# TYPE taller_pdf_phase_duration_seconds histogram', output)
+        self.assertIn('taller_pdf_cache_entries 0', output)
+
+    def test_endpoint_rejects_other_addresses(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 403)
+        with override_settings(TALLER_METRICS_ALLOWED_IPS=['10.0.0.5']):
+            response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    def test_endpoint_rejects_proxied_requests_without_token_or_staff(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url, HTTP_X_FORWARDED_FOR='203.0.113.7').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_FORWARDED='for=203.0.113.7').status_code, 403)
+
+        with override_settings(TALLER_METRICS_TOKEN='secreto'):
+            self.assertEqual(self.client.get(url, HTTP_X_FORWARDED_FOR='203.0.113.7',
+                                             HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_X_FORWARDED_FOR='203.0.113.7',
+                                             HTTP_AUTHORIZATION='Bearer secreto').status_code, 200)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url, HTTP_X_FORWARDED_FOR='203.0.113.7').status_code, 200)
+
+    def test_disabled(self):
+        with override_settings(TALLER_METRICS=False):
+            self.client.get(reverse('metrics'))
+        self.assertNotIn('taller_http_requests_total{', metrics.render())
+
+
+@override_settings(TALLER_REFERENCE_CACHE_CHECK_SECONDS=60)
+class ReferenceTests(TestCase):
+    def setUp(self):
+        self.pieces = [Piece.objects.create(name=name) for name in ('Motor', 'Frenos')]
+        reference.clear()
+        metrics.reset()
+
+    def test_reads_are_served_from_memory(self):
+        reference.warm_up()
+
+        with self.assertNumQueries(0):
+            self.assertEqual([piece.name for piece in reference.rows(Piece)], ['Motor', 'Frenos'])
+            self.assertEqual(reference.get(Piece, self.pieces[1].pk).name, 'Frenos')
+            self.assertEqual(reference.get_by_natural_key(Piece, 'Motor').pk, self.pieces[0].pk)
+            self.assertEqual(importer.PIECES.resolve('Frenos'), self.pieces[1].pk)
+        self.assertIn('taller_reference_cache_hits_total{model="taller.Piece"}', metrics.render())
+
+    def test_edits_in_this_process_are_seen_at_once(self):
+        reference.warm_up()
+        Piece.objects.create(name='Luces')
+        self.pieces[0].delete()
+
+        self.assertEqual([piece.name for piece in reference.rows(Piece)], ['Frenos', 'Luces'])
+
+    def test_edits_in_other_processes_are_seen_after_the_check_interval(self):
+        reference.warm_up()
+        # Otro proceso edita la tabla y avanza su versión
+        Piece.objects.filter(pk=self.pieces[0].pk).update(name='Motor nuevo')
+        ReferenceVersion.objects.filter(model='taller.Piece').update(version=F('version') + 1)
+
+        self.assertEqual(reference.get(Piece, self.pieces[0].pk).name, 'Motor')
+        with override_settings(TALLER_REFERENCE_CACHE_CHECK_SECONDS=0):
+            self.assertEqual(reference.get(Piece, self.pieces[0].pk).name, 'Motor nuevo')
+
+    def test_bulk_import_invalidates(self):
+        reference.warm_up()
+        importer.import_rows('piece', enumerate([{'name': 'Luces'}], start=2))
+
+        self.assertIsNotNone(reference.get_by_natural_key(Piece, 'Luces'))
+
+
+class SlowQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed.seed(enterprises=1, vehicles=2, mechanicals=2, orders=3, physical_states=1, activities=1)
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = os.path.join(directory.name, 'slow.jsonl')
+
+    def test_fingerprint(self):
+        self.assertEqual(slow_queries.fingerprint("SELECT * FROM t WHERE a = 'x''y' AND b IN (1, 2, 3)\n LIMIT 21"),
+                         'SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ?')
+
+    def test_logs_plan_view_and_caller(self):
+        self.client.force_login(self.user)
+        with override_settings(TALLER_SLOW_QUERY_SECONDS=0, TALLER_SLOW_QUERY_LOG=self.log):
+            self.client.get(reverse('admin:taller_workshoporder_changelist'), {'total_range': '0-1000'})
+            self.client.get(reverse('admin:taller_workshoporder_changelist'), {'total_range': '1000-5000'})
+        records = list(slow_queries.read(self.log))
+
+        record = next(record for record in records if 'FROM "taller_workshoporder"' in record['sql']
+                      and record['view'] == 'admin:taller_workshoporder_changelist')
+        self.assertTrue(record['plan'])
+        self.assertTrue(record['caller'].startswith('taller'))
+        self.assertTrue(all(record['plan'] is None for record in records if record['sql'].startswith('UPDATE')))
+
+        groups = slow_queries.aggregate(records)
+        self.assertEqual(sum(group['count'] for group in groups), len(records))
+        self.assertEqual(groups, sorted(groups, key=lambda group: group['total'], reverse=True))
+        self.assertGreaterEqual(next(group['count'] for group in groups
+                                     if group['fingerprint'] == record['fingerprint']), 2)
+
+        output = io.StringIO()
+        call_command('slow_queries', self.log, '--limit', '1', stdout=output)
+        self.assertIn(groups[0]['fingerprint'], output.getvalue())
+
+    def test_disabled(self):
+        with override_settings(TALLER_SLOW_QUERY_SECONDS=None, TALLER_SLOW_QUERY_LOG=self.log):
+            self.client.get(reverse('admin:login'))
+        self.assertFalse(os.path.exists(self.log))
+
+
+class LargeTablePaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed.seed(enterprises=1, vehicles=2, mechanicals=2, orders=12, physical_states=1, activities=1)
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def test_pages_match_offset_pagination(self):
+        queryset = Invoice.objects.select_related('contact').order_by('-date', '-pk')
+        expected = [invoice.pk for invoice in queryset]
+        paginator = LargeTablePaginator(queryset, 5)
+
+        self.assertEqual(paginator.count, 12)
+        self.assertFalse(paginator.capped)
+        self.assertEqual([[invoice.pk for invoice in paginator.page(number)] for number in (1, 2, 3)],
+                         [expected[:5], expected[5:10], expected[10:]])
+
+    @override_settings(TALLER_ADMIN_COUNT_LIMIT=10)
+    def test_count_is_capped(self):
+        paginator = LargeTablePaginator(Invoice.objects.order_by('pk'), 5)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 10)
+        self.assertTrue(paginator.capped)
+        self.assertEqual(len(paginator.page(3)), 2)
+        with self.assertRaises(EmptyPage):
+            paginator.page(4)
+
+    @override_settings(TALLER_ADMIN_COUNT_LIMIT=10)
+    def test_changelist_skips_full_count(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:taller_invoice_changelist'))
+
+        self.assertContains(response, 'Más de 10 Facturas')
+        counts = [query['sql'] for query in queries if 'COUNT(' in query['sql']]
+        self.assertEqual(len(counts), 1)
+        self.assertIn('LIMIT 11', counts[0])
+        self.assertEqual(response.context['cl'].result_list[0].pk, Invoice.objects.order_by('-pk')[0].pk)
+
+
+class DatabaseProfileTests(TestCase):
+    def test_sqlite_pragmas_are_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_journal_mode_is_changed_only_when_configured(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'db.sqlite3')
+        sqlite3.connect(path).close()
+
+        for journal_mode, expected in ((None, 'delete'), ('WAL', 'wal')):
+            with self.subTest(journal_mode=journal_mode), override_settings(TALLER_SQLITE_JOURNAL_MODE=journal_mode):
+                other = type(connections['default'])({**connection.settings_dict, 'NAME': path}, alias='pragmas')
+                try:
+                    with other.cursor() as cursor:
+                        cursor.execute('PRAGMA journal_mode')
+                        self.assertEqual(cursor.fetchone()[0], expected)
+                finally:
+                    other.close()
+
+    def test_unusable_persistent_connections_are_closed(self):
+        with mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=60), \
+                mock.patch.object(connection, 'is_usable', return_value=False), \
+                mock.patch.object(connection, 'close') as close:
+            signals.close_unusable_connections()
+            with override_settings(TALLER_DB_HEALTH_CHECKS=False):
+                signals.close_unusable_connections()
+        self.assertEqual(close.call_count, 1)
+
+
+@override_settings(TALLER_REPLICA_CHECK_SECONDS=0)
+class ReplicaTests(TransactionTestCase):
+    # La copia con la API de respaldo de SQLite espera a que terminen las transacciones abiertas
+    def setUp(self):
+        seed.seed(enterprises=1, vehicles=1, mechanicals=2, orders=2, physical_states=1, activities=2)
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def synced(self, seconds_ago):
+        return mock.patch.object(replica, '_read_synced_at', return_value=time.time() - seconds_ago)
+
+    @mock.patch.object(replica, 'configured', return_value=True)
+    def test_reads_fall_back_to_primary(self, configured):
+        with self.synced(10):
+            self.assertEqual(replica.read_alias(), 'replica')
+            self.assertEqual(replica.read_alias(since=time.time() - 60), 'replica')
+            # La réplica todavía no tiene la última escritura
+            self.assertEqual(replica.read_alias(since=time.time()), 'default')
+        with self.synced(replica.max_lag() + 1):
+            self.assertEqual(replica.read_alias(), 'default')
+        with mock.patch.object(replica, '_read_synced_at', side_effect=OSError), \
+                self.assertLogs('taller.replica', 'WARNING'):
+            self.assertEqual(replica.read_alias(), 'default')
+
+    def test_router(self):
+        self.assertEqual(router.db_for_read(Invoice), 'default')
+        with replica.using('replica'):
+            self.assertEqual(router.db_for_read(Invoice), 'replica')
+            self.assertEqual(router.db_for_write(Invoice), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'taller'))
+
+    @mock.patch.object(replica, 'configured', return_value=True)
+    def test_writes_are_marked_with_a_cookie(self, configured):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('admin:taller_type_changelist'))
+        self.assertNotIn(replica.LAST_WRITE_COOKIE, response.cookies)
+
+        response = self.client.post(reverse('admin:taller_type_add'), {'type': 'Crédito', 'title': 'Nuevo'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(replica.LAST_WRITE_COOKIE, response.cookies)
+
+        request = RequestFactory().get('/')
+        request.COOKIES = {replica.LAST_WRITE_COOKIE: response.cookies[replica.LAST_WRITE_COOKIE].value}
+        self.assertAlmostEqual(replica.last_write(request), time.time(), delta=60)
+        with self.synced(10):
+            self.assertEqual(replica.read_alias(since=replica.last_write(request)), 'default')
+
+    def test_refresh_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'replica.sqlite3')
+            replica.refresh_snapshot(path)
+
+            snapshot = sqlite3.connect('file:{}?mode=ro'.format(path), uri=True)
+            try:
+                count = snapshot.execute('SELECT COUNT(*) FROM taller_invoice').fetchone()[0]
+                journal_mode = snapshot.execute('PRAGMA journal_mode').fetchone()[0]
+            finally:
+                snapshot.close()
+        self.assertEqual(count, Invoice.objects.count())
+        self.assertEqual(journal_mode, 'delete')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Los planes se leen con EXPLAIN QUERY PLAN de SQLite')
+class IndexUsageTests(TestCase):
+    """Las consultas del admin que filtran, ordenan o buscan en las tablas grandes usan un índice.
+
+    Sin estadísticas SQLite supone tablas grandes, así que elige el plan que tendría en producción.
+    """
+    LARGE_TABLES = ('taller_contact', 'taller_vehicle', 'taller_workshoporder', 'taller_physicalstate',
+                    'taller_invoice', 'taller_activity')
+
+    @classmethod
+    def setUpTestData(cls):
+        seed.seed(enterprises=2, vehicles=3, mechanicals=2, orders=4, physical_states=2, activities=3)
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def plans(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        plans = list()
+        for query in queries:
+            if 'taller_' in query['sql'] and query['sql'].startswith('SELECT'):
+                plans.append((query['sql'], slow_queries.explain(query['sql'], None)))
+        return plans
+
+    def test_admin_queries_use_indexes(self):
+        self.client.force_login(self.user)
+        day = timezone.localdate(Invoice.objects.earliest('date').date)
+        invoice = Invoice.objects.first()
+        pages = [
+            (reverse('admin:taller_invoice_changelist') + '?' + urlencode(extracts.date_filters('date', day, day)),
+             'invoice_date_idx'),
+            (reverse('admin:taller_workshoporder_changelist') + '?o=-1', 'workshoporder_entry_date_idx'),
+            (reverse('admin:taller_activity_changelist') + '?q={}'.format(invoice.pk), 'activity_invoice_code_idx'),
+            (reverse('admin:taller_invoice_change', args=[invoice.pk]), 'activity_invoice_code_idx'),
+        ]
+        # Las búsquedas por subcadena recorren la tabla; el índice de texto se suma a ellas
+        searches = [
+            (reverse('admin:taller_workshoporder_changelist') + '?q=motor', 'taller_workshoporder_search VIRTUAL TABLE'),
+            (reverse('admin:taller_physicalstate_changelist') + '?q=bien', 'taller_physicalstate_search VIRTUAL TABLE'),
+        ]
+        for url, index in pages + searches:
+            with self.subTest(url=url):
+                plans = self.plans(url)
+                self.assertTrue(any(index in line for _, plan in plans for line in plan),
+                                '{} no usa {}'.format(url, index))
+                if (url, index) in searches:
+                    continue
+                for sql, plan in plans:
+                    scans = [line for line in plan if re.fullmatch(r'SCAN ({})'.format('|'.join(self.LARGE_TABLES)),
+                                                                   line)]
+                    self.assertEqual(scans, [], sql)
+
+    def test_sorted_list_is_not_sorted_in_memory(self):
+        self.client.force_login(self.user)
+        plans = self.plans(reverse('admin:taller_workshoporder_changelist') + '?o=-1')
+        page_ids = [plan for sql, plan in plans if 'ORDER BY "taller_workshoporder"."entry_date" DESC' in sql]
+        self.assertTrue(page_ids)
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', page_ids[0])
+
+    def test_search_keeps_substring_matches(self):
+        vehicle = Vehicle.objects.first()
+        vehicle.model = '2107'
+        vehicle.save()
+        order = WorkshopOrder.objects.select_related('enterprise').first()
+        contact = Contact.objects.first()
+        contact.name, contact.email = 'Ana Pérez Ríos', 'ana@taller.example.cu'
+        contact.save()
+
+        self.client.force_login(self.user)
+        pages = [
+            ('admin:taller_vehicle_changelist', '2107', vehicle),
+            ('admin:taller_workshoporder_changelist', order.enterprise.name, order),
+            ('admin:taller_contact_changelist', 'Ríos', contact),
+            ('admin:taller_contact_changelist', 'example.cu', contact),
+        ]
+        for url_name, term, expected in pages:
+            with self.subTest(term=term):
+                response = self.client.get(reverse(url_name), {'q': term})
+                self.assertIn(expected, response.context['cl'].result_list)
+        response = self.client.get(reverse('admin:taller_vehicle_autocomplete'), {'term': '2107'})
+        self.assertIn(str(vehicle.pk), [result['id'] for result in response.json()['results']])
+
+
+@skipUnless(search.supported(connection), 'La búsqueda de texto requiere SQLite o PostgreSQL')
+class RepairSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.order_id = create_invoice(activity_count=1, physical_state_count=2).workshop_order_id
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        self.order = WorkshopOrder.objects.get(pk=self.order_id)
+
+    def found(self, text):
+        return [order_id for order_id, _ in search.search_orders(text)]
+
+    def test_index_follows_orders_and_physical_states(self):
+        self.assertEqual(self.found('motor'), [self.order.pk])
+        # Sin acentos y por prefijo
+        self.assertEqual(self.found('corre'), [self.order.pk])
+
+        self.order.work_done = 'Cambio de bujías'
+        self.order.description_raw_materials_parts = 'Bujías'
+        self.order.save()
+        self.assertEqual(self.found('bujias cambio'), [self.order.pk])
+        self.assertEqual(self.found('correa'), [])
+
+        state = self.order.physicalstate_set.first()
+        state.description = 'Radiador abollado'
+        state.save()
+        self.assertEqual(self.found('abollado'), [self.order.pk])
+        state.delete()
+        self.assertEqual(self.found('abollado'), [])
+
+        self.order.delete()
+        self.assertEqual(self.found('motor'), [])
+
+    def test_ranking_and_highlight(self):
+        def copy(defection, work_done):
+            order = WorkshopOrder.objects.get(pk=self.order.pk)
+            order.pk = None
+            order.defection, order.work_done = defection, work_done
+            order.save()
+            for state in self.order.physicalstate_set.all():
+                PhysicalState.objects.create(workshop_order=order, piece=state.piece, description=state.description)
+            return order
+
+        # bm25 solo ordena si el término es poco frecuente entre todas las órdenes
+        for work_done in ('Pintura', 'Chapistería', 'Luces', 'Gomas'):
+            copy('Frenos', work_done)
+        # Mismo texto que la orden original, pero el motor está en el trabajo realizado
+        other = copy(self.order.work_done, self.order.defection)
+
+        results = search.search_orders('motor')
+        # Lo que aparece en la defectación pesa más que el trabajo realizado
+        self.assertEqual([order_id for order_id, _ in results], [self.order.pk, other.pk])
+        self.assertIn('<mark>motor</mark>', results[0][1])
+        self.assertEqual(search.highlight('<b>{}x{}</b>'.format(search.MARK_START, search.MARK_END)),
+                         '&lt;b&gt;<mark>x</mark>&lt;/b&gt;')
+        self.assertEqual(search.search_orders(' ¿? '), [])
+
+    def test_admin_search(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('admin:taller_workshoporder_changelist') + '?q=ruido')
+        self.assertEqual(list(response.context['cl'].result_list), [self.order])
+        response = self.client.get(reverse('admin:taller_workshoporder_changelist') + '?q=empresa')
+        self.assertEqual(list(response.context['cl'].result_list), [self.order])
+
+        response = self.client.get(reverse('admin:taller_physicalstate_changelist') + '?q=bien')
+        self.assertEqual(response.context['cl'].result_count, 2)
+        response = self.client.get(reverse('admin:taller_physicalstate_changelist') + '?q={}'.format(self.order.pk))
+        self.assertEqual(response.context['cl'].result_count, 2)
+        state = self.order.physicalstate_set.first()
+        state.description = 'Junta 4711 rota'
+        state.save()
+        response = self.client.get(reverse('admin:taller_physicalstate_changelist') + '?q=4711')
+        self.assertEqual(list(response.context['cl'].result_list), [state])
+        response = self.client.get(reverse('admin:taller_physicalstate_changelist'),
+                                   {'q': self.order.entry_date.strftime('%Y-%m')})
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+        response = self.client.get(reverse('admin:taller_workshoporder_search') + '?q=ruido motor')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<mark>Ruido</mark> en el <mark>motor</mark>', html=False)
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER taller_workshoporder_search_insert' if connection.vendor == 'sqlite'
+                           else 'DROP TRIGGER taller_workshoporder_search ON taller_workshoporder')
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.found('motor'), [self.order.pk])
+        create_invoice()
+        self.assertEqual(len(self.found('motor')), 2)
+
+    def test_check_warns_when_triggers_are_missing(self):
+        self.assertEqual(checks.check_search_triggers(databases=['default']), [])
+        trigger = search.TRIGGERS[connection.vendor][-1]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('DROP TRIGGER {} ON taller_physicalstate'.format(trigger))
+            else:
+                cursor.execute('DROP TRIGGER {}'.format(trigger))
+        warnings = checks.check_search_triggers(databases=['default'])
+        self.assertEqual([warning.id for warning in warnings], ['taller.W001'])
+        self.assertIn(trigger, warnings[0].msg)
+
+
+class ConcurrentWritesTests(TransactionTestCase):
+    # La base de datos de pruebas en memoria bloquea por tabla y no espera; la concurrencia se mide
+    # con `manage.py benchmark_writers` sobre un archivo
+    def test_write_orders(self):
+        seed.seed(enterprises=1, vehicles=1, mechanicals=2, orders=1, physical_states=1, activities=1)
+
+        result = benchmark.write_orders(writers=1, transactions=3, activities=2)
+
+        self.assertEqual((result['transactions'], result['errors']), (3, 0))
+        self.assertEqual(WorkshopOrder.objects.count(), 1)
+        self.assertEqual(totals.verify(), [])
+
+
+class AdminBudgetTests(TestCase):
+    """Presupuesto de consultas y de tiempo de cada página del admin y de las exportaciones.
+
+    Los datos tienen varias filas por listado y por formulario en línea, así que una consulta por
+    fila (N+1) supera el presupuesto. Al fallar se muestran las consultas repetidas. Se mide la
+    segunda petición a cada página, con las tablas de referencia ya en memoria.
+    """
+    TIME_BUDGET = 2.0
+    QUERY_BUDGETS = {
+        'changelist': 6,
+        'add': 8,
+        'change': 8,
+        'pdf': 5,
+    }
+    QUERY_BUDGET_OVERRIDES = {
+        'auth.user:change': 9,
+        'taller.reportsummary:changelist': 9,
+        # Una consulta por cada valor de los campos con autocompletado
+        'taller.workshoporder:change': 10,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        seed.seed(enterprises=3, vehicles=5, mechanicals=3, orders=8, physical_states=3, activities=4)
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        ExportJob.objects.create(kind=documents.INVOICE, object_id='1')
+
+    def pages(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        for model, model_admin in sorted(admin.site._registry.items(), key=lambda item: item[0]._meta.label):
+            opts = model._meta
+            prefix = 'admin:{}_{}_'.format(opts.app_label, opts.model_name)
+            yield '{}:changelist'.format(opts.label_lower), 'changelist', reverse(prefix + 'changelist')
+            if model_admin.has_add_permission(request):
+                yield '{}:add'.format(opts.label_lower), 'add', reverse(prefix + 'add')
+            obj = model.objects.order_by('pk').first()
+            if obj is not None and model_admin.has_view_or_change_permission(request, obj) \
+                    and model is not ReportSummary:
+                yield '{}:change'.format(opts.label_lower), 'change', reverse(prefix + 'change', args=[obj.pk])
+        for kind, url_name in benchmark.EXPORTS.items():
+            yield 'pdf:{}'.format(kind), 'pdf', reverse(url_name[1], args=[1])
+
+    def test_pages_stay_within_budget(self):
+        self.client.force_login(self.user)
+        for name, page, url in self.pages():
+            budget = self.QUERY_BUDGET_OVERRIDES.get(name, self.QUERY_BUDGETS[page])
+            with self.subTest(name), override_settings(TALLER_PDF_CACHE_DIR=None):
+                self.client.get(url).close()
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = self.client.get(url)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    seconds = time.perf_counter() - start
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(queries), budget, '{}: {} consultas, presupuesto {}\n{}'.format(
+                    name, len(queries), budget, duplicated_queries(queries)))
+                self.assertLess(seconds, self.TIME_BUDGET, '{}: {:.2f} s'.format(name, seconds))
+
+
+class AdminFormTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def change_form_queries(self, invoice):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:taller_invoice_change', args=[invoice.pk]))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_inline_rows_share_choices(self):
+        small_invoice, large_invoice = create_invoice(activity_count=2), create_invoice(activity_count=30)
+        self.change_form_queries(small_invoice)
+        small, _ = self.change_form_queries(small_invoice)
+        large, response = self.change_form_queries(large_invoice)
+
+        self.assertEqual(small, large)
+        self.assertContains(response, 'data-ajax--url', count=2)
+
+    def test_workshop_orders_are_searched_by_number(self):
+        invoice = create_invoice(activity_count=1)
+        response = self.client.get(reverse('admin:taller_workshoporder_autocomplete'),
+                                   {'term': str(invoice.workshop_order_id)})
+
+        self.assertEqual([result['id'] for result in response.json()['results']], [str(invoice.workshop_order_id)])
+        response = self.client.get(reverse('admin:taller_workshoporder_autocomplete'), {'term': 'P123'})
+        self.assertEqual(len(response.json()['results']), 1)
+
+
+class ExportJobTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(TALLER_EXPORT_JOBS_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.invoice = create_invoice()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+
+    def enqueue(self):
+        response = self.client.get(reverse('admin:taller_invoice_export_pdf', args=[self.invoice.pk]),
+                                   {'async': '1'})
+        self.assertEqual(response.status_code, 202)
+        return response.json()
+
+    def test_same_document_is_queued_once(self):
+        first = self.enqueue()
+        second = self.enqueue()
+
+        self.assertEqual(first['job'], second['job'])
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+    def test_worker_renders_queued_job(self):
+        job = self.enqueue()
+        self.assertIsNone(job['download_url'])
+
+        jobs.work(once=True)
+
+        status = self.client.get(job['status_url']).json()
+        self.assertEqual(status['status'], ExportJob.DONE)
+        response = self.client.get(status['download_url'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+        # Una vez terminado, una nueva petición crea otro trabajo y el anterior se descarta al terminar
+        self.assertNotEqual(self.enqueue()['job'], job['job'])
+        jobs.work(once=True)
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+    def test_missing_document_is_not_queued(self):
+        response = self.client.get(reverse('admin:taller_invoice_export_pdf', args=[404]), {'async': '1'})
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_exports_require_admin_login_and_view_permission(self):
+        job = self.enqueue()
+        jobs.work(once=True)
+        urls = [
+            reverse('admin:taller_invoice_export_pdf', args=[self.invoice.pk]),
+            reverse('admin:taller_invoice_export_pdf', args=[self.invoice.pk]) + '?async=1',
+            job['status_url'],
+            reverse('admin:taller_exportjob_download', args=[job['job']]),
+        ]
+        self.client.logout()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertRedirects(self.client.get(url), reverse('admin:login') + '?' + urlencode({'next': url}))
+
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+    def test_failed_job_does_not_expose_traceback(self):
+        with mock.patch('taller.jobs.open_pdf', side_effect=ValueError('/ruta/interna')):
+            job = self.enqueue()
+            jobs.work(once=True)
+
+        status = self.client.get(job['status_url']).json()
+        self.assertEqual(status['status'], ExportJob.FAILED)
+        self.assertEqual(status['error'], 'Error al generar el PDF (ValueError)')
+
+
+@override_settings(TALLER_PDF_CACHE_DIR=None)
+class AsyncExportTests(TransactionTestCase):
+    def setUp(self):
+        self.client = AsyncClient()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+
+    def test_async_export_renders_in_executor(self):
+        invoice = create_invoice()
+
+        async def download():
+            response = await self.client.get(reverse('admin:taller_invoice_export_pdf_async', args=[invoice.pk]))
+            return response.status_code, b''.join(response.streaming_content)
+
+        status_code, pdf = asyncio.run(download())
+        self.assertEqual(status_code, 200)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+
+    @override_settings(TALLER_ASYNC_EXPORT_MAX_PENDING=0)
+    def test_async_export_rejects_when_saturated(self):
+        invoice = create_invoice()
+
+        response = asyncio.run(self.client.get(reverse('admin:taller_invoice_export_pdf_async', args=[invoice.pk])))
+        self.assertEqual(response.status_code, 503)
+
+    def test_async_export_requires_admin_login(self):
+        invoice = create_invoice()
+        url = reverse('admin:taller_invoice_export_pdf_async', args=[invoice.pk])
+
+        response = asyncio.run(AsyncClient().get(url))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith(reverse('admin:login')))
@@ -0,0 +1,85 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, PositiveIntegerField, Subquery, Sum, \
+    Value
+from django.db.models.functions import Coalesce
+
+from .models import WorkshopOrder, Invoice, Activity
+
+ZERO = Decimal('0.00')
+
+# Ids por consulta al recalcular sólo algunos registros; SQLite limita los parámetros de cada consulta
+CHUNK_SIZE = 500
+
+
+def _activities(field, aggregate):
+    return Coalesce(Subquery(Activity.objects
+                             .filter(invoice=OuterRef('pk'))
+                             .order_by()
+                             .values('invoice')
+                             .annotate(value=aggregate)
+                             .values('value')[:1], output_field=field), Value(0), output_field=field)
+
+
+def expected_invoice_totals():
+    """Anota en cada factura los importes calculados a partir de sus actividades."""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    return Invoice.objects.annotate(
+        expected_activities_total=_activities(money, Sum(ExpressionWrapper(F('price') * F('amount'),
+                                                                           output_field=money))),
+        expected_line_count=_activities(PositiveIntegerField(), Count('pk')),
+    )
+
+
+def _chunks(model, ids):
+    if ids is None:
+        return [model.objects.all()]
+    ids = sorted(ids)
+    return [model.objects.filter(pk__in=ids[start:start + CHUNK_SIZE]) for start in range(0, len(ids), CHUNK_SIZE)]
+
+
+def rebuild(workshop_order_ids=None, invoice_ids=None):
+    """Recalcula los totales guardados con consultas de actualización masiva.
+
+    Sin argumentos recalcula todos; si se indican ids sólo los de esas órdenes y facturas.
+    """
+    if workshop_order_ids is not None or invoice_ids is not None:
+        workshop_order_ids, invoice_ids = workshop_order_ids or (), invoice_ids or ()
+    expected = expected_invoice_totals().filter(pk=OuterRef('pk'))
+    with transaction.atomic():
+        for orders in _chunks(WorkshopOrder, workshop_order_ids):
+            orders.update(total=F('workforce_cost') + F('amount'))
+        for invoices in _chunks(Invoice, invoice_ids):
+            invoices.update(
+                activities_total=Subquery(expected.values('expected_activities_total')[:1]),
+                line_count=Subquery(expected.values('expected_line_count')[:1]),
+            )
+            invoices.update(total=F('services_provided') + F('expendable_material') + F('workforce')
+                            + F('activities_total'))
+
+
+def verify():
+    """Devuelve la lista de ``(modelo, id, campo, guardado, calculado)`` que no coinciden."""
+    mismatches = list()
+    for pk, workforce_cost, amount, total in (WorkshopOrder.objects
+                                              .values_list('pk', 'workforce_cost', 'amount', 'total')
+                                              .iterator()):
+        if workforce_cost + amount != total:
+            mismatches.append(('WorkshopOrder', pk, 'total', total, workforce_cost + amount))
+
+    rows = (expected_invoice_totals()
+            .values_list('pk', 'services_provided', 'expendable_material', 'workforce', 'activities_total',
+                         'line_count', 'total', 'expected_activities_total', 'expected_line_count')
+            .iterator())
+    for (pk, services, material, workforce, activities_total, line_count, total, expected_activities_total,
+         expected_line_count) in rows:
+        expected_activities_total = Decimal(expected_activities_total or 0).quantize(ZERO)
+        expected_total = services + material + workforce + expected_activities_total
+        if activities_total != expected_activities_total:
+            mismatches.append(('Invoice', pk, 'activities_total', activities_total, expected_activities_total))
+        if line_count != int(expected_line_count or 0):
+            mismatches.append(('Invoice', pk, 'line_count', line_count, int(expected_line_count or 0)))
+        if total != expected_total:
+            mismatches.append(('Invoice', pk, 'total', total, expected_total))
+    return mismatches
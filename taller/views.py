@@ -1,434 +1,216 @@
-import io
-import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from django.http import FileResponse
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_JUSTIFY
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.lib.units import cm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Image, Spacer
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_permission_codename
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
+from django.db import close_old_connections
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
 
-from .models import WorkshopOrder, PhysicalState, Invoice, Activity
+from . import extracts, jobs, metrics, pdf_cache, replica
+from .documents import DOCUMENTS, WORKSHOP_ORDER, INVOICE, open_pdf
+from .models import ExportJob, Invoice, WorkshopOrder
+
+DOCUMENT_MODELS = {
+    WORKSHOP_ORDER: WorkshopOrder,
+    INVOICE: Invoice,
+}
+
+
+def can_view(request, kind):
+    """Si el usuario del admin puede ver los documentos de ese tipo."""
+    opts = DOCUMENT_MODELS[kind]._meta
+    return request.user.has_perm('{}.{}'.format(opts.app_label, get_permission_codename('view', opts)))
+
+
+def check_can_view(request, kind):
+    if not can_view(request, kind):
+        raise PermissionDenied
+
+
+def _admin_check(request, kind):
+    """Lo que hace ``admin_view`` para las vistas asíncronas: None si se puede seguir, o la respuesta."""
+    if not (request.user.is_active and request.user.is_staff):
+        return redirect_to_login(request.get_full_path(), reverse('admin:login'))
+    check_can_view(request, kind)
+    return None
+
+
+class PDFResponse(FileResponse):
+    block_size = pdf_cache.CHUNK_SIZE
+
+
+def export_pdf(request, kind, object_id):
+    check_can_view(request, kind)
+    if request.GET.get('async') == '1' or getattr(settings, 'TALLER_PDF_ASYNC_EXPORTS', False):
+        return enqueue_export(kind, object_id)
+
+    with replica.reading(since=replica.last_write(request)):
+        pdf = open_pdf(kind, object_id)
+    if pdf is None:
+        raise Http404
+    return PDFResponse(pdf, as_attachment=True, filename=DOCUMENTS[kind][3])
 
 
 def export_workshop_order_pdf(request, object_id):
-    workshop_order = WorkshopOrder.objects.filter(pk=object_id).first()
-    physicals_state = PhysicalState.objects.filter(workshop_order=workshop_order)
-
-    buffer = io.BytesIO()
-
-    pdfmetrics.registerFont(TTFont('Calibri', 'Calibri.ttf'))
-    pdfmetrics.registerFont(TTFont('Calibri-Bold', 'CalibriB.ttf'))
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name='Workshop_Order_Title',
-                              fontName='Calibri-Bold',
-                              fontSize=20,
-                              leading=24,
-                              alignment=TA_CENTER))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal',
-                              fontName='Calibri'))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal_12',
-                              parent=styles['Workshop_Order_Normal'],
-                              fontSize=12,
-                              leading=14.4))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal_12_Right',
-                              parent=styles['Workshop_Order_Normal_12'],
-                              alignment=TA_RIGHT))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal_Bold_12',
-                              parent=styles['Workshop_Order_Normal_12'],
-                              fontName='Calibri-Bold'))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal_Bold_12_Right',
-                              parent=styles['Workshop_Order_Normal_Bold_12'],
-                              alignment=TA_RIGHT))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal_12_Justify',
-                              parent=styles['Workshop_Order_Normal_12'],
-                              alignment=TA_JUSTIFY))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal_Bold_12_Center',
-                              parent=styles['Workshop_Order_Normal_Bold_12'],
-                              alignment=TA_CENTER))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal_14',
-                              parent=styles['Workshop_Order_Normal'],
-                              fontSize=14,
-                              leading=16.8))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal_14_Right',
-                              parent=styles['Workshop_Order_Normal_14'],
-                              alignment=TA_RIGHT))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal_Bold_14',
-                              parent=styles['Workshop_Order_Normal_14'],
-                              fontName='Calibri-Bold'))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal_Bold_14_Right',
-                              parent=styles['Workshop_Order_Normal_Bold_14'],
-                              alignment=TA_RIGHT))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal_14_Justify',
-                              parent=styles['Workshop_Order_Normal_14'],
-                              alignment=TA_JUSTIFY))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal_14_Center',
-                              parent=styles['Workshop_Order_Normal_14'],
-                              alignment=TA_CENTER))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal_16',
-                              parent=styles['Workshop_Order_Normal'],
-                              fontSize=16,
-                              leading=19.2))
-    styles.add(ParagraphStyle(name='Workshop_Order_Normal_16_Justify',
-                              parent=styles['Workshop_Order_Normal_16'],
-                              alignment=TA_JUSTIFY))
-
-    doc = SimpleDocTemplate(buffer,
-                            pagesize=letter,
-                            topMargin=3.55 * cm,
-                            bottomMargin=3.18 * cm,
-                            leftMargin=1.27 * cm,
-                            rightMargin=1.27 * cm,
-                            title='Orden de taller',
-                            author='Taller Buen Vecino')
-
-    body = list()
-
-    rows = list()
-    rows.append([Paragraph('ORDEN DE TRABAJO', styles['Workshop_Order_Title'])])
-    rows.append([Paragraph('No. Orden:', styles['Workshop_Order_Normal_Bold_14_Right']),
-                 Paragraph(str(workshop_order), styles['Workshop_Order_Normal_14']),
-                 Paragraph('Nombre Cliente o Empresa:', styles['Workshop_Order_Normal_Bold_14_Right']),
-                 Paragraph(workshop_order.enterprise.name, styles['Workshop_Order_Normal_14'])])
-    rows.append([Paragraph('Fecha de entrada:', styles['Workshop_Order_Normal_Bold_14_Right']),
-                 Paragraph(workshop_order.entry_date.strftime('%d/%m/%Y'), styles['Workshop_Order_Normal_14']),
-                 Paragraph('Presupuesto:', styles['Workshop_Order_Normal_Bold_14_Right']),
-                 Paragraph('$ {:,.2f}'.format(workshop_order.estimation), styles['Workshop_Order_Normal_14_Right'])])
-    rows.append([Paragraph('Marca y Modelo:', styles['Workshop_Order_Normal_Bold_14_Right']),
-                 Paragraph('{} / {}'.format(workshop_order.vehicle.mark, workshop_order.vehicle.model),
-                           styles['Workshop_Order_Normal_14']),
-                 Paragraph('Tiempo estimado:', styles['Workshop_Order_Normal_Bold_14_Right']),
-                 Paragraph('{:.2f} hs'.format(workshop_order.estimated_time),
-                           styles['Workshop_Order_Normal_14_Right'])])
-    rows.append([Paragraph('Chapa:', styles['Workshop_Order_Normal_Bold_14_Right']),
-                 Paragraph(workshop_order.vehicle.tag, styles['Workshop_Order_Normal_14']),
-                 Paragraph('Kilometraje:', styles['Workshop_Order_Normal_Bold_14_Right']),
-                 Paragraph('{} km'.format(workshop_order.mileage), styles['Workshop_Order_Normal_14_Right'])])
-    rows.append([Paragraph('Mecánico Responsable:', styles['Workshop_Order_Normal_Bold_14_Right']),
-                 Paragraph('{} {}'.format(workshop_order.mechanical.name, workshop_order.mechanical.last_name),
-                           styles['Workshop_Order_Normal_14']),
-                 Paragraph('Ayudante:', styles['Workshop_Order_Normal_Bold_14_Right']),
-                 Paragraph('{} {}'.format(workshop_order.assistant.name, workshop_order.assistant.last_name),
-                           styles['Workshop_Order_Normal_14'])])
-    rows.append([[Paragraph('Defectación:', styles['Workshop_Order_Normal_Bold_14']),
-                  Paragraph(workshop_order.defection, styles['Workshop_Order_Normal_14_Justify'])]])
-    rows.append([[Paragraph('Trabajo realizado:', styles['Workshop_Order_Normal_Bold_14']),
-                  Paragraph(workshop_order.work_done, styles['Workshop_Order_Normal_14_Justify'])]])
-    rows.append(
-        [Paragraph('Estado físico del vehículo al entrar al taller', styles['Workshop_Order_Normal_14_Center'])])
-    for physical_state in physicals_state:
-        rows.append([Paragraph(physical_state.piece.name, styles['Workshop_Order_Normal_14_Justify']),
-                     Paragraph(physical_state.description, styles['Workshop_Order_Normal_14_Justify'])])
-    rows.append([Paragraph('Fecha de entrega al cliente:', styles['Workshop_Order_Normal_Bold_12_Right']),
-                 Paragraph(workshop_order.delivery_date.strftime('%d/%m/%Y'), styles['Workshop_Order_Normal_12']),
-                 Paragraph('Forma de pago:', styles['Workshop_Order_Normal_Bold_12_Right']),
-                 Paragraph(workshop_order.method_payment.type, styles['Workshop_Order_Normal_12'])])
-    rows.append([Paragraph('Nombre del cliente:', styles['Workshop_Order_Normal_Bold_12_Right']),
-                 Paragraph(workshop_order.enterprise.name, styles['Workshop_Order_Normal_12']),
-                 Paragraph('Costo mano de obra:', styles['Workshop_Order_Normal_Bold_12_Right']),
-                 Paragraph('$ {:,.2f}'.format(workshop_order.workforce_cost),
-                           styles['Workshop_Order_Normal_12_Right'])])
-    rows.append(
-        [[Paragraph('Quejas o sugerencias:', styles['Workshop_Order_Normal_Bold_12']),
-          Paragraph(workshop_order.complaints_suggestions, styles['Workshop_Order_Normal_12_Justify'])], '',
-         [Paragraph('Descripción Materias primas y piezas:', styles['Workshop_Order_Normal_Bold_12']),
-          Paragraph(workshop_order.description_raw_materials_parts, styles['Workshop_Order_Normal_12_Justify'])]])
-    rows.append([Paragraph('Firma Cliente:', styles['Workshop_Order_Normal_Bold_12_Center']), '',
-                 Paragraph('Importe en Piezas y Materias primas:', styles['Workshop_Order_Normal_Bold_12_Right']),
-                 Paragraph('$ {:,.2f}'.format(workshop_order.amount), styles['Workshop_Order_Normal_12_Right'])])
-    rows.append(['', '', Paragraph('Total a pagar:', styles['Workshop_Order_Normal_Bold_12_Right']),
-                 Paragraph('$ {:,.2f}'.format(workshop_order.workforce_cost + workshop_order.amount),
-                           styles['Workshop_Order_Normal_12_Right'])])
-    rows.append([Paragraph('Garantia del Servicio:', styles['Workshop_Order_Normal_16']),
-                 Paragraph(workshop_order.service_guarantee.description, styles['Workshop_Order_Normal_16_Justify'])])
-
-    col_widths = [
-        doc.width * 0.28,
-        doc.width * 0.25,
-        doc.width * 0.22,
-        doc.width * 0.25
-    ]
-
-    style = TableStyle([
-        ('BOX', (0, 0), (-1, -1), 0.5, colors.black),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('SPAN', (0, 0), (-1, 0)),
-        ('SPAN', (0, 6), (-1, 6)),
-        ('SPAN', (0, 7), (-1, 7)),
-        ('SPAN', (0, 8), (-1, 8)),
-        ('SPAN', (1, 9), (-1, -7)),
-        ('SPAN', (0, -4), (1, -4)),
-        ('SPAN', (2, -4), (3, -4)),
-        ('SPAN', (0, -3), (0, -2)),
-        ('VALIGN', (0, -3), (0, -2), 'MIDDLE'),
-        ('SPAN', (1, -3), (1, -2)),
-        ('SPAN', (1, -1), (-1, -1))
-    ])
-
-    table = Table(rows, colWidths=col_widths, style=style)
-    body.append(table)
-
-    doc.build(body, canvasmaker=HeaderFooter)
-
-    buffer.seek(0)
-    return FileResponse(buffer, as_attachment=True, filename='Orden de trabajo.pdf')
+    return export_pdf(request, WORKSHOP_ORDER, object_id)
 
 
 def export_invoice_pdf(request, object_id):
-    invoice = Invoice.objects.filter(pk=object_id).first()
-    activities = Activity.objects.filter(invoice=invoice)
-
-    buffer = io.BytesIO()
-
-    pdfmetrics.registerFont(TTFont('Calibri', 'Calibri.ttf'))
-    pdfmetrics.registerFont(TTFont('Calibri-Bold', 'CalibriB.ttf'))
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name='Invoice_Normal',
-                              fontName='Calibri',
-                              fontSize=11,
-                              leading=13.2))
-    styles.add(ParagraphStyle(name='Invoice_Normal_Center',
-                              parent=styles['Invoice_Normal'],
-                              alignment=TA_CENTER))
-    styles.add(ParagraphStyle(name='Invoice_Normal_Right',
-                              parent=styles['Invoice_Normal'],
-                              alignment=TA_RIGHT))
-    styles.add(ParagraphStyle(name='Invoice_Normal_Bold',
-                              parent=styles['Invoice_Normal'],
-                              fontName='Calibri-Bold'))
-    styles.add(ParagraphStyle(name='Invoice_Normal_Bold_Right',
-                              parent=styles['Invoice_Normal_Bold'],
-                              alignment=TA_RIGHT))
-    styles.add(ParagraphStyle(name='Invoice_Normal_Bold_Center',
-                              parent=styles['Invoice_Normal_Bold'],
-                              alignment=TA_CENTER))
-
-    doc = SimpleDocTemplate(buffer,
-                            pagesize=letter,
-                            topMargin=3.55 * cm,
-                            bottomMargin=3.18 * cm,
-                            leftMargin=1.27 * cm,
-                            rightMargin=1.27 * cm,
-                            title='Factura',
-                            author='Taller Buen Vecino')
-
-    body = list()
-
-    rows = list()
-    rows.append([Paragraph(invoice.type.title, styles['Invoice_Normal_Bold_Center'])])
-    rows.append([Paragraph('Nombre:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph(invoice.contact.name, styles['Invoice_Normal']),
-                 Paragraph('TCP:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph(invoice.contact.tcp, styles['Invoice_Normal'])])
-    rows.append([Paragraph('Dirección:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph(invoice.contact.address, styles['Invoice_Normal']),
-                 Paragraph('Nit:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph(str(invoice.contact.nit), styles['Invoice_Normal'])])
-    rows.append([Paragraph('Email:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph(invoice.contact.email, styles['Invoice_Normal']),
-                 Paragraph('No.cuenta CUP:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph(str(invoice.contact.no_check_cup), styles['Invoice_Normal'])])
-    rows.append([Paragraph('Teléfono:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph(str(invoice.contact.phone), styles['Invoice_Normal'])])
-
-    col_widths = [
-        doc.width * 0.11,
-        doc.width * 0.39,
-        doc.width * 0.16,
-        doc.width * 0.34
-    ]
-
-    style = TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('SPAN', (0, 0), (-1, 0))
-    ])
-
-    table = Table(rows, colWidths=col_widths, style=style)
-    body.append(table)
-    body.append(Spacer(1, 11))
-
-    rows = list()
-    rows.append([Paragraph('Datos del Cliente', styles['Invoice_Normal_Bold_Center']), '',
-                 Paragraph('Del Servicio', styles['Invoice_Normal_Bold_Center']), ''])
-    rows.append([Paragraph('Nombre:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph(invoice.workshop_order.enterprise.name, styles['Invoice_Normal']),
-                 Paragraph('No. Factura:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph(str(invoice.pk), styles['Invoice_Normal_Center'])])
-    rows.append([Paragraph('Domicilio:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph(invoice.workshop_order.enterprise.address, styles['Invoice_Normal']),
-                 Paragraph('Referencia OT No:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph(str(invoice.workshop_order.pk), styles['Invoice_Normal_Center'])])
-    rows.append([Paragraph('Teléfono:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph(str(invoice.workshop_order.enterprise.phone), styles['Invoice_Normal']),
-                 Paragraph('No. Factura OT No:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph('{} - {}'.format(invoice, invoice.workshop_order), styles['Invoice_Normal_Center'])])
-    rows.append([Paragraph('Vehículo', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph('{} / {}'.format(invoice.workshop_order.vehicle.mark, invoice.workshop_order.vehicle.model),
-                           styles['Invoice_Normal']), Paragraph('Fecha:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph(invoice.date.strftime('%d/%m/%Y'), styles['Invoice_Normal_Center'])])
-    rows.append([Paragraph('Chapa:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph(invoice.workshop_order.vehicle.tag, styles['Invoice_Normal']),
-                 Paragraph('Moneda:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph('CUP', styles['Invoice_Normal_Center'])])
-
-    col_widths = [
-        doc.width * 0.11,
-        doc.width * 0.39,
-        doc.width * 0.19,
-        doc.width * 0.31
-    ]
-
-    style = TableStyle([
-        ('BOX', (0, 0), (-1, -1), 0.5, colors.black),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('SPAN', (0, 0), (1, 0)),
-        ('SPAN', (2, 0), (3, 0))
-    ])
-
-    table = Table(rows, colWidths=col_widths, style=style)
-    body.append(table)
-    body.append(Spacer(1, 11))
-    body.append(Spacer(1, 11))
-
-    rows = list()
-    rows.append([Paragraph('No.', styles['Invoice_Normal_Bold']), Paragraph('Código', styles['Invoice_Normal_Bold']),
-                 Paragraph('Descripción', styles['Invoice_Normal_Bold']),
-                 Paragraph('u/m', styles['Invoice_Normal_Bold']),
-                 Paragraph('Horas Trabajo', styles['Invoice_Normal_Bold']),
-                 Paragraph('Proc.', styles['Invoice_Normal_Bold']), Paragraph('Precio', styles['Invoice_Normal_Bold']),
-                 Paragraph('Cant.', styles['Invoice_Normal_Bold']),
-                 Paragraph('Importe', styles['Invoice_Normal_Bold'])])
-    pos = 1
-    total = invoice.services_provided + invoice.expendable_material + invoice.workforce
-    for activity in activities:
-        rows.append(
-            [Paragraph(str(pos), styles['Invoice_Normal_Right']),
-             Paragraph(str(activity.code), styles['Invoice_Normal']),
-             Paragraph(activity.description, styles['Invoice_Normal']),
-             Paragraph(activity.unit_measurement.name, styles['Invoice_Normal']),
-             Paragraph(str(activity.hours_worked), styles['Invoice_Normal_Right']),
-             Paragraph(activity.provenance.provenance, styles['Invoice_Normal']),
-             Paragraph('$ {:,.2f}'.format(activity.price), styles['Invoice_Normal_Right']),
-             Paragraph(str(activity.amount), styles['Invoice_Normal_Right']),
-             Paragraph('$ {:,.2f}'.format(activity.price * activity.amount), styles['Invoice_Normal_Right'])])
-        pos += 1
-        total += (activity.price * activity.amount)
-    rows.append(['', '', '', '', '', '', '', '', ''])
-    rows.append(['', '', '', '', '', '', '', '', ''])
-    rows.append(['', Paragraph('Servicios Prestados en el Taller', styles['Invoice_Normal']), '', '', '', '', '', '',
-                 Paragraph('$ {:,.2f}'.format(invoice.services_provided), styles['Invoice_Normal_Right'])])
-    rows.append(['', Paragraph('Material Gastable', styles['Invoice_Normal']), '', '', '', '', '', '',
-                 Paragraph('$ {:,.2f}'.format(invoice.expendable_material), styles['Invoice_Normal_Right'])])
-    rows.append(['', Paragraph('Mano de Obra', styles['Invoice_Normal']), '', '', '', '', '', '',
-                 Paragraph('$ {:,.2f}'.format(invoice.workforce), styles['Invoice_Normal_Right'])])
-    rows.append(['', Paragraph('Total', styles['Invoice_Normal']), '', '', '', '', '', '',
-                 Paragraph('$ {:,.2f}'.format(total), styles['Invoice_Normal_Right'])])
-
-    col_widths = [
-        doc.width * 0.06,
-        doc.width * 0.13,
-        doc.width * 0.26,
-        doc.width * 0.06,
-        doc.width * 0.09,
-        doc.width * 0.08,
-        doc.width * 0.12,
-        doc.width * 0.07,
-        doc.width * 0.13
-    ]
-
-    style = TableStyle([
-        ('BOX', (0, 0), (-1, -1), 0.5, colors.black),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('SPAN', (1, -6), (-1, -6)),
-        ('SPAN', (1, -5), (-1, -5)),
-        ('SPAN', (1, -4), (-2, -4)),
-        ('SPAN', (1, -3), (-2, -3)),
-        ('SPAN', (1, -2), (-2, -2)),
-        ('SPAN', (1, -1), (-2, -1))
-    ])
-
-    table = Table(rows, colWidths=col_widths, style=style)
-    body.append(table)
-    body.append(Spacer(1, 11))
-    body.append(Spacer(1, 11))
-    body.append(Spacer(1, 11))
-    body.append(Spacer(1, 11))
-
-    rows = list()
-    rows.append([Paragraph('Facturado por:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph('Evelio Mojena Álvarez', styles['Invoice_Normal']),
-                 Paragraph('Recibido por:', styles['Invoice_Normal_Bold_Right']), ''])
-    rows.append([Paragraph('Cargo:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph('Jefe de Taller', styles['Invoice_Normal']), '', ''])
-    rows.append([Paragraph('Fecha:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph('____/ ____/ 2021', styles['Invoice_Normal']),
-                 Paragraph('Fecha:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph('____/ ____/ 2021', styles['Invoice_Normal'])])
-    rows.append([Paragraph('Firma:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph('_____________________', styles['Invoice_Normal']),
-                 Paragraph('Firma:', styles['Invoice_Normal_Bold_Right']),
-                 Paragraph('_____________________', styles['Invoice_Normal'])])
-
-    col_widths = [
-        doc.width * 0.15,
-        doc.width * 0.35,
-        doc.width * 0.15,
-        doc.width * 0.35
-    ]
-
-    table = Table(rows, colWidths=col_widths)
-    body.append(table)
-
-    doc.build(body, canvasmaker=HeaderFooter)
-
-    buffer.seek(0)
-    return FileResponse(buffer, as_attachment=True, filename='Orden de trabajo.pdf')
-
-
-class HeaderFooter(canvas.Canvas):
-    def __init__(self, *args, **kwargs):
-        canvas.Canvas.__init__(self, *args, **kwargs)
-        self.Canvas = canvas.Canvas
-        self._saved_page_states = list()
-
-    def showPage(self):
-        self._saved_page_states.append(dict(self.__dict__))
-        self._startPage()
-
-    def save(self):
-        for state in self._saved_page_states:
-            self.__dict__.update(state)
-            self.draw_header_footer()
-            self.Canvas.showPage(self)
-        self.Canvas.save(self)
-
-    def draw_header_footer(self):
-        w, h = letter
-
-        self.saveState()
-        base_dir = os.path.dirname(__file__) + '/img/{}'
-
-        # Header
-        header = Image(base_dir.format('header.png'))
-        header.drawHeight = 3.55 * cm
-        header.drawWidth = w
-
-        header.wrap(w, 3.55 * cm)
-        header.drawOn(self, 0, h - 3.55 * cm)
-
-        # Footer
-        footer = Image(base_dir.format('footer.png'))
-        footer.drawHeight = 3.18 * cm
-        footer.drawWidth = w
-
-        footer.wrap(w, 3.18 * cm)
-        footer.drawOn(self, 0, 0 * cm)
-
-        self.restoreState()
+    return export_pdf(request, INVOICE, object_id)
+
+
+def extract_response(kind, output_format, queryset=None, date_from=None, date_to=None, since=None):
+    """Extracto en CSV o JSONL enviado a medida que se lee de la base de datos.
+
+    Se lee de la réplica si ya tiene lo escrito hasta ``since``. La base se fija aquí porque las filas se
+    leen después de que la vista termina.
+    """
+    using = replica.read_alias(since)
+    response = StreamingHttpResponse(extracts.lines(kind, output_format, queryset, date_from, date_to, using),
+                                     content_type=extracts.CONTENT_TYPES[output_format])
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(extracts.filename(kind, output_format))
+    return response
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = 0
+
+
+def get_executor():
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'TALLER_ASYNC_EXPORT_THREADS', 4),
+                                               thread_name_prefix='pdf-export')
+    return _executor
+
+
+def _open_pdf_in_thread(kind, object_id, since=None):
+    close_old_connections()
+    try:
+        # run_in_executor no copia el contexto: la base de lectura se elige en el hilo
+        with replica.reading(since):
+            return open_pdf(kind, object_id)
+    finally:
+        close_old_connections()
+
+
+async def export_pdf_async(request, kind, object_id):
+    """Variante asíncrona de export_pdf para servidores ASGI.
+
+    La carga de datos y la generación del PDF se ejecutan en un grupo acotado de hilos, de modo que
+    el bucle de eventos puede seguir atendiendo otras descargas. Cuando hay más de
+    TALLER_ASYNC_EXPORT_MAX_PENDING exportaciones en curso se responde 503.
+    """
+    global _pending
+
+    # admin_view no admite vistas asíncronas, así que la sesión se comprueba aquí
+    response = await sync_to_async(_admin_check)(request, kind)
+    if response is not None:
+        return response
+
+    if request.GET.get('async') == '1' or getattr(settings, 'TALLER_PDF_ASYNC_EXPORTS', False):
+        return await sync_to_async(enqueue_export)(kind, object_id)
+
+    with _executor_lock:
+        accepted = _pending < getattr(settings, 'TALLER_ASYNC_EXPORT_MAX_PENDING', 64)
+        if accepted:
+            _pending += 1
+    if not accepted:
+        response = HttpResponse('Demasiadas exportaciones en curso', status=503)
+        response['Retry-After'] = '5'
+        return response
+
+    try:
+        pdf = await asyncio.get_running_loop().run_in_executor(get_executor(), _open_pdf_in_thread, kind, object_id,
+                                                              replica.last_write(request))
+    finally:
+        with _executor_lock:
+            _pending -= 1
+
+    if pdf is None:
+        raise Http404
+    return PDFResponse(pdf, as_attachment=True, filename=DOCUMENTS[kind][3])
+
+
+async def export_workshop_order_pdf_async(request, object_id):
+    return await export_pdf_async(request, WORKSHOP_ORDER, object_id)
+
+
+async def export_invoice_pdf_async(request, object_id):
+    return await export_pdf_async(request, INVOICE, object_id)
+
+
+def job_status(job):
+    return {
+        'job': job.pk,
+        'status': job.status,
+        'error': job.error,
+        'status_url': reverse('admin:taller_exportjob_status', args=[job.pk]),
+        'download_url': reverse('admin:taller_exportjob_download', args=[job.pk])
+        if job.status == ExportJob.DONE else None,
+    }
+
+
+def enqueue_export(kind, object_id):
+    version_of = DOCUMENTS[kind][0]
+    if version_of(object_id) is None:
+        raise Http404
+
+    job = jobs.enqueue(kind, object_id)
+    return JsonResponse(job_status(job), status=202)
+
+
+def export_job_status(request, job_id):
+    job = get_object_or_404(ExportJob, pk=job_id)
+    check_can_view(request, job.kind)
+    return JsonResponse(job_status(job))
+
+
+def export_job_download(request, job_id):
+    job = get_object_or_404(ExportJob, pk=job_id, status=ExportJob.DONE)
+    check_can_view(request, job.kind)
+    try:
+        pdf = open(jobs.job_path(job), 'rb')
+    except FileNotFoundError:
+        raise Http404
+    return PDFResponse(pdf, as_attachment=True, filename=DOCUMENTS[job.kind][3])
+
+
+def can_read_metrics(request):
+    """Personal del admin, quien envía ``TALLER_METRICS_TOKEN`` o una dirección permitida sin proxy de por medio."""
+    if request.user.is_active and request.user.is_staff:
+        return True
+
+    token = getattr(settings, 'TALLER_METRICS_TOKEN', None)
+    if token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer {}'.format(token)):
+        return True
+
+    # Detrás de un proxy en la misma máquina todas las peticiones llegan desde la dirección local
+    if 'HTTP_X_FORWARDED_FOR' in request.META or 'HTTP_FORWARDED' in request.META:
+        return False
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'TALLER_METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+
+
+def metrics_view(request):
+    """Métricas del proceso en el formato de texto de Prometheus, solo para quien ``can_read_metrics`` admite."""
+    if not can_read_metrics(request):
+        return HttpResponse(status=403)
+
+    cache = pdf_cache.stats()
+    return HttpResponse(metrics.render({
+        'taller_pdf_cache_hits_total': cache['hits'],
+        'taller_pdf_cache_misses_total': cache['misses'],
+        'taller_pdf_cache_entries': cache['entries'],
+        'taller_pdf_cache_bytes': cache['bytes'],
+    }), content_type='text/plain; version=0.0.4; charset=utf-8')